@@ -8,16 +8,15 @@ for use by the offline retrain pipeline.
 """
 import csv
 import argparse
-from db_adapter import get_connection
+from db_adapter import connection
 
 
 def consolidate(output_path="feedback_pairs.csv", min_count=1):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT p.text_content, f.correction FROM feedback f JOIN products p ON p.id = f.product_id WHERE f.correction IS NOT NULL")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT p.text_content, f.correction FROM feedback f JOIN products p ON p.id = f.product_id WHERE f.correction IS NOT NULL")
+        rows = cur.fetchall()
+        cur.close()
 
     # Optionally group/unique; for now write all pairs
     if not rows:
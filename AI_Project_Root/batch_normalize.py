@@ -0,0 +1,119 @@
+"""Normalize a large CSV offline with the same waterfall `/upload-csv` uses.
+
+Rows are read in batches and fanned out to a process pool. Each worker loads
+the normalization model and the vocabulary/taxonomy indexes once, then runs
+`normalizer.normalize_rows` on every batch it receives, so results match the
+server path row for row.
+
+Usage:
+    python AI_Project_Root/batch_normalize.py products.csv --out normalized.csv
+    python AI_Project_Root/batch_normalize.py products.csv --load --workers 8
+"""
+import os
+import csv
+import time
+import uuid
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from db_adapter import connection, ensure_tables
+from indexes import refresh_vocabulary_index, refresh_taxonomy_index
+from normalizer import normalize_rows, VECTOR_STAGE
+from model_store import load_artifact
+import embed_notify
+from result_cache import NormalizationCache
+from ingest import iter_raw_batches, insert_batch, UPLOAD_BATCH_SIZE
+
+MODEL_PATH = os.getenv("NORMALIZATION_MODEL_PATH", "normalization_model.joblib")
+
+# Per-process state, set once by _init_worker
+_model = None
+_has_proba = False
+_cache = None
+
+
+def _init_worker(model_path):
+    global _model, _has_proba, _cache
+    version = None
+    if model_path and os.path.exists(model_path):
+        # Memory-mapped by default, so the pool shares one copy of the model's arrays
+        _model, _has_proba, version, _ = load_artifact(model_path)
+    vocab = refresh_vocabulary_index()
+    taxonomy = refresh_taxonomy_index()
+    generation = (vocab.version, taxonomy.version, version)
+    if VECTOR_STAGE:
+        from vector_index import refresh_vector_index
+        generation += (refresh_vector_index().version,)
+    # In-memory only: repeated strings are common within a catalog
+    _cache = NormalizationCache(persistent=False)
+    _cache.bind(generation)
+
+
+def _normalize_batch(raws):
+    return raws, normalize_rows(raws, _model, _has_proba, cache=_cache)
+
+
+def _ordered_results(executor, batches, window):
+    """Like executor.map, but keeps at most `window` batches in flight so memory stays bounded."""
+    pending = deque()
+    for batch in batches:
+        pending.append(executor.submit(_normalize_batch, batch))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def run(input_path, out_path=None, load=False, workers=None, batch_size=UPLOAD_BATCH_SIZE, model_path=MODEL_PATH):
+    workers = workers or os.cpu_count() or 1
+    ensure_tables()
+    if not os.path.exists(model_path):
+        print(f"No model at {model_path}; rows that miss vocabulary and taxonomy will need review")
+
+    writer = out_fh = None
+    if out_path:
+        out_fh = open(out_path, "w", newline='', encoding='utf-8')
+        writer = csv.writer(out_fh)
+        writer.writerow(["text_content", "normalized_value", "needs_review", "confidence"])
+
+    # Tag loaded rows so review corrections can be scoped to this run
+    upload_id = uuid.uuid4().hex
+    count = 0
+    started = time.time()
+    try:
+        with open(input_path, "rb") as fh, ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as executor:
+            batches = iter_raw_batches(fh, batch_size)
+            for raws, results in _ordered_results(executor, batches, window=workers * 2):
+                if writer:
+                    writer.writerows([raw, normalized, needs_review, confidence]
+                                     for raw, (normalized, confidence, needs_review) in zip(raws, results))
+                if load:
+                    with connection() as conn:
+                        insert_batch(conn, raws, results, upload_id)
+                    embed_notify.notify()
+                count += len(raws)
+                elapsed = time.time() - started
+                print(f"\r{count} rows, {count / elapsed if elapsed else 0:.0f} rows/sec", end='', flush=True)
+    finally:
+        if out_fh:
+            out_fh.close()
+
+    elapsed = time.time() - started
+    print(f"\nNormalized {count} rows in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} rows/sec) with {workers} workers")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="CSV file; the first column is normalized and the header row is skipped")
+    parser.add_argument("--out", help="Write a normalized CSV to this path")
+    parser.add_argument("--load", action="store_true", help="Bulk-insert results into the products table")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=UPLOAD_BATCH_SIZE)
+    parser.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args()
+    if not args.out and not args.load:
+        parser.error("pass --out, --load, or both")
+    run(args.input, args.out, args.load, args.workers, args.batch_size, args.model)
@@ -1,50 +1,280 @@
+"""Embed queued products and append them to the vector store.
+
+Products are queued by a trigger on insert (`embedding_queue`), so the worker
+reads the queue head instead of scanning for products without embeddings.
+Uploads wake it through `embed_notify`, and texts seen before (same
+`text_hash`) reuse their stored vector if the same encoder computed it
+(`vectors.encoder_identity`), so switching backend or model never mixes vector
+spaces.
+
+Several workers can share the queue (`--workers N` starts N processes, each
+pinned to one core with its own model). A worker leases a batch of queue rows
+for `EMBED_LEASE_SECONDS` before embedding it, so no two workers take the same
+rows. If a worker dies, its rows are claimed again once the lease expires. The
+unique index on `embeddings.product_id` drops the duplicate a slow worker may
+still write after its lease was taken over. Each worker records its throughput
+in `embedding_workers`; `--report` sums it up.
+
+`EMBED_BACKEND=onnx` replaces the PyTorch SentenceTransformer with the int8
+ONNX export (see onnx_encoder.py).
+"""
+import os
 import time
-import sqlite3
-import json
-from sentence_transformers import SentenceTransformer
-from db_adapter import get_connection
-
-def run_worker():
-    print("Initializing AI Model (SQLite Version)...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    print("Model loaded successfully.")
-
-    while True:
-        try:
-            conn = get_connection()
-            cur = conn.cursor()
-            
-            # 1. Find products without embeddings
-            cur.execute("""
-                SELECT p.id, p.text_content 
-                FROM products p
-                LEFT JOIN embeddings e ON p.id = e.product_id
-                WHERE e.product_id IS NULL
-                LIMIT 50
-            """)
-            rows = cur.fetchall()
-
-            if not rows:
-                print("No new products to process. Sleeping...")
-                time.sleep(10)
-            else:
-                print(f"AI is processing {len(rows)} products...")
-                for product_id, text_content in rows:
-                    if text_content:
-                        # Create the AI vector
-                        vector = model.encode(text_content).tolist()
-                        # Save to SQLite (using JSON string for the vector)
-                        cur.execute("INSERT INTO embeddings (product_id, vector_json) VALUES (?, ?)", 
-                                   (product_id, json.dumps(vector)))
-                
-                conn.commit()
-                print("Batch completed.")
-
-            cur.close()
-            conn.close()
-        except Exception as e:
-            print(f"Error: {e}")
-            time.sleep(5)
+import socket
+import argparse
+import multiprocessing
+from db_adapter import connection, ensure_tables, text_hash, bump_index_version
+from embed_notify import WakeListener
+from vectors import migrate_json_vectors, load_encoder, encoder_identity, EMBED_BACKEND
+from vector_store import VectorStore, migrate_blobs_to_store
+
+# Rows fetched per poll, and texts per forward pass inside SentenceTransformer.encode
+EMBED_FETCH_SIZE = int(os.getenv("EMBED_FETCH_SIZE", "256"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Longest an idle worker waits without a wakeup before re-checking the queue
+EMBED_IDLE_SECONDS = float(os.getenv("EMBED_IDLE_SECONDS", "30"))
+# How long claimed rows stay reserved; must comfortably exceed the time to embed one fetch
+EMBED_LEASE_SECONDS = float(os.getenv("EMBED_LEASE_SECONDS", "300"))
+# Worker processes started by default (--workers overrides); 1 runs in this process
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+
+# SQLite caps bound parameters per statement
+_IN_CHUNK = 500
+
+
+def claim_queue(worker_id, limit=EMBED_FETCH_SIZE):
+    """Lease the oldest free queued products to `worker_id`.
+
+    Returns (product_id, text_content, text_hash) rows; deleted products come
+    back as None text. The UPDATE takes the write lock, so concurrent workers
+    claim disjoint rows. Rows whose lease expired (their worker died) are free again.
+    """
+    now = time.time()
+    expires = now + EMBED_LEASE_SECONDS
+    with connection() as conn:
+        conn.execute("""
+            UPDATE embedding_queue SET lease_owner = ?, lease_expires = ?
+            WHERE product_id IN (
+                SELECT product_id FROM embedding_queue
+                WHERE lease_expires IS NULL OR lease_expires < ?
+                ORDER BY product_id
+                LIMIT ?
+            )
+        """, (worker_id, expires, now, limit))
+        return conn.execute("""
+            SELECT q.product_id, p.text_content, p.text_hash
+            FROM embedding_queue q
+            LEFT JOIN products p ON p.id = q.product_id
+            WHERE q.lease_owner = ? AND q.lease_expires = ?
+            ORDER BY q.product_id
+        """, (worker_id, expires)).fetchall()
+
+
+def release_leases(worker_id):
+    """Hand this worker's unfinished rows back to the queue (after an error or on shutdown)."""
+    with connection() as conn:
+        conn.execute("UPDATE embedding_queue SET lease_owner = NULL, lease_expires = NULL WHERE lease_owner = ?",
+                     (worker_id,))
+
+
+def _cached_rows(encoder, hashes):
+    found = {}
+    hashes = list(hashes)
+    with connection() as conn:
+        for start in range(0, len(hashes), _IN_CHUNK):
+            chunk = hashes[start:start + _IN_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            for h, row in conn.execute(f"SELECT text_hash, store_row FROM embedding_cache WHERE encoder = ? AND text_hash IN ({marks})",
+                                       [encoder, *chunk]):
+                found[h] = row
+    return found
+
+
+def embed_batch(model, store, rows, encoder):
+    """Embed queued products, encoding each distinct text once.
+
+    Texts already in `embedding_cache` under this `encoder` identity reuse their
+    store row without running the model; the rest are encoded in a single `encode` call and appended to the
+    store. Returns (pairs, new_cache, encoded): (product_id, store_row) for every
+    row (NULL for products without text), the new text_hash -> store_row entries,
+    and how many texts went through the model.
+    """
+    hash_of = {pid: h or text_hash(text) for pid, text, h in rows if text}
+    cached = _cached_rows(encoder, set(hash_of.values()))
+    todo = {}
+    for pid, text, _ in rows:
+        h = hash_of.get(pid)
+        if h is not None and h not in cached and h not in todo:
+            todo[h] = (pid, text)
+    new_cache = {}
+    if todo:
+        vectors = model.encode([text for _, text in todo.values()], batch_size=EMBED_BATCH_SIZE, convert_to_numpy=True)
+        new_cache = dict(zip(todo, store.append([pid for pid, _ in todo.values()], vectors)))
+    store_row = {**cached, **new_cache}
+    pairs = [(pid, store_row[hash_of[pid]] if pid in hash_of else None) for pid, _, _ in rows]
+    return pairs, new_cache, len(todo)
+
+
+def save_batch(worker_id, pairs, new_cache, encoder, stats=None):
+    """Record embeddings and dequeue their products in one transaction.
+
+    `new_cache` entries are keyed by the `encoder` identity that computed them.
+    Only rows this worker still leases are dequeued; if the lease was taken
+    over, the new owner finishes them. `stats` is (rows, encoded, seconds)
+    added to this worker's `embedding_workers` row.
+    """
+    with connection() as conn:
+        conn.executemany("INSERT OR IGNORE INTO embedding_cache (encoder, text_hash, store_row) VALUES (?, ?, ?)",
+                         [(encoder, h, row) for h, row in new_cache.items()])
+        # Vectors are in the store; SQLite records where. A product already embedded by another worker keeps its row.
+        conn.executemany("INSERT INTO embeddings (product_id, store_row) SELECT ?, ? WHERE EXISTS (SELECT 1 FROM products WHERE id = ?) "
+                         "ON CONFLICT(product_id) DO NOTHING",
+                         [(pid, row, pid) for pid, row in pairs])
+        conn.executemany("DELETE FROM embedding_queue WHERE product_id = ? AND lease_owner = ?",
+                         [(pid, worker_id) for pid, _ in pairs])
+        if pairs:
+            # One stamp bump per batch tells vector_index to look for new rows
+            bump_index_version("embeddings", conn)
+        if stats:
+            rows, encoded, seconds = stats
+            conn.execute("UPDATE embedding_workers SET rows = rows + ?, encoded = encoded + ?, "
+                         "busy_seconds = busy_seconds + ?, heartbeat = ? WHERE worker_id = ?",
+                         (rows, encoded, seconds, time.time(), worker_id))
+
+
+def _register(worker_id, core):
+    now = time.time()
+    with connection() as conn:
+        # Rows of workers gone for a day only clutter the report
+        conn.execute("DELETE FROM embedding_workers WHERE heartbeat < ?", (now - 86400,))
+        conn.execute("INSERT OR REPLACE INTO embedding_workers (worker_id, core, started_at, heartbeat) VALUES (?, ?, ?, ?)",
+                     (worker_id, core, now, now))
+
+
+def _pin_to_core(core):
+    """Restrict this process to one core; returns True if pinned."""
+    if core is None or not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(0, {core})
+    return True
+
+
+def run_worker(core=None, drain=False):
+    """Embed queued products until stopped (or, with `drain`, until no free rows are left)."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    pinned = _pin_to_core(core)
+    store = VectorStore()
+    wakeups = None if drain else WakeListener()
+
+    print(f"[{worker_id}] Initializing AI Model ({EMBED_BACKEND} backend){f' on core {core}' if pinned else ''}...")
+    # One intra-op thread per pinned worker; otherwise the runtime's default
+    model = load_encoder(threads=1 if pinned else None)
+    encoder = encoder_identity()
+    print(f"[{worker_id}] Model loaded successfully ({encoder}).")
+    # Registered after the model loads so throughput covers embedding time only
+    _register(worker_id, core)
+
+    try:
+        while True:
+            try:
+                rows = claim_queue(worker_id)
+                if rows:
+                    started = time.time()
+                    pairs, new_cache, encoded = embed_batch(model, store, rows, encoder)
+                    elapsed = time.time() - started
+                    save_batch(worker_id, pairs, new_cache, encoder, (len(rows), encoded, elapsed))
+                    print(f"[{worker_id}] Batch of {len(rows)} completed ({len(rows) / elapsed if elapsed else 0:.0f} rows/sec, "
+                          f"{len(rows) - encoded} served from the content-hash cache).")
+                elif drain:
+                    print(f"[{worker_id}] Queue drained.")
+                    return
+                else:
+                    wakeups.wait(EMBED_IDLE_SECONDS)
+            except Exception as e:
+                print(f"[{worker_id}] Error: {e}")
+                release_leases(worker_id)
+                time.sleep(5)
+    finally:
+        release_leases(worker_id)
+
+
+def throughput_report(since=0):
+    """Print per-worker and aggregate embedding throughput for workers active since `since` (epoch seconds).
+
+    Per-worker rates use time spent embedding; the aggregate uses wall time from
+    the first worker start to the last batch, so "of linear" shows what claims,
+    commits and lock waits cost. To see how backfills scale with cores, compare
+    the aggregate of `--drain` runs with 1 and N workers.
+    """
+    with connection() as conn:
+        rows = conn.execute("SELECT worker_id, core, rows, encoded, busy_seconds, started_at, heartbeat "
+                            "FROM embedding_workers WHERE heartbeat >= ? AND rows > 0 ORDER BY started_at",
+                            (since,)).fetchall()
+    if not rows:
+        print("No embedding worker throughput recorded.")
+        return None
+    rates = []
+    for worker_id, core, n, encoded, busy, _, _ in rows:
+        rate = n / busy if busy else 0.0
+        rates.append(rate)
+        print(f"  {worker_id:<32} core {'-' if core is None else core:>3}  {n:>9} rows  {encoded:>9} encoded  {rate:>8.0f} rows/sec")
+    total = sum(r[2] for r in rows)
+    wall = max(r[6] for r in rows) - min(r[5] for r in rows)
+    aggregate = total / wall if wall > 0 else 0.0
+    mean_rate = sum(rates) / len(rates)
+    efficiency = aggregate / (len(rows) * mean_rate) if mean_rate else 0.0
+    print(f"Aggregate: {len(rows)} workers, {total} rows in {wall:.1f}s = {aggregate:.0f} rows/sec "
+          f"({mean_rate:.0f} rows/sec per worker, {efficiency:.0%} of linear)")
+    return aggregate
+
+
+def run_workers(count, drain=False):
+    """Start `count` worker processes, one per core, and report their combined throughput when they exit."""
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else [None]
+    if count > len(cores):
+        print(f"Warning: {count} workers on {len(cores)} cores; workers will share cores")
+    launched = time.time()
+    # spawn, so each child loads its own model instead of inheriting runtime threads across fork()
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=run_worker, args=(cores[i % len(cores)], drain), daemon=False) for i in range(count)]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        # Children got the SIGINT too; give them time to release their leases
+        for proc in procs:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+    throughput_report(since=launched)
+
+
+def migrate():
+    ensure_tables()
+    # One-time conversion of rows written by older workers (JSON text, then BLOBs)
+    migrate_json_vectors()
+    migrate_blobs_to_store()
+
 
 if __name__ == "__main__":
-    run_worker()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--migrate-only", action="store_true", help="Move legacy vector_json/BLOB rows into the vector store and exit")
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS, help="Worker processes, each pinned to its own core")
+    parser.add_argument("--drain", action="store_true", help="Exit once the queue is empty (for backfills and benchmarks)")
+    parser.add_argument("--report", action="store_true", help="Print recorded worker throughput and exit")
+    args = parser.parse_args()
+    if args.report:
+        ensure_tables()
+        throughput_report()
+    elif args.migrate_only:
+        migrate()
+    else:
+        migrate()
+        if args.workers > 1:
+            run_workers(args.workers, drain=args.drain)
+        else:
+            started = time.time()
+            run_worker(drain=args.drain)
+            throughput_report(since=started)
@@ -0,0 +1,21 @@
+"""Export product embeddings as .npy files.
+
+Writes `<prefix>_vectors.npy` (float32, one row per embedded product) and the
+matching `<prefix>_product_ids.npy`. Products map to rows through
+`embeddings.store_row`, so products sharing a cached vector each get their own
+row, and store rows no product references are left out.
+
+Usage:
+    python AI_Project_Root/export_embeddings.py --out exports/embeddings
+"""
+import argparse
+
+from vector_store import VectorStore, VECTOR_STORE_DIR, export_products
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="embeddings", help="Output prefix")
+    parser.add_argument("--store", default=VECTOR_STORE_DIR, help="Vector store directory")
+    args = parser.parse_args()
+    count = export_products(args.out, VectorStore(args.store))
+    print(f"Exported {count} product vectors to {args.out}_vectors.npy / {args.out}_product_ids.npy")
@@ -0,0 +1,178 @@
+"""Export the fine-tuned SentenceTransformer to int8 ONNX, check it, and benchmark both backends.
+
+Export writes `EMBED_ONNX_DIR` (see backend/onnx_encoder.py): the transformer
+through `torch.onnx.export`, then `onnxruntime.quantization.quantize_dynamic`
+(int8 weights, activations quantized at run time). The accuracy check embeds a
+sample of product texts with both backends and reports the cosine similarity
+between the PyTorch and ONNX vector of each text, plus how often their nearest
+neighbour within the sample agrees. `--benchmark` reports texts/sec per backend.
+
+Usage:
+    python AI_Project_Root/export_onnx.py                              # export + accuracy check
+    python AI_Project_Root/export_onnx.py --skip-export --benchmark --sample 2000 --threads 1
+
+Training stays on PyTorch: re-run the export after `retrain_model.py` saves a new model.
+"""
+import os
+import sys
+import json
+import time
+import inspect
+import argparse
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+from db_adapter import connection
+from onnx_encoder import OnnxEncoder, EMBED_ONNX_DIR, ONNX_MODEL_FILE, ONNX_FP32_FILE, ENCODER_CONFIG
+
+SUPPORTED_MODULES = {"Transformer", "Pooling", "Normalize"}
+
+
+def export(model_dir, out_dir, quantize=True, opset=14):
+    """Write the ONNX model(s), tokenizer and encoder.json for `OnnxEncoder`."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    st = SentenceTransformer(model_dir, device="cpu")
+    modules = [type(m).__name__ for m in st]
+    unsupported = set(modules) - SUPPORTED_MODULES
+    if unsupported:
+        raise SystemExit(f"Cannot export {model_dir}: unsupported modules {sorted(unsupported)}")
+    transformer = st[0]
+    pooling_module = next(m for m in st if type(m).__name__ == "Pooling")
+    # sentence-transformers 6 replaced get_pooling_mode_str() with a pooling_mode string
+    pooling = getattr(pooling_module, "pooling_mode", None)
+    if not isinstance(pooling, str):
+        pooling = pooling_module.get_pooling_mode_str()
+    if pooling not in ("mean", "cls", "max"):
+        raise SystemExit(f"Cannot export {model_dir}: unsupported pooling {pooling!r}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    model = transformer.auto_model.eval()
+    sample = transformer.tokenizer(["example product text"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(input_names, args))).last_hidden_state
+
+    fp32_path = os.path.join(out_dir, ONNX_FP32_FILE)
+    # torch >= 2.9 defaults to the dynamo exporter, which rejects dynamic_axes; keep the TorchScript one
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(model), tuple(sample[n] for n in input_names), fp32_path,
+            input_names=input_names, output_names=["token_embeddings"],
+            dynamic_axes={**{n: {0: "batch", 1: "sequence"} for n in input_names},
+                          "token_embeddings": {0: "batch", 1: "sequence"}},
+            opset_version=opset, **legacy,
+        )
+    model_path = os.path.join(out_dir, ONNX_MODEL_FILE)
+    tmp_path = f"{model_path}.tmp"
+    if quantize:
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+    else:
+        with open(fp32_path, "rb") as src, open(tmp_path, "wb") as dst:
+            dst.write(src.read())
+    transformer.tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, ENCODER_CONFIG), "w") as f:
+        json.dump({
+            "source": os.path.abspath(model_dir) if os.path.isdir(model_dir) else model_dir,
+            "pooling": pooling,
+            "normalize": "Normalize" in modules,
+            "max_seq_length": st.max_seq_length,
+            "dim": st.get_sentence_embedding_dimension(),
+            "quantized": quantize,
+        }, f, indent=2)
+    # Publish the model last so a running encoder never loads a half-written file
+    os.replace(tmp_path, model_path)
+    sizes = {name: os.path.getsize(os.path.join(out_dir, name)) / 1e6 for name in (ONNX_FP32_FILE, ONNX_MODEL_FILE)}
+    print(f"Exported {model_dir} to {out_dir} ({pooling} pooling): "
+          + ", ".join(f"{name} {mb:.1f} MB" for name, mb in sizes.items()))
+
+
+def sample_texts(limit):
+    with connection() as conn:
+        rows = conn.execute("SELECT text_content FROM products WHERE text_content IS NOT NULL AND text_content != '' "
+                            "ORDER BY RANDOM() LIMIT ?", (limit,)).fetchall()
+    if not rows:
+        raise SystemExit("No product texts to sample; load some products first")
+    return [r[0] for r in rows]
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def accuracy_check(reference, candidate, texts, batch_size):
+    """Cosine between the reference and candidate vector of each text, and nearest-neighbour agreement."""
+    ref = _unit(reference.encode(texts, batch_size=batch_size, convert_to_numpy=True))
+    cand = _unit(candidate.encode(texts, batch_size=batch_size, convert_to_numpy=True))
+    cosines = (ref * cand).sum(axis=1)
+    agree = None
+    if len(texts) > 1:
+        # Nearest other text under each backend; the vector stage depends on these matching
+        ref_sim, cand_sim = ref @ ref.T, cand @ cand.T
+        np.fill_diagonal(ref_sim, -np.inf)
+        np.fill_diagonal(cand_sim, -np.inf)
+        agree = float((ref_sim.argmax(axis=1) == cand_sim.argmax(axis=1)).mean())
+    return {"mean": float(cosines.mean()), "min": float(cosines.min()),
+            "p1": float(np.percentile(cosines, 1)), "neighbour_agreement": agree}
+
+
+def benchmark(encoder, texts, batch_size):
+    """Texts/sec for one `encode` pass over `texts`, after a warm-up batch."""
+    encoder.encode(texts[:batch_size], batch_size=batch_size, convert_to_numpy=True)
+    started = time.perf_counter()
+    encoder.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    return len(texts) / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="./fine_tuned_model", help="SentenceTransformer directory or name to export")
+    parser.add_argument("--out", default=EMBED_ONNX_DIR, help="Output directory (EMBED_ONNX_DIR)")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep fp32 weights in model.onnx")
+    parser.add_argument("--skip-export", action="store_true", help="Check/benchmark an existing export")
+    parser.add_argument("--sample", type=int, default=1000, help="Product texts to sample for the check and benchmark")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads for both backends (default: runtime default)")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Fail when the mean cosine to PyTorch is lower")
+    parser.add_argument("--benchmark", action="store_true", help="Report texts/sec for each backend")
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        export(args.model, args.out, quantize=not args.no_quantize)
+
+    texts = sample_texts(args.sample)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    reference = SentenceTransformer(args.model, device="cpu")
+    onnx = OnnxEncoder(args.out, threads=args.threads)
+
+    result = accuracy_check(reference, onnx, texts, args.batch_size)
+    agreement = "n/a" if result["neighbour_agreement"] is None else f"{result['neighbour_agreement']:.1%}"
+    print(f"Cosine to PyTorch over {len(texts)} texts: mean {result['mean']:.4f}, "
+          f"1st percentile {result['p1']:.4f}, min {result['min']:.4f}; nearest-neighbour agreement {agreement}")
+
+    if args.benchmark:
+        backends = [("torch fp32", reference), ("onnx " + ("int8" if onnx.config["quantized"] else "fp32"), onnx)]
+        if onnx.config["quantized"] and os.path.exists(os.path.join(args.out, ONNX_FP32_FILE)):
+            backends.append(("onnx fp32", OnnxEncoder(args.out, model_file=ONNX_FP32_FILE, threads=args.threads)))
+        baseline = None
+        for name, encoder in backends:
+            rate = benchmark(encoder, texts, args.batch_size)
+            baseline = baseline or rate
+            print(f"  {name:<11} {rate:>9.0f} texts/sec  ({rate / baseline:.2f}x)")
+
+    if result["mean"] < args.min_cosine:
+        print(f"Mean cosine {result['mean']:.4f} is below --min-cosine {args.min_cosine}; do not switch EMBED_BACKEND to onnx")
+        sys.exit(1)
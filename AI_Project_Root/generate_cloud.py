@@ -12,7 +12,7 @@ import json
 import argparse
 import webbrowser
 from collections import defaultdict
-from db_adapter import get_connection, ensure_tables
+from db_adapter import connection, ensure_tables
 
 HTML_TEMPLATE = """<!doctype html>
 <html>
@@ -63,10 +63,11 @@ def conf_to_hex(c):
 
 def collect_stats(limit=200):
     ensure_tables()
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT text_content, confidence FROM products")
-    rows = cur.fetchall()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT text_content, confidence FROM products")
+        rows = cur.fetchall()
+        cur.close()
 
     freq = defaultdict(int)
     conf_sum = defaultdict(float)
@@ -94,7 +95,6 @@ def collect_stats(limit=200):
 
     list_json = json.dumps([{"text": t, "weight": f} for t,f,_ in items])
     colors_json = json.dumps({t: conf_to_hex(avg) for (t,f,avg) in items})
-    conn.close()
     return list_json, colors_json
 
 
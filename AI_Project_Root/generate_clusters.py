@@ -1,6 +1,7 @@
 """Create clusters from stored product embeddings and save a cluster report.
 
-- Reads `embeddings.vector_json` and product metadata from the DB.
+- Reads vectors from the memory-mapped `vector_store` and product metadata from the DB.
+  Read-only: exits if legacy rows still need `embedding_worker.py --migrate-only`.
 - Runs KMeans clustering (n_clusters default 18, configurable via --n).
 - Finds the 5 most central products per cluster and writes `cluster_report.txt`.
 
@@ -8,46 +9,42 @@ Usage:
     python scripts/generate_clusters.py --n 18 --out cluster_report.txt
 """
 import argparse
-import json
 import math
 from statistics import mean
-from db_adapter import get_connection, ensure_tables
+from db_adapter import connection, ensure_tables
+from vector_store import VectorStore
 import numpy as np
 from sklearn.cluster import KMeans
 
 
 def load_embeddings():
+    """Return (items, X): per-product metadata tuples and their vectors as one float32 matrix."""
     ensure_tables()
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT e.product_id, e.vector_json, p.text_content, p.normalized_value, p.confidence FROM embeddings e JOIN products p ON p.id = e.product_id WHERE e.vector_json IS NOT NULL")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        # Only the worker migrates legacy JSON/BLOB rows into the store; clustering without them would be silently partial
+        cur.execute("SELECT COUNT(*) FROM embeddings WHERE store_row IS NULL AND (vector IS NOT NULL OR vector_json IS NOT NULL)")
+        pending = cur.fetchone()[0]
+        if pending:
+            raise SystemExit(f"{pending} embeddings are not in the vector store yet; "
+                             "run `python AI_Project_Root/embedding_worker.py --migrate-only` first")
+        cur.execute("SELECT e.product_id, e.store_row, p.text_content, p.normalized_value, p.confidence FROM embeddings e JOIN products p ON p.id = e.product_id WHERE e.store_row IS NOT NULL ORDER BY e.store_row")
+        rows = cur.fetchall()
+        cur.close()
 
-    items = []
-    for r in rows:
-        pid = r[0]
-        vec_s = r[1]
-        try:
-            vec = json.loads(vec_s)
-        except Exception:
-            try:
-                vec = eval(vec_s)
-            except Exception:
-                print(f"Skipping embedding for product {pid}: cannot parse vector")
-                continue
-        items.append((pid, np.array(vec, dtype=float), r[2], r[3], float(r[4] or 0.0)))
-    return items
+    # One gather from the memory-mapped store; only the referenced rows are read
+    _, stored = VectorStore().open()
+    X = np.asarray(stored[[r[1] for r in rows]]) if rows else np.empty((0, 0), dtype=np.float32)
+    items = [(r[0], X[i], r[2], r[3], float(r[4] or 0.0)) for i, r in enumerate(rows)]
+    return items, X
 
 
 def cluster_and_report(n_clusters=18, out_path='cluster_report.txt'):
-    items = load_embeddings()
+    items, X = load_embeddings()
     if not items:
         print("No embeddings found in DB. Run embedding worker first or insert embeddings.")
         return False
 
-    X = np.vstack([it[1] for it in items])
     n_clusters = min(n_clusters, len(items))
     print(f"Clustering {len(items)} embeddings into {n_clusters} clusters...")
     km = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
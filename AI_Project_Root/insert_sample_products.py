@@ -1,18 +1,12 @@
-import os
-import sqlite3
-
-DB_URL = os.getenv("DB_URL", "sqlite:///./dev.db")
-path = DB_URL.split("sqlite:///")[-1]
-conn = sqlite3.connect(path)
-cur = conn.cursor()
+from db_adapter import connection, ensure_tables
 
+ensure_tables()
 samples = [
     ("Nvy Blue T-shirt",),
     ("Rd Shirt",),
     ("Greenish Pants",)
 ]
-cur.executemany("INSERT INTO products (text_content, needs_review) VALUES (?, 1)", samples)
-conn.commit()
+# db_adapter connections register text_hash(), which the products insert trigger calls
+with connection() as conn:
+    conn.executemany("INSERT INTO products (text_content, needs_review) VALUES (?, 1)", samples)
 print(f"Inserted {len(samples)} sample products")
-cur.close()
-conn.close()
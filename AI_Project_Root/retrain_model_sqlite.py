@@ -2,19 +2,30 @@
 
 This script trains a lightweight text classifier (Tfidf + LogisticRegression)
 that maps raw text to corrected/normalized text labels. It saves the resulting
-pipeline as `normalization_model.joblib` (or path from env var).
+pipeline as a `model_store` artifact at `normalization_model.joblib` (or path from env var).
 
 It is intentionally light-weight so it can run quickly on-device.
+
+With `RETRAIN_MODE=incremental` (or `--incremental`) it instead keeps a
+`neighbor_model.NeighborNormalizer` and only appends the feedback rows added
+since the last run (`partial_fit`), tracked by a `feedback.id` watermark in the
+`training_state` table. A hashing vectorizer with an `SGDClassifier` would be
+the textbook choice, but its `partial_fit` cannot add classes after the first
+call, and corrections are almost always new labels; the neighbor index takes
+them in place. A full rebuild, which refreshes the TF-IDF weights, still
+happens on the first run, every `RETRAIN_FULL_EVERY` incremental updates, or
+when the model file on disk is not the one the watermark was recorded for.
+
+`RETRAIN_MODEL=neighbors` swaps the full-retrain LogisticRegression for
+`neighbor_model.NeighborNormalizer`, which scales to 100k+ unique corrections.
 """
 import os
-try:
-    import joblib
-except Exception:
-    try:
-        from sklearn.externals import joblib  # fallback
-    except Exception:
-        joblib = None
-from db_adapter import get_connection
+import sys
+import time
+from db_adapter import connection
+from normalizer import model_version
+from neighbor_model import NeighborNormalizer
+from model_store import save_artifact, load_artifact
 
 from sklearn.pipeline import make_pipeline
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -23,16 +34,25 @@ from sklearn.linear_model import LogisticRegression
 
 MODEL_PATH = os.getenv("NORMALIZATION_MODEL_PATH", "normalization_model.joblib")
 MIN_PAIRS = int(os.getenv("MIN_TRAINING_PAIRS", "5"))
+RETRAIN_MODE = os.getenv("RETRAIN_MODE", "full")
+# Full-retrain backend: "logreg" (one-vs-rest LogisticRegression) or "neighbors" (neighbor_model.NeighborNormalizer)
+RETRAIN_MODEL = os.getenv("RETRAIN_MODEL", "logreg")
+# Incremental updates between compacting full rebuilds
+FULL_REBUILD_EVERY = int(os.getenv("RETRAIN_FULL_EVERY", "20"))
 
+PAIRS_SQL = ("SELECT f.id, p.text_content, f.correction FROM feedback f JOIN products p ON p.id = f.product_id "
+             "WHERE f.correction IS NOT NULL AND f.id > ? ORDER BY f.id")
 
-def retrain():
+
+def retrain(mode=None):
+    if (mode or RETRAIN_MODE) == "incremental":
+        return retrain_incremental()
     print("Starting offline retrain (SQLite)...")
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT p.text_content, f.correction FROM feedback f JOIN products p ON p.id = f.product_id WHERE f.correction IS NOT NULL")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT p.text_content, f.correction FROM feedback f JOIN products p ON p.id = f.product_id WHERE f.correction IS NOT NULL")
+        rows = cur.fetchall()
+        cur.close()
 
     pairs = [(r[0], r[1]) for r in rows if r[1] and r[0]]
 
@@ -43,14 +63,21 @@ def retrain():
     X = [p[0] for p in pairs]
     y = [p[1] for p in pairs]
 
-    print(f"Training normalization classifier on {len(X)} pairs...")
-    clf = make_pipeline(TfidfVectorizer(ngram_range=(1,2), max_features=20000), LogisticRegression(max_iter=1000))
+    if RETRAIN_MODEL == "neighbors":
+        print(f"Indexing {len(X)} pairs for the nearest-neighbor normalizer...")
+        clf = NeighborNormalizer()
+    else:
+        print(f"Training normalization classifier on {len(X)} pairs...")
+        clf = make_pipeline(TfidfVectorizer(ngram_range=(1,2), max_features=20000), LogisticRegression(max_iter=1000))
     clf.fit(X, y)
 
-    # Save model
+    return _save(clf)
+
+
+def _save(clf):
     try:
-        joblib.dump(clf, MODEL_PATH)
-        print(f"Saved new normalization model to {MODEL_PATH}")
+        version = save_artifact(clf, MODEL_PATH)
+        print(f"Saved new normalization model {version} to {MODEL_PATH}")
     except Exception as e:
         print(f"Failed to save model: {e}")
         return False
@@ -73,5 +100,67 @@ def retrain():
     return True
 
 
+def _load_pairs(after_id=0):
+    with connection() as conn:
+        rows = conn.execute(PAIRS_SQL, (after_id,)).fetchall()
+    return [(r[0], r[1], r[2]) for r in rows if r[1] and r[2]]
+
+
+def _get_state():
+    with connection() as conn:
+        row = conn.execute("SELECT last_feedback_id, increments, model_version FROM training_state WHERE name = ?",
+                           (MODEL_PATH,)).fetchone()
+    return (row[0], row[1], row[2]) if row else (0, 0, None)
+
+
+def _set_state(last_feedback_id, increments):
+    with connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO training_state (name, last_feedback_id, increments, model_version, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (MODEL_PATH, last_feedback_id, increments, model_version(MODEL_PATH), time.time()))
+
+
+def _full_incremental_rebuild():
+    pairs = _load_pairs()
+    if len(pairs) < MIN_PAIRS:
+        print(f"Not enough training pairs ({len(pairs)}) found. Need at least {MIN_PAIRS} to retrain.")
+        return False
+    print(f"Full rebuild of incremental model on {len(pairs)} pairs...")
+    clf = NeighborNormalizer()
+    clf.fit([p[1] for p in pairs], [p[2] for p in pairs])
+    if not _save(clf):
+        return False
+    _set_state(pairs[-1][0], 0)
+    return True
+
+
+def retrain_incremental():
+    """Append feedback newer than the watermark to the neighbor model; rebuild when due."""
+    print("Starting incremental retrain (SQLite)...")
+    last_id, increments, recorded_version = _get_state()
+    if last_id == 0 or increments >= FULL_REBUILD_EVERY or recorded_version != model_version(MODEL_PATH):
+        return _full_incremental_rebuild()
+
+    try:
+        clf = load_artifact(MODEL_PATH, mmap=False).model
+        if not isinstance(clf, NeighborNormalizer):
+            raise TypeError(f"{type(clf).__name__} cannot take new pairs in place")
+    except Exception as e:
+        print(f"Existing model cannot be updated in place ({e}); rebuilding")
+        return _full_incremental_rebuild()
+
+    pairs = _load_pairs(last_id)
+    if not pairs:
+        print(f"No new feedback since id {last_id}")
+        return False
+    y = [p[2] for p in pairs]
+    new_labels = len(set(y) - set(clf.classes_))
+    print(f"Updating model with {len(pairs)} new pairs ({new_labels} new labels) since feedback id {last_id}...")
+    clf.partial_fit([p[1] for p in pairs], y)
+    if not _save(clf):
+        return False
+    _set_state(pairs[-1][0], increments + 1)
+    return True
+
 if __name__ == "__main__":
-    retrain()
+    retrain("incremental" if "--incremental" in sys.argv[1:] else None)
@@ -0,0 +1,105 @@
+"""Dedicated retrain worker fed by the `retrain_jobs` table.
+
+`/trigger-retrain` only queues a job; this process claims it and runs the
+training, so TF-IDF fits and SentenceTransformer fine-tunes never compete
+with the API for the GIL or memory. Several triggers while a job is still
+queued coalesce into one run. After a run that writes a new model the worker
+POSTs to the API's `/reload_model` so it hot-reloads.
+
+The process lowers its own priority (RETRAIN_NICE, default 10) and can be
+pinned to specific CPUs (RETRAIN_CPUS, e.g. "2,3") to keep request-handling
+cores free.
+
+Usage:
+    python AI_Project_Root/retrain_worker.py
+    python AI_Project_Root/retrain_worker.py --once
+"""
+import os
+import time
+import argparse
+import traceback
+
+import requests
+
+from db_adapter import ensure_tables
+import retrain_jobs
+
+RETRAIN_NICE = int(os.getenv("RETRAIN_NICE", "10"))
+RETRAIN_CPUS = os.getenv("RETRAIN_CPUS", "")
+RETRAIN_POLL_SECONDS = float(os.getenv("RETRAIN_POLL_SECONDS", "5"))
+# Endpoint(s) to notify after a new model is written; comma-separated, empty disables
+RETRAIN_NOTIFY_URL = os.getenv("RETRAIN_NOTIFY_URL", "http://localhost:8000/reload_model")
+
+
+def lower_priority(nice=RETRAIN_NICE, cpus=RETRAIN_CPUS):
+    """Apply the configured nice level and CPU affinity to this process."""
+    if nice:
+        try:
+            os.nice(nice)
+        except (AttributeError, OSError) as e:
+            print(f"Could not change nice level: {e}")
+    if cpus:
+        try:
+            os.sched_setaffinity(0, {int(c) for c in cpus.split(",") if c.strip()})
+        except (AttributeError, OSError, ValueError) as e:
+            print(f"Could not set CPU affinity to {cpus}: {e}")
+
+
+def _retrain_fn(kind):
+    # Imported lazily: the sentence-transformers path pulls in torch
+    if kind == "sqlite":
+        from retrain_model_sqlite import retrain
+    else:
+        from retrain_model import retrain
+    return retrain
+
+
+def notify_api(urls=RETRAIN_NOTIFY_URL):
+    for url in filter(None, (u.strip() for u in urls.split(","))):
+        try:
+            resp = requests.post(url, timeout=30)
+            print(f"Notified {url}: {resp.status_code}")
+        except Exception as e:
+            print(f"Failed to notify {url}: {e}")
+
+
+def run_job(job):
+    print(f"Retrain job {job['id']} ({job['kind']}, {job['requested_count']} trigger(s)) started")
+    try:
+        trained = _retrain_fn(job["kind"])()
+    except Exception as e:
+        traceback.print_exc()
+        retrain_jobs.finish(job["id"], "failed", str(e))
+        return
+    # retrain_model_sqlite returns False when there are too few pairs; retrain_model returns None
+    if trained is False:
+        retrain_jobs.finish(job["id"], "skipped")
+        print(f"Retrain job {job['id']} skipped")
+        return
+    retrain_jobs.finish(job["id"], "done")
+    print(f"Retrain job {job['id']} finished")
+    notify_api()
+
+
+def main(once=False):
+    ensure_tables()
+    lower_priority()
+    requeued = retrain_jobs.requeue_orphans()
+    if requeued:
+        print(f"Requeued retrain jobs left running by a dead worker: {requeued}")
+    print("Retrain worker started")
+    while True:
+        job = retrain_jobs.claim_next()
+        if job is not None:
+            run_job(job)
+            continue
+        if once:
+            return
+        time.sleep(RETRAIN_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--once", action="store_true", help="Drain the queue and exit instead of polling")
+    args = parser.parse_args()
+    main(once=args.once)
@@ -1,15 +1,18 @@
 import os
+import glob
 import sqlite3
 
 DB_URL = os.getenv("DB_URL", "sqlite:///./dev.db")
 path = DB_URL.split("sqlite:///")[-1]
 
-with open("migrations/001_init.sql", "r") as f:
-    sql = f.read()
-
 conn = sqlite3.connect(path)
 cur = conn.cursor()
-cur.executescript(sql)
+# Scripts are idempotent (IF NOT EXISTS), so apply all of them in order
+for script in sorted(glob.glob("migrations/*.sql")):
+    with open(script, "r") as f:
+        sql = f.read()
+    cur.executescript(sql)
+    print("Applied", script)
 conn.commit()
 cur.close()
 conn.close()
@@ -7,37 +7,35 @@ Defaults to Google's canonical taxonomy file when available.
 """
 import argparse
 import requests
-from db_adapter import get_connection, ensure_tables
+from db_adapter import connection, ensure_tables
 
 DEFAULT_URL = "https://www.google.com/basepages/producttype/taxonomy-with-ids.en-US.txt"
 
 
 def parse_and_insert(lines):
-    conn = get_connection()
-    cur = conn.cursor()
     inserted = 0
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith('#'):
-            continue
-        # Some files have `id\tpath` others are just path lines; handle both
-        if '\t' in line:
-            taxonomy_id, path = line.split('\t', 1)
-        else:
-            # No id available; use line index or empty id
-            taxonomy_id = None
-            path = line
-        label = path.split('>')[-1].strip() if '>' in path else path.split('/')[-1].strip()
-        try:
-            cur.execute("INSERT INTO taxonomy_reference (taxonomy_id, taxonomy_path, label) VALUES (?, ?, ?)",
-                        (taxonomy_id, path, label))
-            inserted += 1
-        except Exception:
-            # ignore duplicates or errors
-            pass
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            # Some files have `id\tpath` others are just path lines; handle both
+            if '\t' in line:
+                taxonomy_id, path = line.split('\t', 1)
+            else:
+                # No id available; use line index or empty id
+                taxonomy_id = None
+                path = line
+            label = path.split('>')[-1].strip() if '>' in path else path.split('/')[-1].strip()
+            try:
+                cur.execute("INSERT INTO taxonomy_reference (taxonomy_id, taxonomy_path, label) VALUES (?, ?, ?)",
+                            (taxonomy_id, path, label))
+                inserted += 1
+            except Exception:
+                # ignore duplicates or errors
+                pass
+        cur.close()
     print(f"Inserted {inserted} taxonomy rows")
     return inserted
 
@@ -5,7 +5,7 @@ Usage:
 
 This inserts tokens like: 'wmns' -> "Women's", 'nvy' -> 'Navy', 'oz' -> 'Ounce'.
 """
-from db_adapter import get_connection, ensure_tables
+from db_adapter import connection, ensure_tables
 
 DEFAULT_PAIRS = [
     ("sm", "Small", "Size"), ("sml", "Small", "Size"),
@@ -37,21 +37,19 @@ DEFAULT_PAIRS = [
 
 def seed(pairs=DEFAULT_PAIRS):
     ensure_tables()
-    conn = get_connection()
-    cur = conn.cursor()
     inserted = 0
-    for token, norm, category in pairs:
-        try:
-            cur.execute(
-                "INSERT OR IGNORE INTO vocabulary (token, normalized, source, category) VALUES (?, ?, ?, ?)",
-                (token.lower(), norm, 'seed', category)
-            )
-            inserted += 1
-        except Exception as e:
-            print(f"Failed insert {token}: {e}")
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        for token, norm, category in pairs:
+            try:
+                cur.execute(
+                    "INSERT OR IGNORE INTO vocabulary (token, normalized, source, category) VALUES (?, ?, ?, ?)",
+                    (token.lower(), norm, 'seed', category)
+                )
+                inserted += 1
+            except Exception as e:
+                print(f"Failed insert {token}: {e}")
+        cur.close()
     print(f"Seeded {inserted} vocabulary items")
 
 
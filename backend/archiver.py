@@ -0,0 +1,202 @@
+"""Background archival of raw uploads to Cloudflare R2 (or any S3-compatible store).
+
+`enqueue` copies the upload into a local spool directory and returns
+(`enqueue_path` links a file that is already on disk instead); a worker
+thread pushes spooled files with a cached boto3 client (multipart above
+`ARCHIVE_MULTIPART_MB`). Failed uploads stay in the spool and are retried with
+exponential backoff, including after a restart. Files that still fail after
+`ARCHIVE_MAX_ATTEMPTS` are moved to `<spool>/failed/` for inspection.
+
+Each spooled upload is a `<id>.data` file plus a `<id>.json` sidecar holding
+the object key and retry state. Workers in different processes share the spool
+and take an flock on the data file, so an object is never pushed twice at once.
+Point `R2_ENDPOINT_URL` at MinIO or `moto_server` to exercise this locally.
+"""
+import os
+import json
+import time
+import uuid
+import fcntl
+import random
+import shutil
+import threading
+
+from db_adapter import DEFAULT_PERSIST_DIR
+
+ARCHIVE_SPOOL_DIR = os.getenv("ARCHIVE_SPOOL_DIR", os.path.join(DEFAULT_PERSIST_DIR, "archive_spool"))
+ARCHIVE_MULTIPART_MB = int(os.getenv("ARCHIVE_MULTIPART_MB", "8"))
+ARCHIVE_MAX_ATTEMPTS = int(os.getenv("ARCHIVE_MAX_ATTEMPTS", "10"))
+ARCHIVE_BACKOFF_SECONDS = float(os.getenv("ARCHIVE_BACKOFF_SECONDS", "5"))
+ARCHIVE_BACKOFF_MAX_SECONDS = float(os.getenv("ARCHIVE_BACKOFF_MAX_SECONDS", "900"))
+# How often an idle worker rescans the spool for retries due and files from other processes
+ARCHIVE_SCAN_SECONDS = float(os.getenv("ARCHIVE_SCAN_SECONDS", "10"))
+
+_client = None
+_client_lock = threading.Lock()
+_wake = threading.Event()
+_worker = None
+
+
+def enabled():
+    return bool(os.getenv("R2_BUCKET_NAME"))
+
+
+def _get_client():
+    """One boto3 client per process; clients are thread-safe and reuse connections."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Only deployments that archive to R2 pay for importing boto3
+            import boto3
+            _client = boto3.client(
+                's3',
+                endpoint_url=os.getenv("R2_ENDPOINT_URL"),
+                aws_access_key_id=os.getenv("R2_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.getenv("R2_SECRET_ACCESS_KEY")
+            )
+        return _client
+
+
+def _write_meta(path, meta):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+
+
+def enqueue(fileobj, key):
+    """Spool `fileobj` for upload as `key` and rewind it. Returns the spool id."""
+    os.makedirs(ARCHIVE_SPOOL_DIR, exist_ok=True)
+    spool_id = uuid.uuid4().hex
+    data_path = os.path.join(ARCHIVE_SPOOL_DIR, f"{spool_id}.data")
+    with open(data_path, "wb") as out:
+        shutil.copyfileobj(fileobj, out, 1024 * 1024)
+        out.flush()
+        os.fsync(out.fileno())
+    fileobj.seek(0)
+    # The sidecar is written last: a crash before this point leaves no half-queued entry
+    _write_meta(os.path.join(ARCHIVE_SPOOL_DIR, f"{spool_id}.json"),
+                {"key": key, "attempts": 0, "next_attempt": 0, "error": None})
+    _wake.set()
+    return spool_id
+
+
+def enqueue_path(path, key):
+    """Spool the file at `path` for upload as `key` without reading it. Returns the spool id.
+
+    The spool entry is a hard link, so the caller may delete `path` right away;
+    it falls back to a copy when the spool is on another filesystem.
+    """
+    os.makedirs(ARCHIVE_SPOOL_DIR, exist_ok=True)
+    spool_id = uuid.uuid4().hex
+    data_path = os.path.join(ARCHIVE_SPOOL_DIR, f"{spool_id}.data")
+    try:
+        os.link(path, data_path)
+    except OSError:
+        shutil.copyfile(path, data_path)
+    with open(data_path, "rb") as f:
+        os.fsync(f.fileno())
+    _write_meta(os.path.join(ARCHIVE_SPOOL_DIR, f"{spool_id}.json"),
+                {"key": key, "attempts": 0, "next_attempt": 0, "error": None})
+    _wake.set()
+    return spool_id
+
+
+def _count_entries(path):
+    if not os.path.isdir(path):
+        return 0
+    return sum(1 for name in os.listdir(path) if name.endswith(".json"))
+
+
+def pending():
+    """Number of spooled uploads not yet archived (including ones waiting to retry)."""
+    return _count_entries(ARCHIVE_SPOOL_DIR)
+
+
+def failed():
+    """Number of uploads given up on after ARCHIVE_MAX_ATTEMPTS (kept in `<spool>/failed/`)."""
+    return _count_entries(os.path.join(ARCHIVE_SPOOL_DIR, "failed"))
+
+
+def start_worker():
+    """Start the background uploader thread (idempotent); a no-op when R2 is not configured."""
+    global _worker
+    if not enabled():
+        return None
+    if _worker is not None and _worker.is_alive():
+        return _worker
+    _worker = threading.Thread(target=_run, name="r2-archiver", daemon=True)
+    _worker.start()
+    return _worker
+
+
+def _run():
+    while True:
+        try:
+            _drain()
+        except Exception as e:
+            print(f"Archive worker error: {e}")
+        _wake.wait(ARCHIVE_SCAN_SECONDS)
+        _wake.clear()
+
+
+def _drain():
+    if not os.path.isdir(ARCHIVE_SPOOL_DIR):
+        return
+    now = time.time()
+    for name in sorted(os.listdir(ARCHIVE_SPOOL_DIR)):
+        if name.endswith(".json"):
+            _try_upload(name[:-len(".json")], now)
+
+
+def _try_upload(spool_id, now):
+    data_path = os.path.join(ARCHIVE_SPOOL_DIR, f"{spool_id}.data")
+    meta_path = os.path.join(ARCHIVE_SPOOL_DIR, f"{spool_id}.json")
+    try:
+        fd = os.open(data_path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return  # another process is uploading it
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return  # finished by another process while we waited
+        if meta["next_attempt"] > now:
+            return
+        try:
+            from boto3.s3.transfer import TransferConfig
+            part_size = ARCHIVE_MULTIPART_MB * 1024 * 1024
+            _get_client().upload_file(
+                data_path, os.getenv("R2_BUCKET_NAME"), meta["key"],
+                Config=TransferConfig(multipart_threshold=part_size, multipart_chunksize=part_size))
+        except Exception as e:
+            _record_failure(spool_id, meta, e)
+            return
+        os.remove(meta_path)
+        os.remove(data_path)
+        print(f"Archived {meta['key']} to R2")
+    finally:
+        os.close(fd)
+
+
+def _record_failure(spool_id, meta, error):
+    meta["attempts"] += 1
+    meta["error"] = str(error)
+    meta_path = os.path.join(ARCHIVE_SPOOL_DIR, f"{spool_id}.json")
+    if meta["attempts"] >= ARCHIVE_MAX_ATTEMPTS:
+        failed_dir = os.path.join(ARCHIVE_SPOOL_DIR, "failed")
+        os.makedirs(failed_dir, exist_ok=True)
+        _write_meta(os.path.join(failed_dir, f"{spool_id}.json"), meta)
+        os.replace(os.path.join(ARCHIVE_SPOOL_DIR, f"{spool_id}.data"), os.path.join(failed_dir, f"{spool_id}.data"))
+        os.remove(meta_path)
+        print(f"Giving up archiving {meta['key']} after {meta['attempts']} attempts: {error}")
+        return
+    delay = min(ARCHIVE_BACKOFF_SECONDS * 2 ** (meta["attempts"] - 1), ARCHIVE_BACKOFF_MAX_SECONDS)
+    meta["next_attempt"] = time.time() + delay * random.uniform(0.8, 1.2)
+    _write_meta(meta_path, meta)
+    print(f"Failed to archive {meta['key']} (attempt {meta['attempts']}), retrying in {delay:.0f}s: {error}")
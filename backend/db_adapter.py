@@ -1,5 +1,8 @@
 import os
+import hashlib
 import sqlite3
+import threading
+from contextlib import contextmanager
 from urllib.parse import urlparse
 
 # Persist DB to /workspaces/persistent by default so it survives container restarts
@@ -11,24 +14,170 @@ if not os.path.exists(DEFAULT_PERSIST_DIR):
         pass
 DB_URL = os.getenv("DB_URL", f"sqlite:///{os.path.join(DEFAULT_PERSIST_DIR, 'dev.db')}")
 
+# Connection tuning (see _configure)
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+# Bump whenever _create_tables changes so existing databases run it again once
+SCHEMA_VERSION = 10
+
+_local = threading.local()
+
+
 def is_sqlite():
     return DB_URL.startswith("sqlite")
 
+
+def text_hash(text):
+    """Key for "the same raw text": case- and whitespace-insensitive, hashed to a short fixed width."""
+    if text is None:
+        return None
+    key = " ".join(text.lower().split())
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _configure(conn):
+    """WAL lets readers (review endpoints) run alongside an upload's writes;
+    synchronous=NORMAL is durable under WAL and skips an fsync per commit."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.create_function("text_hash", 1, text_hash, deterministic=True)
+
+
 def get_connection():
-    """Return a DB connection object. For sqlite, return sqlite3.Connection."""
+    """Return a new DB connection object. For sqlite, return a tuned sqlite3.Connection.
+
+    The caller owns (and must close) it. Prefer `connection()` on hot paths.
+    """
     if is_sqlite():
         # sqlite:///./dev.db or sqlite:///dev.db accepted
         path = DB_URL.split("sqlite:///")[-1]
-        conn = sqlite3.connect(path, check_same_thread=False)
+        # cached_statements keeps compiled statements around for reuse across calls
+        conn = sqlite3.connect(path, check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE)
         conn.row_factory = sqlite3.Row
+        _configure(conn)
         return conn
     else:
         # Placeholder for Postgres in future (psycopg2)
         raise RuntimeError("Only sqlite is supported by db_adapter in this branch")
 
-def ensure_tables():
-    conn = get_connection()
+
+@contextmanager
+def connection():
+    """Yield this thread's long-lived connection, opening it on first use.
+
+    The outermost `with` block commits on success and rolls back on error;
+    nested blocks share the same transaction. Connections are never shared
+    across threads or inherited across fork().
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = get_connection()
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.depth = 0
+    _local.depth += 1
+    try:
+        yield conn
+        if _local.depth == 1:
+            conn.commit()
+    except BaseException:
+        if _local.depth == 1:
+            conn.rollback()
+        raise
+    finally:
+        _local.depth -= 1
+
+
+def close_thread_connection():
+    """Close the calling thread's pooled connection, if any (e.g. at worker shutdown)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+def get_index_version(name, conn=None):
+    """Return the change stamp for a reference table (see `index_versions`).
+
+    The stamp is bumped by triggers on every write to the table (or, for bulk
+    tables, once per batch by their writers), so in-process indexes can cheaply
+    tell whether their snapshot is stale.
+    """
+    if conn is None:
+        with connection() as conn:
+            return get_index_version(name, conn)
     cur = conn.cursor()
+    try:
+        cur.execute("SELECT version FROM index_versions WHERE name = ?", (name,))
+        row = cur.fetchone()
+        return row[0] if row else 0
+    finally:
+        cur.close()
+
+
+def get_index_versions(conn=None):
+    """Return every change stamp as {name: version} in one query."""
+    if conn is None:
+        with connection() as conn:
+            return get_index_versions(conn)
+    return {r[0]: r[1] for r in conn.execute("SELECT name, version FROM index_versions").fetchall()}
+
+
+def bump_index_version(name, conn=None):
+    """Increment a stamp that no trigger maintains (e.g. 'model', bumped by `/reload_model`, or 'feedback')."""
+    if conn is None:
+        with connection() as conn:
+            return bump_index_version(name, conn)
+    conn.execute("INSERT INTO index_versions (name, version) VALUES (?, 1) "
+                 "ON CONFLICT(name) DO UPDATE SET version = version + 1", (name,))
+
+
+def _add_column_if_missing(cur, table, column, decl):
+    cur.execute(f"PRAGMA table_info({table})")
+    cols = [row[1] for row in cur.fetchall()]
+    if column not in cols:
+        try:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        except Exception:
+            # sqlite may raise if the column already exists due to race; ignore
+            pass
+
+
+def _ensure_version_triggers(cur, table, name):
+    """Create AFTER INSERT/UPDATE/DELETE triggers that bump `index_versions.name`."""
+    cur.execute("INSERT OR IGNORE INTO index_versions (name, version) VALUES (?, 0)", (name,))
+    for op in ("INSERT", "UPDATE", "DELETE"):
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_version_{op.lower()} AFTER {op} ON {table}
+        BEGIN
+            UPDATE index_versions SET version = version + 1 WHERE name = '{name}';
+        END
+        """)
+
+
+def ensure_tables(force=False):
+    """Create/upgrade the schema unless the database is already stamped with SCHEMA_VERSION.
+
+    The stamp lives in `PRAGMA user_version`, so a warm start costs one pragma
+    read instead of re-running every CREATE/ALTER/backfill. Returns True if the
+    schema work ran.
+    """
+    with connection() as conn:
+        if not force and conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return False
+        _create_tables(conn.cursor())
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return True
+
+
+def _create_tables(cur):
     cur.execute("""
     CREATE TABLE IF NOT EXISTS products (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -84,15 +233,167 @@ def ensure_tables():
     """)
 
     # Ensure we have a 'category' column (add if missing)
-    cur.execute("PRAGMA table_info(vocabulary)")
-    cols = [row[1] for row in cur.fetchall()]
-    if 'category' not in cols:
-        try:
-            cur.execute("ALTER TABLE vocabulary ADD COLUMN category TEXT")
-        except Exception:
-            # sqlite may raise if the column already exists due to race; ignore
-            pass
+    _add_column_if_missing(cur, "vocabulary", "category", "TEXT")
+
+    # Correction propagation: identical pending texts are found by hash, optionally per upload
+    _add_column_if_missing(cur, "products", "text_hash", "TEXT")
+    _add_column_if_missing(cur, "products", "upload_id", "TEXT")
+    _add_column_if_missing(cur, "feedback", "multiplicity", "INTEGER DEFAULT 1")
+    # float32 little-endian vectors (see vectors.py); vector_json is only read by the one-time migration
+    _add_column_if_missing(cur, "embeddings", "vector", "BLOB")
+    # Row of this product's vector in the memory-mapped vector_store (vector is then NULL)
+    _add_column_if_missing(cur, "embeddings", "store_row", "INTEGER")
+    # One embedding per product, so concurrent embedding workers cannot insert duplicates.
+    # Older databases may already hold some; keep the newest row per product.
+    cur.execute("DELETE FROM embeddings WHERE id NOT IN (SELECT MAX(id) FROM embeddings GROUP BY product_id)")
+    cur.execute("DROP INDEX IF EXISTS idx_embeddings_product")
+    # Also the join used by vector_index to find approved products and their embeddings
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_embeddings_product_unique ON embeddings(product_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_feedback_product ON feedback(product_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_products_pending_text_hash ON products(text_hash, upload_id) WHERE needs_review = 1")
+    # Rows inserted by scripts that predate text_hash; only the review queue matters
+    cur.execute("UPDATE products SET text_hash = text_hash(text_content) WHERE needs_review = 1 AND text_hash IS NULL")
+    # ingest sets text_hash itself; rows inserted any other way (seed scripts, generate_cloud,
+    # manual SQL) get it here, so correction propagation reaches them too. The trigger calls the
+    # text_hash() function registered by _configure, so inserts must go through get_connection().
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS products_text_hash AFTER INSERT ON products
+    WHEN new.text_hash IS NULL
+    BEGIN
+        UPDATE products SET text_hash = text_hash(new.text_content) WHERE id = new.id;
+    END
+    """)
+
+    # Keyset pagination: (created_at, id) for full listings, and a partial index
+    # that holds only the review queue so it stays small as products grow
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_products_created_id ON products(created_at, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_products_review_queue ON products(created_at, id) WHERE needs_review = 1")
+
+    # Optional persistent tier of the normalization result cache (see result_cache.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS normalization_cache (
+        raw_text TEXT PRIMARY KEY,
+        normalized_value TEXT,
+        confidence REAL,
+        needs_review INTEGER,
+        generation TEXT NOT NULL
+    )
+    """)
+
+    # Background upload jobs (see upload_jobs.py); times are epoch seconds
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS upload_jobs (
+        id TEXT PRIMARY KEY,
+        filename TEXT,
+        spool_path TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        total_bytes INTEGER DEFAULT 0,
+        bytes_processed INTEGER DEFAULT 0,
+        rows_committed INTEGER DEFAULT 0,
+        stage_counts TEXT,
+        error TEXT,
+        heartbeat REAL,
+        run_started_at REAL,
+        run_start_rows INTEGER DEFAULT 0,
+        run_start_bytes INTEGER DEFAULT 0,
+        finished_at REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # Claim token of the worker running the job; checkpoints only commit while it matches
+    _add_column_if_missing(cur, "upload_jobs", "owner", "TEXT")
+
+    # Retrain queue consumed by AI_Project_Root/retrain_worker.py (see retrain_jobs.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS retrain_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        requested_count INTEGER NOT NULL DEFAULT 1,
+        worker_pid INTEGER,
+        error TEXT,
+        created_at REAL,
+        started_at REAL,
+        finished_at REAL
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_retrain_jobs_status ON retrain_jobs(status, id)")
+
+    # Watermark for incremental retraining (retrain_model_sqlite.retrain_incremental), one row per model path
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS training_state (
+        name TEXT PRIMARY KEY,
+        last_feedback_id INTEGER NOT NULL DEFAULT 0,
+        increments INTEGER NOT NULL DEFAULT 0,
+        model_version TEXT,
+        updated_at REAL
+    )
+    """)
+
+    # Change stamps for reference tables that are cached in-process
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS index_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    _ensure_version_triggers(cur, "vocabulary", "vocabulary")
+    _ensure_version_triggers(cur, "taxonomy_reference", "taxonomy")
+    # Approvals and new embeddings feed vector_index. These tables take bulk writes, so their
+    # writers (feedback.apply_feedback, embedding_worker.save_batch) bump the stamp once per
+    # batch instead of a row trigger running an extra UPDATE for every inserted row.
+    for name in ("feedback", "embeddings"):
+        cur.execute("INSERT OR IGNORE INTO index_versions (name, version) VALUES (?, 0)", (name,))
+        for op in ("insert", "update", "delete"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {name}_version_{op}")
+
+    # Products waiting for embedding_worker; filled by trigger so the worker never scans for missing rows
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS embedding_queue (
+        product_id INTEGER PRIMARY KEY
+    )
+    """)
+    # Claim lease (see embedding_worker.claim_queue); a row is free when lease_expires is NULL or past
+    _add_column_if_missing(cur, "embedding_queue", "lease_owner", "TEXT")
+    _add_column_if_missing(cur, "embedding_queue", "lease_expires", "REAL")
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS products_embedding_queue AFTER INSERT ON products
+    BEGIN
+        INSERT OR IGNORE INTO embedding_queue (product_id) VALUES (new.id);
+    END
+    """)
+    # Vector store row already computed for a text by one encoder (vectors.encoder_identity),
+    # reused for duplicate texts. A cache from before the encoder column may hold rows
+    # of any encoder, so it is dropped and refills as texts are embedded again.
+    cur.execute("PRAGMA table_info(embedding_cache)")
+    cache_cols = [row[1] for row in cur.fetchall()]
+    if cache_cols and "encoder" not in cache_cols:
+        cur.execute("DROP TABLE embedding_cache")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS embedding_cache (
+        encoder TEXT NOT NULL,
+        text_hash TEXT NOT NULL,
+        store_row INTEGER NOT NULL,
+        PRIMARY KEY (encoder, text_hash)
+    )
+    """)
+    # Per-process throughput of embedding workers, for `embedding_worker.py --report`; times are epoch seconds
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS embedding_workers (
+        worker_id TEXT PRIMARY KEY,
+        core INTEGER,
+        rows INTEGER NOT NULL DEFAULT 0,
+        encoded INTEGER NOT NULL DEFAULT 0,
+        busy_seconds REAL NOT NULL DEFAULT 0,
+        started_at REAL,
+        heartbeat REAL
+    )
+    """)
+    # Products that predate the queue
+    cur.execute("""
+    INSERT OR IGNORE INTO embedding_queue (product_id)
+    SELECT p.id FROM products p WHERE NOT EXISTS (SELECT 1 FROM embeddings e WHERE e.product_id = p.id)
+    """)
 
-    conn.commit()
     cur.close()
-    conn.close()
@@ -0,0 +1,64 @@
+"""Wake idle embedding workers as soon as new products are committed.
+
+Producers (`/upload-csv`, upload jobs, batch_normalize --load) call `notify()`,
+which sends one UDP datagram to `EMBED_WAKE_ADDR` and never blocks or fails.
+`embedding_worker` waits on a `WakeListener` instead of sleeping. Workers bind
+with SO_REUSEPORT, so several can listen, and the kernel hands each datagram to
+one of them. The rest still wake on their idle timeout. Set `EMBED_WAKE_ADDR=`
+to disable.
+"""
+import os
+import time
+import select
+import socket
+
+EMBED_WAKE_ADDR = os.getenv("EMBED_WAKE_ADDR", "127.0.0.1:8765")
+
+
+def _address():
+    host, port = EMBED_WAKE_ADDR.rsplit(":", 1)
+    return host, int(port)
+
+
+def notify():
+    """Tell an embedding worker there is new work (best effort)."""
+    if not EMBED_WAKE_ADDR:
+        return
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b"1", _address())
+    except OSError:
+        pass
+
+
+class WakeListener:
+    def __init__(self):
+        self.sock = None
+        if not EMBED_WAKE_ADDR:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            if hasattr(socket, "SO_REUSEPORT"):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(_address())
+            sock.setblocking(False)
+            self.sock = sock
+        except OSError as e:
+            sock.close()
+            print(f"Cannot listen for wakeups on {EMBED_WAKE_ADDR} ({e}); falling back to polling")
+
+    def wait(self, timeout):
+        """Block until notified or `timeout` seconds pass. Returns True if notified."""
+        if self.sock is None:
+            time.sleep(timeout)
+            return False
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        if not ready:
+            return False
+        # Coalesce a burst of notifications into one wakeup
+        try:
+            while True:
+                self.sock.recv(16)
+        except BlockingIOError:
+            pass
+        return True
@@ -0,0 +1,99 @@
+"""Apply review decisions to products and record them in `feedback`.
+
+Used by `/submit-feedback` and `/submit-feedback/bulk`. Items take effect as if
+applied one at a time in request order, but are batched: the request is split
+into runs of consecutive items whose products have distinct `text_hash`es. Items
+in such a run cannot affect one another (propagation only reaches products
+with the same hash), so each run is applied with a fixed number of `executemany`
+statements whatever its length.
+"""
+from db_adapter import bump_index_version
+
+# SQLite caps bound parameters per statement
+_IN_CHUNK = 500
+
+# multiplicity = the reviewed product plus every pending product the decision fans out to
+_INSERT_SQL = """
+    INSERT INTO feedback (product_id, is_approved, correction, multiplicity)
+    SELECT :pid, :approved, :correction, 1 + CASE WHEN :propagate THEN (
+        SELECT COUNT(*) FROM products
+        WHERE needs_review = 1 AND text_hash = :hash AND id != :pid
+          AND (NOT :same_upload OR upload_id IS (SELECT upload_id FROM products WHERE id = :pid))
+    ) ELSE 0 END
+"""
+# A correction sets the value; an approval confirms the reviewed product's current value
+_OWN_SQL = "UPDATE products SET normalized_value = COALESCE(:value, normalized_value), needs_review = 0 WHERE id = :pid"
+_FANOUT_SQL = """
+    UPDATE products
+    SET normalized_value = COALESCE(:value, (SELECT normalized_value FROM products WHERE id = :pid)), needs_review = 0
+    WHERE needs_review = 1 AND text_hash = :hash AND id != :pid
+      AND (NOT :same_upload OR upload_id IS (SELECT upload_id FROM products WHERE id = :pid))
+"""
+
+
+def _product_hashes(cur, ids):
+    """{product_id: text_hash} for the ids that exist."""
+    ids = list(ids)
+    found = {}
+    for start in range(0, len(ids), _IN_CHUNK):
+        chunk = ids[start:start + _IN_CHUNK]
+        cur.execute(f"SELECT id, COALESCE(text_hash, text_hash(text_content)) FROM products "
+                    f"WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        found.update((r[0], r[1]) for r in cur.fetchall())
+    return found
+
+
+def _apply_run(cur, run):
+    """Apply one run of independent items; returns the products updated per item."""
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM feedback")
+    last_id = cur.fetchone()[0]
+    # Counts are taken before any update in the run, which is exact because the items are independent
+    cur.executemany(_INSERT_SQL, run)
+    cur.executemany(_OWN_SQL, run)
+    cur.executemany(_FANOUT_SQL, [p for p in run if p["propagate"]])
+    # AUTOINCREMENT ids follow insertion order, and this transaction holds the write lock
+    cur.execute("SELECT multiplicity FROM feedback WHERE id > ? ORDER BY id", (last_id,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def apply_feedback(cur, items):
+    """Apply feedback items in request order without committing.
+
+    Each item needs `product_id`, `is_approved`, `correction`, `propagate` and
+    `same_upload_only`. With `propagate`, the decision also goes to every pending
+    product with the same `text_hash` (only within the reviewed product's upload
+    with `same_upload_only`). One `feedback` row per item records how many
+    products it covered in `multiplicity`. Returns that count per item (0 if the
+    product does not exist). The 'feedback' stamp (watched for vector_index) is
+    bumped once for the whole call.
+    """
+    hashes = _product_hashes(cur, {f.product_id for f in items})
+    updated = [0] * len(items)
+    run, positions, seen = [], [], set()
+
+    def flush():
+        for pos, count in zip(positions, _apply_run(cur, run)):
+            updated[pos] = count
+        run.clear()
+        positions.clear()
+        seen.clear()
+
+    for pos, f in enumerate(items):
+        if f.product_id not in hashes:
+            continue
+        h = hashes[f.product_id]
+        key = h if h is not None else ("product", f.product_id)
+        if key in seen:
+            flush()
+        seen.add(key)
+        positions.append(pos)
+        run.append({
+            "pid": f.product_id, "approved": int(f.is_approved), "correction": f.correction,
+            "value": f.correction or None, "hash": h,
+            "propagate": int(f.propagate), "same_upload": int(f.same_upload_only),
+        })
+    if run:
+        flush()
+    if any(updated):
+        bump_index_version("feedback", cur.connection)
+    return updated
@@ -0,0 +1,226 @@
+"""In-process lookup indexes built from reference tables.
+
+Each index is an immutable snapshot of its table tagged with the change stamp
+(`index_versions`) it was built from. Callers refresh once per request or batch;
+the lookups themselves never touch the DB.
+"""
+import difflib
+import threading
+from collections import Counter
+from types import MappingProxyType
+
+from db_adapter import connection, get_index_version
+
+
+class VocabularyIndex:
+    """Immutable token -> (normalized, category) map loaded from `vocabulary`."""
+
+    __slots__ = ("version", "_entries")
+
+    def __init__(self, entries, version=0):
+        self._entries = MappingProxyType(dict(entries))
+        self.version = version
+
+    @classmethod
+    def load(cls, conn=None):
+        if conn is None:
+            with connection() as conn:
+                return cls.load(conn)
+        # Read the stamp first: a write racing the SELECT leaves us with an
+        # older stamp, which only causes one extra rebuild later.
+        version = get_index_version("vocabulary", conn)
+        cur = conn.cursor()
+        cur.execute("SELECT token, normalized, category FROM vocabulary")
+        entries = {r[0]: (r[1], r[2]) for r in cur.fetchall() if r[0] and r[1]}
+        cur.close()
+        return cls(entries, version)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, raw_text):
+        """Returns (normalized, confidence, source) or (None, 0.0, None)."""
+        if not raw_text:
+            return None, 0.0, None
+        lower = raw_text.strip().lower()
+        # Exact (whole string) match
+        hit = self._entries.get(lower)
+        if hit:
+            return hit[0], 1.0, hit[1] or 'vocab'
+        # Token-level mapping (replace tokens that have a mapping)
+        mapped = []
+        any_mapped = False
+        categories = set()
+        for t in lower.split():
+            hit = self._entries.get(t)
+            if hit:
+                mapped.append(hit[0])
+                any_mapped = True
+                if hit[1]:
+                    categories.add(hit[1])
+            else:
+                mapped.append(t)
+        if any_mapped:
+            cat = ",".join(sorted(categories)) if categories else 'vocab'
+            return " ".join(mapped), 1.0, cat
+        return None, 0.0, None
+
+
+class TaxonomyIndex:
+    """Character-trigram inverted index over `taxonomy_reference` labels and paths.
+
+    Each label and each path is indexed as its own document. A query shortlists
+    the `top_k` documents sharing the most trigrams (Dice overlap), then only
+    those entries are scored with `difflib.SequenceMatcher` the same way the old
+    full-table scan scored every row.
+    """
+
+    __slots__ = ("version", "_entries", "_postings", "_doc_grams", "_max_df")
+
+    def __init__(self, entries, version=0, max_df=0.1):
+        # entries: [(path, label), ...] in table order
+        self._entries = tuple((path or '', label or '') for path, label in entries)
+        self.version = version
+        postings = {}
+        doc_grams = []
+        for i, (path, label) in enumerate(self._entries):
+            for doc, text in ((2 * i, label), (2 * i + 1, path)):
+                grams = _trigrams(text.lower()) if text else frozenset()
+                doc_grams.append(len(grams))
+                for g in grams:
+                    postings.setdefault(g, []).append(doc)
+        self._postings = MappingProxyType({g: tuple(docs) for g, docs in postings.items()})
+        self._doc_grams = tuple(doc_grams)
+        # Trigrams shared by more docs than this are skipped while shortlisting
+        self._max_df = max(50, int(len(doc_grams) * max_df))
+
+    @classmethod
+    def load(cls, conn=None):
+        if conn is None:
+            with connection() as conn:
+                return cls.load(conn)
+        version = get_index_version("taxonomy", conn)
+        cur = conn.cursor()
+        cur.execute("SELECT taxonomy_path, label FROM taxonomy_reference ORDER BY id")
+        entries = [(r[0], r[1]) for r in cur.fetchall()]
+        cur.close()
+        return cls(entries, version)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def shortlist(self, lower, top_k=50):
+        """Return entry ids of the best trigram matches for an already lowercased query."""
+        grams = _trigrams(lower)
+        if not grams:
+            return []
+        by_df = sorted(grams, key=lambda g: len(self._postings.get(g, ())))
+        selective = [g for g in by_df if len(self._postings.get(g, ())) <= self._max_df]
+        if 2 * len(selective) < len(by_df):
+            # Mostly common trigrams (short or generic query): the rare ones alone
+            # are not enough signal, so pay for the full postings
+            selective = by_df
+        hits = Counter()
+        for g in selective:
+            hits.update(self._postings.get(g, ()))
+        if not hits:
+            return []
+        nq = len(grams)
+        scored = sorted(hits.items(), key=lambda kv: -2.0 * kv[1] / (nq + self._doc_grams[kv[0]]))
+        ids = []
+        seen = set()
+        for doc, _ in scored:
+            entry = doc // 2
+            if entry not in seen:
+                seen.add(entry)
+                ids.append(entry)
+                if len(ids) >= top_k:
+                    break
+        return ids
+
+    def search(self, raw_text, threshold=0.7, top_k=50):
+        """Returns (taxonomy_label_or_path, confidence) or (None, 0.0)."""
+        if not raw_text:
+            return None, 0.0
+        lower = raw_text.strip().lower()
+        # Score in table order so ties resolve the same way as a full scan
+        candidates = sorted(self.shortlist(lower, top_k))
+        sm = difflib.SequenceMatcher(None)
+        sm.set_seq1(lower)
+        best = None
+        best_score = 0.0
+        for i in candidates:
+            path, label = self._entries[i]
+            score_label = _ratio_above(sm, label.lower(), best_score) if label else 0.0
+            score_path = _ratio_above(sm, path.lower(), best_score) if path else 0.0
+            score = max(score_label, score_path)
+            if score > best_score:
+                best_score = score
+                best = label if score_label >= score_path else path
+        if best and best_score >= threshold:
+            # confidence tuned slightly below exact vocab
+            return best, round(best_score, 2)
+        return None, 0.0
+
+
+def _trigrams(text):
+    """Distinct character trigrams of `text`, padded so short words still index."""
+    padded = f" {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _ratio_above(sm, candidate, floor):
+    """SequenceMatcher ratio against `candidate`, or 0.0 if it cannot beat `floor`."""
+    sm.set_seq2(candidate)
+    if sm.real_quick_ratio() <= floor or sm.quick_ratio() <= floor:
+        return 0.0
+    return sm.ratio()
+
+
+_lock = threading.Lock()
+_snapshots = {}
+_loaders = {"vocabulary": VocabularyIndex, "taxonomy": TaxonomyIndex}
+
+
+def _get(name):
+    index = _snapshots.get(name)
+    if index is None:
+        index = _refresh(name)
+    return index
+
+
+def _refresh(name, force=False):
+    with _lock:
+        current = _snapshots.get(name)
+        if current is not None and not force:
+            if get_index_version(name) == current.version:
+                return current
+        index = _loaders[name].load()
+        # Single reference assignment: readers see the old or the new snapshot, never a mix
+        _snapshots[name] = index
+        print(f"Loaded {name} index: {len(index)} entries (version {index.version})")
+        return index
+
+
+def get_vocabulary_index():
+    """Return the current vocabulary snapshot, building it on first use."""
+    return _get("vocabulary")
+
+
+def refresh_vocabulary_index(force=False):
+    """Rebuild the vocabulary snapshot if its change stamp moved.
+
+    This costs one indexed SELECT when nothing changed; call it once per upload,
+    not per row.
+    """
+    return _refresh("vocabulary", force)
+
+
+def get_taxonomy_index():
+    """Return the current taxonomy snapshot, building it on first use."""
+    return _get("taxonomy")
+
+
+def refresh_taxonomy_index(force=False):
+    """Rebuild the taxonomy snapshot if `taxonomy_reference` was reseeded."""
+    return _refresh("taxonomy", force)
@@ -0,0 +1,106 @@
+"""Streaming CSV ingest: decode + parse incrementally and insert in fixed-size batches.
+
+Peak memory is bounded by `UPLOAD_BATCH_SIZE` rows plus one read chunk,
+regardless of how large the uploaded file is.
+"""
+import codecs
+import csv
+import os
+
+from db_adapter import text_hash
+from normalizer import normalize_rows
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "1000"))
+
+INSERT_PRODUCT_SQL = ("INSERT INTO products (text_content, normalized_value, needs_review, confidence, text_hash, upload_id) "
+                      "VALUES (?, ?, ?, ?, ?, ?)")
+
+
+def iter_line_offsets(fh, chunk_size=UPLOAD_CHUNK_SIZE, encoding='utf-8'):
+    """Yield (line, end) for each decoded line (with its '\\n') of a binary file object, one chunk at a time.
+
+    `end` is the byte offset just past the line, counted from where reading
+    started. Lines are split on raw b'\\n' bytes before decoding, which is exact
+    for UTF-8 and other ASCII-compatible encodings.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = b''
+    offset = 0
+    while True:
+        chunk = fh.read(chunk_size)
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            offset += len(line) + 1
+            yield decoder.decode(line + b'\n'), offset
+        if not chunk:
+            break
+    tail = decoder.decode(pending, final=True)
+    if tail:
+        yield tail, offset + len(pending)
+
+
+def iter_text_lines(fh, chunk_size=UPLOAD_CHUNK_SIZE, encoding='utf-8'):
+    """Yield decoded lines (with their '\\n') from a binary file object, one chunk at a time."""
+    for line, _ in iter_line_offsets(fh, chunk_size, encoding):
+        yield line
+
+
+def iter_raw_batches(fh, batch_size=UPLOAD_BATCH_SIZE, skip_header=True, skip_rows=0, offsets=False):
+    """Yield lists of raw values (first CSV column) of at most `batch_size` rows.
+
+    `skip_rows` non-empty data rows are dropped first (used to resume a job).
+    With `offsets=True` each item is (batch, end), `end` being the byte offset
+    just past the batch's last row. Unlike `fh.tell()`, it does not run ahead
+    into rows still buffered for the next batch.
+    """
+    end = 0
+
+    def lines():
+        nonlocal end
+        for line, end in iter_line_offsets(fh):
+            yield line
+
+    # csv.reader pulls only the lines of the row it returns, so `end` stays on that row's boundary
+    reader = csv.reader(lines())
+    if skip_header:
+        next(reader, None)
+    batch = []
+    for row in reader:
+        if row:
+            if skip_rows:
+                skip_rows -= 1
+                continue
+            batch.append(row[0])
+            if len(batch) >= batch_size:
+                yield (batch, end) if offsets else batch
+                batch = []
+    if batch:
+        yield (batch, end) if offsets else batch
+
+
+def insert_rows(cur, raws, results, upload_id=None):
+    """Queue inserts for one normalized batch on `cur` without committing."""
+    cur.executemany(INSERT_PRODUCT_SQL, [
+        (raw, normalized, needs_review, confidence, text_hash(raw), upload_id)
+        for raw, (normalized, confidence, needs_review) in zip(raws, results)
+    ])
+
+
+def insert_batch(conn, raws, results, upload_id=None):
+    """Insert one normalized batch in its own transaction."""
+    cur = conn.cursor()
+    insert_rows(cur, raws, results, upload_id)
+    conn.commit()
+    cur.close()
+
+
+def ingest_csv(fh, conn, model=None, has_proba=False, batch_size=UPLOAD_BATCH_SIZE, cache=None, upload_id=None):
+    """Normalize and insert every row of a CSV file object. Returns the number of rows inserted."""
+    count = 0
+    for raws in iter_raw_batches(fh, batch_size):
+        results = normalize_rows(raws, model, has_proba, cache=cache)
+        insert_batch(conn, raws, results, upload_id)
+        count += len(raws)
+    return count
@@ -1,123 +1,112 @@
 import os
-import csv
 import io
-import boto3
-import joblib
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
+import uuid
+import csv
+import json
+import base64
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, UploadFile, File, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 
-from db_adapter import get_connection, ensure_tables
+from db_adapter import connection, get_connection, ensure_tables, bump_index_version
+from indexes import get_vocabulary_index, get_taxonomy_index, refresh_vocabulary_index, refresh_taxonomy_index
+from normalizer import vocabulary_lookup, taxonomy_search, model_version, THRESHOLD_CONFIDENCE, VECTOR_STAGE
+from ingest import ingest_csv
+from feedback import apply_feedback
+from result_cache import NormalizationCache
+from model_store import EMPTY_BUNDLE, load_artifact, warm_up
+import upload_jobs
+import retrain_jobs
+import version_watch
+import archiver
+import embed_notify
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Schema check is one pragma read when the DB already carries the current SCHEMA_VERSION
+    await run_in_threadpool(ensure_tables)
+    # Load the model off the startup path; uploads wait for it in _prepare_waterfall
+    _model_ready.clear()
+    threading.Thread(target=_initial_model_load, name="model-load", daemon=True).start()
+    # Background upload jobs; also resumes jobs left unfinished by a previous process
+    upload_jobs.start_worker(_prepare_waterfall)
+    # R2 archival of raw uploads, including retries spooled before a restart
+    archiver.start_worker()
+    # Follow model reloads and vocabulary/taxonomy edits made through any worker. The first
+    # poll loads the indexes in the watcher thread, so startup does not wait on them either.
+    handlers = {
+        "model": load_model,
+        "vocabulary": refresh_vocabulary_index,
+        "taxonomy": refresh_taxonomy_index,
+    }
+    if VECTOR_STAGE:
+        # New approvals and embeddings are folded into the nearest-approved-product index
+        from vector_index import refresh_vector_index
+        handlers["feedback"] = handlers["embeddings"] = refresh_vector_index
+    version_watch.start_watcher(handlers)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+# Live model: an immutable ModelBundle, replaced in one assignment by load_model()
+model_bundle = EMPTY_BUNDLE
+MODEL_PATH = os.getenv("NORMALIZATION_MODEL_PATH", "normalization_model.joblib")
+_reload_lock = threading.Lock()
+# Set once the startup load of MODEL_PATH has finished (loaded, missing or failed)
+_model_ready = threading.Event()
+# Longest an upload waits for that load before failing instead of skipping the model
+MODEL_LOAD_TIMEOUT_SECONDS = float(os.getenv("MODEL_LOAD_TIMEOUT_SECONDS", "300"))
 
-app = FastAPI()
+# Waterfall results keyed by raw text; invalidated when the model, vocabulary or taxonomy change
+normalization_cache = NormalizationCache()
 
-# Ensure local DB schema exists (SQLite for local testing)
-ensure_tables()
 
+def load_model(force=False):
+    """Load MODEL_PATH, warm it up, then swap it in.
 
-import difflib
+    Returns True if MODEL_PATH is now the live model (just swapped in, or already
+    current), False if there is no file or it failed to load. Requests keep using
+    the previous bundle until the swap, and a file that fails to load or warm up
+    never replaces a working model.
+    """
+    global model_bundle
+    with _reload_lock:
+        if not os.path.exists(MODEL_PATH):
+            print("No normalization_model.joblib found; starting without a model")
+            model_bundle = EMPTY_BUNDLE
+            return False
+        if not force and model_bundle.stamp is not None and model_bundle.stamp == model_version(MODEL_PATH):
+            return True
+        try:
+            bundle = load_artifact(MODEL_PATH)
+            warm_up(bundle)
+        except Exception as e:
+            print(f"Failed to load model: {e}")
+            return False
+        model_bundle = bundle
+        print(f"Loaded normalization model {bundle.version} from {MODEL_PATH}. has_proba={bundle.has_proba}")
+        return True
 
 
-def vocabulary_lookup(raw_text: str):
-    """Look up direct vocabulary mappings. Returns (normalized, confidence, source) or (None, 0.0, None)."""
-    if not raw_text:
-        return None, 0.0, None
-    conn = get_connection()
-    cur = conn.cursor()
+def _initial_model_load():
     try:
-        s = raw_text.strip()
-        lower = s.lower()
-        # Exact (whole string) match
-        cur.execute("SELECT normalized, category FROM vocabulary WHERE token = ?", (lower,))
-        row = cur.fetchone()
-        if row and row[0]:
-            return row[0], 1.0, row[1] or 'vocab'
-        # Token-level mapping (replace tokens that have a mapping)
-        tokens = lower.split()
-        mapped = []
-        any_mapped = False
-        categories = set()
-        for t in tokens:
-            cur.execute("SELECT normalized, category FROM vocabulary WHERE token = ?", (t,))
-            r = cur.fetchone()
-            if r and r[0]:
-                mapped.append(r[0])
-                any_mapped = True
-                if r[1]:
-                    categories.add(r[1])
-            else:
-                mapped.append(t)
-        if any_mapped:
-            cat = ",".join(sorted(categories)) if categories else 'vocab'
-            return " ".join(mapped), 1.0, cat
-        return None, 0.0, None
+        load_model()
     finally:
-        cur.close()
-        conn.close()
+        _model_ready.set()
 
 
-def taxonomy_search(raw_text: str, threshold: float = 0.7):
-    """Do a lightweight semantic search over taxonomy_reference using difflib.
-    Returns (taxonomy_label_or_path, confidence) or (None, 0.0).
-    """
-    if not raw_text:
-        return None, 0.0
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        lower = raw_text.strip().lower()
-        cur.execute("SELECT taxonomy_path, label FROM taxonomy_reference")
-        candidates = cur.fetchall()
-        best = None
-        best_score = 0.0
-        for row in candidates:
-            path = (row[0] or '')
-            label = (row[1] or '')
-            # check label first
-            score_label = difflib.SequenceMatcher(None, lower, label.lower()).ratio() if label else 0.0
-            score_path = difflib.SequenceMatcher(None, lower, path.lower()).ratio() if path else 0.0
-            score = max(score_label, score_path)
-            if score > best_score:
-                best_score = score
-                best = label if score_label >= score_path else path
-        if best and best_score >= threshold:
-            # confidence tuned slightly below exact vocab
-            return best, round(best_score, 2)
-        return None, 0.0
-    finally:
-        cur.close()
-        conn.close()
-
-# Model holder
-normalization_model = None
-model_has_proba = False
-MODEL_PATH = os.getenv("NORMALIZATION_MODEL_PATH", "normalization_model.joblib")
-THRESHOLD_CONFIDENCE = float(os.getenv("NORMALIZATION_CONFIDENCE_THRESHOLD", "0.9"))
+class ModelUnavailable(Exception):
+    """MODEL_PATH exists but is not loaded, so an upload would skip the model stage."""
 
 
-def load_model():
-    global normalization_model, model_has_proba
-    if os.path.exists(MODEL_PATH):
-        try:
-            normalization_model = joblib.load(MODEL_PATH)
-            model_has_proba = hasattr(normalization_model, "predict_proba")
-            print(f"Loaded normalization model from {MODEL_PATH}. has_proba={model_has_proba}")
-            return True
-        except Exception as e:
-            print(f"Failed to load model: {e}")
-            normalization_model = None
-            model_has_proba = False
-            return False
-    else:
-        print("No normalization_model.joblib found; starting without a model")
-        normalization_model = None
-        model_has_proba = False
-        return False
-
-# Try load at startup
-load_model()
-
 # Enable CORS for frontend communication
 app.add_middleware(
     CORSMiddleware,
@@ -125,6 +114,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination cursor for /products and /products-for-review; browsers hide non-safelisted headers otherwise
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -133,18 +124,128 @@ class Feedback(BaseModel):
     product_id: int
     is_approved: bool
     correction: Optional[str] = None
+    # Apply the same decision to every other pending product with the same text
+    propagate: bool = True
+    # ...but only within the upload the reviewed product came from
+    same_upload_only: bool = False
 
 @app.get("/")
 def read_root():
     return {"message": "CSV-Sorter API is running"}
 
-@app.get("/products-for-review")
-def get_products_for_review():
-    """Return products that need human review (SQLite implementation)."""
+
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque keyset cursor for the (created_at, id) position of the last row on a page."""
+    return base64.urlsafe_b64encode(f"{created_at}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return created_at, int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_query(select, where, descending, cursor, limit):
+    """Build (sql, params) for one keyset page of `select` ordered by (created_at, id).
+
+    Seeks past `cursor` with a row-value comparison, so every page is an index
+    range scan no matter how deep into the table it is. `limit=None` means no limit.
+    """
+    clauses = [where] if where else []
+    params = []
+    if cursor:
+        clauses.append(f"(created_at, id) {'<' if descending else '>'} (?, ?)")
+        params.extend(decode_cursor(cursor))
+    order = "DESC" if descending else "ASC"
+    sql = select
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY created_at {order}, id {order}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(min(max(limit, 1), MAX_PAGE_SIZE))
+    return sql, params
+
+
+def keyset_page(cur, select, where, descending, cursor, limit):
+    cur.execute(*keyset_query(select, where, descending, cursor, limit))
+    return cur.fetchall()
+
+
+STREAM_FETCH_SIZE = int(os.getenv("STREAM_FETCH_SIZE", "1000"))
+# products column names keyed by PRAGMA schema_version (bumped by any DDL)
+_products_columns = {}
+
+
+def products_columns(cur):
+    """Column names of `products`, re-read only when the schema changes."""
+    cur.execute("PRAGMA schema_version")
+    version = cur.fetchone()[0]
+    cols = _products_columns.get(version)
+    if cols is None:
+        cur.execute("PRAGMA table_info(products)")
+        cols = [r[1] for r in cur.fetchall()]
+        _products_columns.clear()
+        _products_columns[version] = cols
+    return cols
+
+
+def _stream_products(all, cursor, format):
+    """Yield a product dump as NDJSON lines or CSV text, `STREAM_FETCH_SIZE` rows at a time."""
+    # The generator is advanced from threadpool threads, so it owns a dedicated connection
     conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, text_content, normalized_value, confidence FROM products WHERE needs_review = 1 ORDER BY created_at ASC LIMIT 50")
-    rows = cur.fetchall()
+    try:
+        cur = conn.cursor()
+        cols = products_columns(cur)
+        if all:
+            cur.execute(*keyset_query("SELECT * FROM products", None, True, cursor, None))
+        else:
+            cur.execute(*keyset_query("SELECT * FROM products", "needs_review = 1", False, cursor, None))
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if format == "csv":
+            writer.writerow(cols)
+            yield buf.getvalue()
+        while True:
+            rows = cur.fetchmany(STREAM_FETCH_SIZE)
+            if not rows:
+                break
+            if format == "csv":
+                buf.seek(0)
+                buf.truncate()
+                writer.writerows(rows)
+                yield buf.getvalue()
+            else:
+                yield "".join(json.dumps(dict(zip(cols, r)), default=str) + "\n" for r in rows)
+        cur.close()
+    finally:
+        conn.close()
+
+
+def set_next_cursor(response, rows, limit, created_at_idx, id_idx):
+    """Expose the next page's cursor in `X-Next-Cursor` when the page came back full."""
+    if limit is not None and rows and len(rows) >= min(max(limit, 1), MAX_PAGE_SIZE):
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last[created_at_idx], last[id_idx])
+
+
+@app.get("/products-for-review")
+def get_products_for_review(response: Response, cursor: Optional[str] = None, limit: int = 50):
+    """Return products that need human review (SQLite implementation).
+
+    Oldest first, `limit` per page; pass the `X-Next-Cursor` response header back as `cursor` for the next page.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        rows = keyset_page(cur, "SELECT id, text_content, normalized_value, confidence, created_at FROM products",
+                           "needs_review = 1", False, cursor, limit)
+        cur.close()
+    set_next_cursor(response, rows, limit, 4, 0)
     results = []
     for r in rows:
         results.append({
@@ -153,170 +254,234 @@ def get_products_for_review():
             "normalized": r[2],
             "confidence": round(r[3] or 0.0, 2)
         })
-    cur.close()
-    conn.close()
     return results
 
 
 @app.get("/get_products_for_review")
-def get_products_for_review_alias():
+def get_products_for_review_alias(response: Response, cursor: Optional[str] = None, limit: int = 50):
     """Alias endpoint matching original plan name."""
-    return get_products_for_review()
+    return get_products_for_review(response, cursor, limit)
 
 
 @app.get("/products")
-def get_products(all: bool = False):
+def get_products(response: Response, all: bool = False, cursor: Optional[str] = None, limit: Optional[int] = None,
+                 format: str = "json"):
     """Return products from the DB.
     If `all` is false (default) return items where `needs_review = 1` for human review.
     If `all` is true, return all products.
     This will return every column present in the `products` table so the frontend can consume Shopify-like fields when present.
+    Pass `limit` (and then `cursor` from the `X-Next-Cursor` header) to page through large tables.
+    `format=ndjson` or `format=csv` streams the full result (from `cursor`, if given) as it is read.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    # Get column names so we can return complete objects even if schema evolves
-    cur.execute("PRAGMA table_info(products)")
-    cols = [r[1] for r in cur.fetchall()]
-
-    if all:
-        cur.execute("SELECT * FROM products ORDER BY created_at DESC")
-    else:
-        cur.execute("SELECT * FROM products WHERE needs_review = 1 ORDER BY created_at ASC")
-
-    rows = cur.fetchall()
+    if cursor:
+        decode_cursor(cursor)  # reject a bad cursor before a stream starts
+    if format in ("ndjson", "csv"):
+        media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+        return StreamingResponse(_stream_products(all, cursor, format), media_type=media_type)
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be json, ndjson or csv")
+
+    with connection() as conn:
+        cur = conn.cursor()
+        # Get column names so we can return complete objects even if schema evolves
+        cols = products_columns(cur)
+
+        if all:
+            rows = keyset_page(cur, "SELECT * FROM products", None, True, cursor, limit)
+        else:
+            rows = keyset_page(cur, "SELECT * FROM products", "needs_review = 1", False, cursor, limit)
+        cur.close()
+    set_next_cursor(response, rows, limit, cols.index("created_at"), cols.index("id"))
     results = []
     for r in rows:
         results.append({cols[i]: r[i] for i in range(len(cols))})
-
-    cur.close()
-    conn.close()
     return results
 
 @app.post("/submit-feedback")
 def submit_feedback(feedback: Feedback):
-    """Store human feedback and clear needs_review flag."""
-    conn = get_connection()
-    cur = conn.cursor()
-    # Insert feedback
-    cur.execute("INSERT INTO feedback (product_id, is_approved, correction) VALUES (?, ?, ?)",
-                (feedback.product_id, int(feedback.is_approved), feedback.correction))
-    # Update product: set needs_review false and update normalized value if correction provided
-    if feedback.correction:
-        cur.execute("UPDATE products SET normalized_value = ?, needs_review = 0 WHERE id = ?",
-                    (feedback.correction, feedback.product_id))
-    else:
-        cur.execute("UPDATE products SET needs_review = 0 WHERE id = ?", (feedback.product_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
-    return {"status": "success"}
+    """Store human feedback and clear needs_review flag (on identical pending products too, see `propagate`)."""
+    with connection() as conn:
+        cur = conn.cursor()
+        updated = apply_feedback(cur, [feedback])[0]
+        cur.close()
+    if not updated:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"status": "success", "updated": updated}
+
+def _prepare_waterfall():
+    """Refresh the reference indexes and snapshot the model for one upload.
+
+    Returns (model, has_proba, cache) with the result cache bound to the current
+    vocabulary/taxonomy/model (and, with VECTOR_STAGE, vector index) generation.
+    Waits for the startup model load, and raises ModelUnavailable rather than
+    sending every row to review when a model file exists but is not loaded.
+    Only a missing model file lets rows skip the model stage.
+    """
+    if not _model_ready.wait(MODEL_LOAD_TIMEOUT_SECONDS):
+        raise ModelUnavailable(f"Model {MODEL_PATH} is still loading after {MODEL_LOAD_TIMEOUT_SECONDS:.0f}s")
+    if model_bundle.model is None and os.path.exists(MODEL_PATH):
+        raise ModelUnavailable(f"Model {MODEL_PATH} failed to load; see the server log")
+    # Kept current by the version watcher, so no stamp queries here
+    vocab = get_vocabulary_index()
+    taxonomy = get_taxonomy_index()
+    # Snapshot the model once so a concurrent reload cannot change it mid-upload
+    bundle = model_bundle
+    generation = (vocab.version, taxonomy.version, bundle.version)
+    if VECTOR_STAGE:
+        from vector_index import get_vector_index
+        generation += (get_vector_index().version,)
+    normalization_cache.bind(generation)
+    return bundle.model, bundle.has_proba, normalization_cache
+
+
+def _archive_upload(file: UploadFile):
+    """Spool the raw upload for background archival to Cloudflare R2 (if configured), then rewind it."""
+    if not archiver.enabled():
+        return
+    try:
+        archiver.enqueue(file.file, f"raw_uploads/{file.filename}")
+    except Exception as e:
+        print(f"Failed to spool upload for R2: {e}")
+        file.file.seek(0)
+
+
+def _archive_spooled(path, filename):
+    """Queue an upload already spooled at `path` for R2 archival (if configured)."""
+    if not archiver.enabled():
+        return
+    try:
+        archiver.enqueue_path(path, f"raw_uploads/{filename}")
+    except Exception as e:
+        print(f"Failed to spool upload for R2: {e}")
+
+
+def _ingest_upload(fh, upload_id):
+    # WATERFALL: 1) vocabulary, 2) taxonomy semantic search, 3) ML model (batched)
+    model, has_proba, cache = _prepare_waterfall()
+    with connection() as conn:
+        return ingest_csv(fh, conn, model, has_proba, cache=cache, upload_id=upload_id)
+
+
+MAX_FEEDBACK_BATCH = int(os.getenv("MAX_FEEDBACK_BATCH", "10000"))
+
+
+@app.post("/submit-feedback/bulk")
+def submit_feedback_bulk(items: List[Feedback]):
+    """Apply many feedback items in a single transaction.
+
+    Same effect as calling `/submit-feedback` once per item, in order, but with one
+    commit. Returns a per-item status (`success` or `not_found`) in request order.
+    """
+    if len(items) > MAX_FEEDBACK_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_FEEDBACK_BATCH} items per request")
+    with connection() as conn:
+        cur = conn.cursor()
+        updated = apply_feedback(cur, items)
+        cur.close()
+    results = [{"product_id": f.product_id, "status": "success" if n else "not_found", "updated": n}
+               for f, n in zip(items, updated)]
+    applied = sum(1 for r in results if r["status"] == "success")
+    return {"status": "success", "applied": applied, "results": results}
+
 
 @app.post("/upload-csv")
 async def upload_csv(file: UploadFile = File(...)):
-    """Upload CSV, run initial normalization (joblib) if available, and mark items for review as needed."""
-    content = await file.read()
-    decoded = content.decode('utf-8')
+    """Upload CSV, run initial normalization (joblib) if available, and mark items for review as needed.
 
-    # Archive to Cloudflare R2 (if configured)
-    if os.getenv("R2_BUCKET_NAME"):
-        try:
-            s3 = boto3.client(
-                's3',
-                endpoint_url=os.getenv("R2_ENDPOINT_URL"),
-                aws_access_key_id=os.getenv("R2_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("R2_SECRET_ACCESS_KEY")
-            )
-            s3.put_object(Bucket=os.getenv("R2_BUCKET_NAME"), Key=f"raw_uploads/{file.filename}", Body=content)
-            print(f"Archived {file.filename} to R2")
-        except Exception as e:
-            print(f"Failed to upload to R2: {e}")
+    The spooled upload is streamed through an incremental decoder and inserted in
+    `UPLOAD_BATCH_SIZE` batches (one transaction each) off the event loop.
+    """
+    await run_in_threadpool(_archive_upload, file)
+    upload_id = uuid.uuid4().hex
+    try:
+        count = await run_in_threadpool(_ingest_upload, file.file, upload_id)
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    embed_notify.notify()
+    return {"message": f"Successfully uploaded {count} products", "upload_id": upload_id}
+
+
+@app.post("/upload-jobs")
+async def create_upload_job(file: UploadFile = File(...)):
+    """Queue a CSV for background normalization and return its job id immediately.
+
+    Poll `GET /jobs/{job_id}` for progress. Batches commit with a checkpoint, so an
+    interrupted job resumes from its last committed row instead of restarting.
+    """
+    # Archived from the job's spool file, so the upload is written to disk once
+    job_id = await run_in_threadpool(upload_jobs.create_job, file.file, file.filename,
+                                     lambda path: _archive_spooled(path, file.filename))
+    return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+
+@app.get("/jobs/{job_id}")
+def get_upload_job(job_id: str):
+    """Progress of an upload job: rows committed, rows/sec, stage hit counts and ETA."""
+    job = upload_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/jobs/{job_id}/resume")
+def resume_upload_job(job_id: str):
+    """Requeue a failed upload job from its last checkpoint."""
+    if not upload_jobs.resume_job(job_id):
+        raise HTTPException(status_code=409, detail="Only failed jobs can be resumed")
+    return {"job_id": job_id, "status": "queued"}
 
-    csv_reader = csv.reader(io.StringIO(decoded))
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Skip header
-    next(csv_reader, None)
-
-    count = 0
-    for row in csv_reader:
-        if row:
-            raw = row[0]
-            normalized = None
-            confidence = 0.0
-            needs_review = 1
-
-            # WATERFALL: 1) vocabulary, 2) taxonomy semantic search, 3) ML model
-            # 1) vocabulary
-            try:
-                voc_norm, voc_conf, voc_cat = vocabulary_lookup(raw)
-                if voc_norm:
-                    normalized = voc_norm
-                    confidence = voc_conf
-                    needs_review = 0
-                else:
-                    # 2) taxonomy semantic search
-                    tax_norm, tax_score = taxonomy_search(raw)
-                    if tax_norm:
-                        normalized = tax_norm
-                        # map tax_score (0-1) to confidence with a boost
-                        confidence = round(max(tax_score, 0.85), 2)
-                        if confidence >= THRESHOLD_CONFIDENCE:
-                            needs_review = 0
-                    else:
-                        # 3) fallback to ML model
-                        if normalization_model is not None:
-                            try:
-                                normalized = normalization_model.predict([raw])[0]
-                                # If model supports predict_proba, compute confidence
-                                if model_has_proba:
-                                    probs = normalization_model.predict_proba([raw])[0]
-                                    confidence = float(max(probs))
-                                else:
-                                    confidence = 0.0
-                                # Auto-approve if confidence meets threshold
-                                if confidence >= THRESHOLD_CONFIDENCE:
-                                    needs_review = 0
-                            except Exception as e:
-                                print(f"Model prediction failed for '{raw}': {e}")
-                                normalized = None
-                                confidence = 0.0
-                                needs_review = 1
-            except Exception as e:
-                print(f"Waterfall prediction failed for '{raw}': {e}")
-                normalized = None
-                confidence = 0.0
-                needs_review = 1
-
-            cur.execute("INSERT INTO products (text_content, normalized_value, needs_review, confidence) VALUES (?, ?, ?, ?)",
-                        (raw, normalized, needs_review, confidence))
-            count += 1
-
-    conn.commit()
-    cur.close()
-    conn.close()
-    return {"message": f"Successfully uploaded {count} products"}
 
 @app.post("/trigger-retrain")
-async def trigger_retrain(background_tasks: BackgroundTasks):
-    """Trigger a retrain in the background. Chooses SQLite offline retrain when DB_URL indicates sqlite."""
-    db_url = os.getenv("DB_URL", "sqlite")
-    if "sqlite" in db_url:
-        from AI_Project_Root.retrain_model_sqlite import retrain as sqlite_retrain
-        background_tasks.add_task(sqlite_retrain)
-    else:
-        try:
-            from AI_Project_Root.retrain_model import retrain as pg_retrain
-            background_tasks.add_task(pg_retrain)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Retrain import failed: {e}")
-    return {"message": "Retraining started in background"}
+def trigger_retrain():
+    """Queue a retrain for AI_Project_Root/retrain_worker.py. Chooses SQLite offline retrain when DB_URL indicates sqlite.
+
+    Triggers made while a retrain is still queued join that job instead of starting another.
+    """
+    kind = "sqlite" if "sqlite" in os.getenv("DB_URL", "sqlite") else "sentence"
+    job_id, coalesced = retrain_jobs.enqueue(kind)
+    return {"message": "Retrain already queued" if coalesced else "Retrain queued",
+            "job_id": job_id, "coalesced": coalesced}
+
+
+@app.get("/retrain-jobs/latest")
+def get_latest_retrain_job():
+    job = retrain_jobs.get_job()
+    if job is None:
+        raise HTTPException(status_code=404, detail="No retrain jobs yet")
+    return job
+
+
+@app.get("/retrain-jobs/{job_id}")
+def get_retrain_job(job_id: int):
+    job = retrain_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Retrain job not found")
+    return job
+
+
+@app.get("/archive/status")
+def get_archive_status():
+    """R2 archival backlog: uploads still spooled (pending or retrying) and uploads given up on."""
+    return {"enabled": archiver.enabled(), "pending": archiver.pending(), "failed": archiver.failed()}
+
+
+@app.get("/normalization-cache/stats")
+def get_normalization_cache_stats():
+    """Hit/miss counters for the normalization result cache."""
+    return normalization_cache.stats()
 
 
 @app.post("/reload_model")
-def reload_model():
-    """Reload the normalization joblib model at runtime."""
-    ok = load_model()
-    if ok:
-        return {"status": "reloaded"}
-    else:
-        raise HTTPException(status_code=500, detail="Failed to load model")
\ No newline at end of file
+def reload_model(force: bool = False):
+    """Reload the normalization joblib model at runtime; in-flight uploads finish on the old model.
+
+    Other workers pick the new model up through the 'model' stamp within RELOAD_POLL_SECONDS.
+    """
+    if load_model(force):
+        bump_index_version("model")
+        return {"status": "reloaded", "version": model_bundle.version}
+    # Leave the stamp alone so other workers do not retry a broken file
+    detail = "Failed to load model"
+    if model_bundle.model is not None:
+        detail += f"; still serving version {model_bundle.version}"
+    raise HTTPException(status_code=500, detail=detail)
\ No newline at end of file
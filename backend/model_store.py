@@ -0,0 +1,74 @@
+"""Versioned normalization model artifacts.
+
+`save_artifact` writes `{"format", "version", "model"}` uncompressed to a temp
+file and renames it over the target, so readers only ever see a complete
+artifact. Uncompressed numpy arrays can be loaded with `mmap_mode="r"`, which
+lets every uvicorn worker (and batch_normalize process) share the same page
+cache instead of holding private copies.
+
+`load_artifact` returns an immutable `ModelBundle`; callers swap the whole
+bundle in one assignment, so nobody can observe a model with another model's
+`has_proba` flag or version. Bare estimators written by older scripts still load.
+"""
+import os
+import time
+import uuid
+from typing import NamedTuple, Optional, Any
+
+from normalizer import model_version
+
+ARTIFACT_FORMAT = 1
+# Memory-map numpy arrays of loaded models (pages shared across processes)
+MODEL_MMAP = os.getenv("MODEL_MMAP", "1") == "1"
+WARMUP_TEXTS = ["warm up", "Rd Shirt"]
+
+
+class ModelBundle(NamedTuple):
+    model: Any
+    has_proba: bool
+    version: Optional[str]
+    # File stamp (mtime/size) the bundle was loaded from, to skip no-op reloads
+    stamp: Optional[str] = None
+
+
+EMPTY_BUNDLE = ModelBundle(None, False, None)
+
+
+def save_artifact(model, path):
+    """Atomically publish `model` at `path`; returns the new artifact version."""
+    import joblib
+    version = f"{time.time_ns():x}-{uuid.uuid4().hex[:8]}"
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        joblib.dump({"format": ARTIFACT_FORMAT, "version": version, "model": model}, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return version
+
+
+def load_artifact(path, mmap=MODEL_MMAP):
+    """Load the artifact at `path` into a ModelBundle (raises if it cannot be read)."""
+    # Imported here so the API can start serving before joblib/sklearn are loaded
+    import joblib
+    stamp = model_version(path)
+    obj = joblib.load(path, mmap_mode="r" if mmap else None)
+    if isinstance(obj, dict) and obj.get("format") == ARTIFACT_FORMAT:
+        model, version = obj["model"], obj["version"]
+    else:
+        model, version = obj, stamp
+    return ModelBundle(model, hasattr(model, "predict_proba"), version, stamp)
+
+
+def warm_up(bundle):
+    """Run one prediction so lazy initialisation and page faults happen before the bundle goes live."""
+    model = bundle.model
+    if model is None:
+        return
+    if hasattr(model, "predict_with_confidence"):
+        model.predict_with_confidence(WARMUP_TEXTS)
+    elif bundle.has_proba:
+        model.predict_proba(WARMUP_TEXTS)
+    else:
+        model.predict(WARMUP_TEXTS)
@@ -0,0 +1,243 @@
+"""Nearest-neighbor normalizer: an alternative to the one-vs-rest LogisticRegression.
+
+Almost every correction is its own label, so a linear classifier grows with
+the label count in training time, file size and `predict_proba` cost. This
+model instead indexes the training texts in a hashed char-n-gram TF-IDF space
+and predicts the label of the closest corrections. Lookups walk the postings
+of the query's selective n-grams (the same trick as `indexes.TaxonomyIndex`),
+so inference cost depends on how many training rows share rare n-grams with
+the query, not on how many labels exist.
+
+`partial_fit` appends new pairs, including new labels, without refitting, which
+is what incremental retraining uses. Rows and postings are kept in blocks: new
+pairs become a block of their own, and a block is merged into the one before it
+only once it has grown as large (so every row is re-merged at most log2(n)
+times). An increment therefore costs time proportional to the new pairs, not to
+the corpus.
+
+It is a drop-in joblib artifact for `main.load_model()` (`predict`,
+`predict_proba`, `classes_`). `normalizer.model_stage` uses the cheaper
+`predict_with_confidence` when available, since a dense `predict_proba` over
+100k labels is itself linear in the label count.
+"""
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+
+# Training rows used to fit the confidence calibration
+CALIBRATION_SAMPLE = 2000
+# partial_fit refits the calibration after this many increments, or sooner once the
+# label count has grown by this fraction since the last calibration
+RECALIBRATE_EVERY = 10
+RECALIBRATE_LABEL_GROWTH = 0.1
+
+
+class NeighborNormalizer:
+    def __init__(self, ngram_range=(3, 5), n_features=2 ** 20, n_neighbors=10, n_candidates=100,
+                 max_df_ratio=0.02, min_max_df=50, random_state=0):
+        self.ngram_range = ngram_range
+        self.n_features = n_features
+        self.n_neighbors = n_neighbors
+        self.n_candidates = n_candidates
+        self.max_df_ratio = max_df_ratio
+        self.min_max_df = min_max_df
+        self.random_state = random_state
+
+    def _vectorize(self, X):
+        return self.tfidf_.transform(self.hasher_.transform(X)).tocsr()
+
+    def fit(self, X, y):
+        X = list(X)
+        self.classes_, codes = np.unique(np.asarray(y, dtype=object), return_inverse=True)
+        self.labels_ = codes.astype(np.int32)
+        self.hasher_ = HashingVectorizer(analyzer="char_wb", ngram_range=self.ngram_range, n_features=self.n_features,
+                                         alternate_sign=False, norm=None, lowercase=True)
+        self.tfidf_ = TfidfTransformer(sublinear_tf=True).fit(self.hasher_.transform(X))
+        # Rows: training texts (l2-normalized); postings: the same rows feature-major
+        rows = self._vectorize(X)
+        postings = rows.T.tocsr()
+        self._set_blocks([(rows, postings)])
+        self.df_ = np.diff(postings.indptr).astype(np.int32)
+        self.max_df_ = max(self.min_max_df, int(self.max_df_ratio * len(X)))
+        self._calibrate()
+        return self
+
+    def partial_fit(self, X, y):
+        """Append training pairs to a fitted model; labels it has never seen are added.
+
+        The TF-IDF weights stay as fitted (n-grams unseen at fit time get the
+        highest idf), so only the new texts are vectorized, and they go into a
+        new block (see the module docstring). Document frequencies are updated
+        from that block alone. The calibration is refit every `RECALIBRATE_EVERY`
+        increments, or once the label count has grown by
+        `RECALIBRATE_LABEL_GROWTH`.
+        """
+        if not hasattr(self, "blocks_"):
+            return self.fit(X, y)
+        X = list(X)
+        code_of = {label: code for code, label in enumerate(self.classes_)}
+        new_labels = [label for label in dict.fromkeys(y) if label not in code_of]
+        if new_labels:
+            # New labels get codes after the existing ones, so stored label codes stay valid
+            code_of.update((label, code) for code, label in enumerate(new_labels, start=len(self.classes_)))
+            self.classes_ = np.concatenate([self.classes_, np.asarray(new_labels, dtype=object)])
+        self.labels_ = np.concatenate([self.labels_, np.asarray([code_of[label] for label in y], dtype=np.int32)])
+        rows = self._vectorize(X)
+        postings = rows.T.tocsr()
+        blocks = self.blocks_ + [(rows, postings)]
+        while len(blocks) > 1 and blocks[-2][0].shape[0] <= blocks[-1][0].shape[0]:
+            merged = sparse.vstack([blocks[-2][0], blocks[-1][0]], format="csr")
+            blocks[-2:] = [(merged, merged.T.tocsr())]
+        self._set_blocks(blocks)
+        self.df_ = self.df_ + np.diff(postings.indptr).astype(np.int32)
+        self.max_df_ = max(self.min_max_df, int(self.max_df_ratio * self.n_docs_))
+        self.increments_ += 1
+        if (self.increments_ >= RECALIBRATE_EVERY
+                or len(self.classes_) > (1 + RECALIBRATE_LABEL_GROWTH) * self.calibrated_classes_):
+            self._calibrate()
+        return self
+
+    def _set_blocks(self, blocks):
+        self.blocks_ = blocks
+        sizes = [rows.shape[0] for rows, _ in blocks]
+        self.offsets_ = np.cumsum([0] + sizes[:-1])
+        self.n_docs_ = sum(sizes)
+
+    def __setstate__(self, state):
+        # Artifacts saved before posting blocks hold a single matrix_/postings_ pair
+        if "matrix_" in state:
+            state["blocks_"] = [(state.pop("matrix_"), state.pop("postings_"))]
+            state.setdefault("increments_", 0)
+            state.setdefault("calibrated_classes_", len(state["classes_"]))
+        self.__dict__.update(state)
+        if "blocks_" in state:
+            self._set_blocks(state["blocks_"])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Derived from blocks_ on load
+        state.pop("offsets_", None)
+        state.pop("n_docs_", None)
+        return state
+
+    def _rows(self, docs):
+        """Training rows `docs` (global ids, in the given order) as one CSR matrix."""
+        if len(self.blocks_) == 1:
+            return self.blocks_[0][0][docs]
+        which = np.searchsorted(self.offsets_, docs, side="right") - 1
+        parts, order = [], []
+        for b in np.unique(which):
+            at = np.flatnonzero(which == b)
+            parts.append(self.blocks_[b][0][docs[at] - self.offsets_[b]])
+            order.append(at)
+        gathered = sparse.vstack(parts, format="csr")
+        return gathered[np.argsort(np.concatenate(order))]
+
+    def _neighbors(self, row, exclude=None):
+        """Return (doc ids, cosine similarities) of the nearest training rows for one query row."""
+        features, weights = row.indices, row.data
+        if not len(features):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # Skip n-grams shared by many rows, unless that would drop most of the query
+        selective = self.df_[features] <= self.max_df_
+        if selective.sum() * 2 < len(features):
+            selective[:] = True
+        features, weights = features[selective], weights[selective]
+        query = sparse.csr_matrix((weights, (np.zeros(len(features), dtype=np.int64), features)),
+                                  shape=(1, self.n_features))
+        partials = [query @ postings for _, postings in self.blocks_]
+        docs = np.concatenate([p.indices.astype(np.int64) + offset for p, offset in zip(partials, self.offsets_)])
+        scores = np.concatenate([p.data for p in partials])
+        if exclude is not None:
+            keep = docs != exclude
+            docs, scores = docs[keep], scores[keep]
+        if len(docs) > self.n_candidates:
+            top = np.argpartition(-scores, self.n_candidates)[:self.n_candidates]
+            docs = docs[top]
+        if not len(docs):
+            return docs, np.empty(0)
+        # Exact cosine over the full query vector for the shortlist
+        sims = (self._rows(docs) @ row.T).toarray().ravel()
+        order = np.argsort(-sims)[:self.n_neighbors]
+        return docs[order], sims[order]
+
+    def _vote(self, docs, sims):
+        """Best label code and its raw score: top similarity scaled by the label's share of the vote."""
+        if not len(docs) or sims[0] <= 0:
+            return None, 0.0
+        totals = {}
+        for label, sim in zip(self.labels_[docs], sims):
+            totals[label] = totals.get(label, 0.0) + max(sim, 0.0)
+        best = max(totals, key=totals.get)
+        best_sim = max(s for label, s in zip(self.labels_[docs], sims) if label == best)
+        return best, float(best_sim * totals[best] / sum(totals.values()))
+
+    def _calibrate(self):
+        self.calibration_ = self._fit_calibration()
+        self.calibrated_classes_ = len(self.classes_)
+        self.increments_ = 0
+
+    def _fit_calibration(self):
+        """Platt-scale the raw score on leave-one-out predictions over a sample of training rows."""
+        n = self.n_docs_
+        if n < 2:
+            return None
+        rng = np.random.RandomState(self.random_state)
+        sample = rng.choice(n, size=min(n, CALIBRATION_SAMPLE), replace=False)
+        raw, correct = [], []
+        for i in sample:
+            best, score = self._vote(*self._neighbors(self._rows(np.asarray([i])), exclude=i))
+            raw.append(score)
+            correct.append(best is not None and best == self.labels_[i])
+        if len(set(correct)) < 2:
+            return None
+        from sklearn.linear_model import LogisticRegression
+        lr = LogisticRegression().fit(np.asarray(raw).reshape(-1, 1), np.asarray(correct, dtype=int))
+        return float(lr.coef_[0][0]), float(lr.intercept_[0])
+
+    def _confidence(self, score):
+        if self.calibration_ is None:
+            return score
+        a, b = self.calibration_
+        return float(1.0 / (1.0 + np.exp(-(a * score + b))))
+
+    def predict_with_confidence(self, X):
+        """Return (labels, confidences); a row with no similar training text gets (None, 0.0)."""
+        Q = self._vectorize(X)
+        labels, confidences = [], []
+        for i in range(Q.shape[0]):
+            best, score = self._vote(*self._neighbors(Q[i]))
+            labels.append(None if best is None else self.classes_[best])
+            confidences.append(0.0 if best is None else self._confidence(score))
+        return np.asarray(labels, dtype=object), np.asarray(confidences)
+
+    def predict(self, X):
+        return self.predict_with_confidence(X)[0]
+
+    def predict_proba(self, X):
+        """Dense (n_samples, n_classes) probabilities, for sklearn compatibility only.
+
+        The predicted label gets the calibrated confidence and the remainder is
+        spread over the other neighbors' labels by similarity.
+        """
+        Q = self._vectorize(X)
+        probs = np.zeros((Q.shape[0], len(self.classes_)))
+        for i in range(Q.shape[0]):
+            docs, sims = self._neighbors(Q[i])
+            best, score = self._vote(docs, sims)
+            if best is None:
+                probs[i, :] = 1.0 / len(self.classes_)
+                continue
+            confidence = self._confidence(score)
+            others = {}
+            for label, sim in zip(self.labels_[docs], sims):
+                if label != best and sim > 0:
+                    others[label] = others.get(label, 0.0) + sim
+            total = sum(others.values())
+            if total:
+                for label, sim in others.items():
+                    probs[i, label] = (1.0 - confidence) * sim / total
+            elif len(self.classes_) > 1:
+                probs[i, :] = (1.0 - confidence) / (len(self.classes_) - 1)
+            probs[i, best] = confidence if len(self.classes_) > 1 else 1.0
+        return probs
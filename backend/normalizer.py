@@ -0,0 +1,166 @@
+"""Staged normalization waterfall: 1) vocabulary, 2) taxonomy search, 3) nearest approved product, 4) ML model.
+
+Stages 1 and 2 run per row against the in-memory indexes. Rows that fall
+through both are collected and scored in batches: stage 3 (only with
+`VECTOR_STAGE=1`) embeds them and looks up the nearest approved product in
+`vector_index`, and what is left goes to the model with one vectorized
+`predict_proba` call per batch instead of two sklearn calls per row.
+"""
+import os
+
+from indexes import get_vocabulary_index, get_taxonomy_index
+
+THRESHOLD_CONFIDENCE = float(os.getenv("NORMALIZATION_CONFIDENCE_THRESHOLD", "0.9"))
+TAXONOMY_TOP_K = int(os.getenv("TAXONOMY_TOP_K", "50"))
+MODEL_BATCH_SIZE = int(os.getenv("MODEL_BATCH_SIZE", "512"))
+# Stage 3 loads a SentenceTransformer into the API process, so it is opt-in
+VECTOR_STAGE = os.getenv("VECTOR_STAGE", "0") == "1"
+# Minimum cosine similarity to an approved product for stage 3 to answer
+VECTOR_MATCH_THRESHOLD = float(os.getenv("VECTOR_MATCH_THRESHOLD", "0.9"))
+
+
+def vocabulary_lookup(raw_text: str):
+    """Look up direct vocabulary mappings. Returns (normalized, confidence, source) or (None, 0.0, None).
+
+    Served from the in-memory vocabulary index, which `version_watch` keeps current.
+    """
+    return get_vocabulary_index().lookup(raw_text)
+
+
+def taxonomy_search(raw_text: str, threshold: float = 0.7):
+    """Fuzzy search over taxonomy_reference using a trigram shortlist + difflib scoring.
+    Returns (taxonomy_label_or_path, confidence) or (None, 0.0).
+    """
+    return get_taxonomy_index().search(raw_text, threshold, top_k=TAXONOMY_TOP_K)
+
+
+def reference_stage(raw, stats=None):
+    """Stages 1-2. Returns (normalized, confidence, needs_review), or None if the row falls through to the model."""
+    voc_norm, voc_conf, _ = vocabulary_lookup(raw)
+    if voc_norm:
+        _count(stats, "vocabulary")
+        return voc_norm, voc_conf, 0
+    tax_norm, tax_score = taxonomy_search(raw)
+    if tax_norm:
+        _count(stats, "taxonomy")
+        # map tax_score (0-1) to confidence with a boost
+        confidence = round(max(tax_score, 0.85), 2)
+        return tax_norm, confidence, 0 if confidence >= THRESHOLD_CONFIDENCE else 1
+    return None
+
+
+def _count(stats, stage, n=1):
+    if stats is not None and n:
+        stats[stage] = stats.get(stage, 0) + n
+
+
+def vector_stage(raws):
+    """Stage 3. Returns, per raw string, the nearest approved product's value as
+    (normalized, confidence, needs_review), or None to fall through to the model.
+
+    Confidence is the cosine similarity to that product.
+    """
+    from vector_index import get_vector_index, encode
+    index = get_vector_index()
+    if not len(index):
+        return [None] * len(raws)
+    results = []
+    for hits in index.search(encode(raws), k=1):
+        if hits and hits[0][2] >= VECTOR_MATCH_THRESHOLD:
+            _, label, similarity = hits[0]
+            confidence = round(similarity, 4)
+            results.append((label, confidence, 0 if confidence >= THRESHOLD_CONFIDENCE else 1))
+        else:
+            results.append(None)
+    return results
+
+
+def model_stage(raws, model, has_proba):
+    """Stage 4. Score a batch of raw strings; returns [(normalized, confidence, needs_review), ...].
+
+    With `predict_proba` the label is the argmax class, which is what `predict`
+    returns for the classifiers we train, so one call yields both label and confidence.
+    """
+    if model is None:
+        return [(None, 0.0, 1)] * len(raws)
+    try:
+        if hasattr(model, "predict_with_confidence"):
+            # Label-retrieval models (neighbor_model) score without a dense class matrix
+            labels, confidences = model.predict_with_confidence(raws)
+        elif has_proba:
+            probs = model.predict_proba(raws)
+            best = probs.argmax(axis=1)
+            labels = model.classes_[best]
+            confidences = probs.max(axis=1)
+        else:
+            labels = model.predict(raws)
+            confidences = [0.0] * len(raws)
+    except Exception as e:
+        if len(raws) == 1:
+            print(f"Model prediction failed for '{raws[0]}': {e}")
+            return [(None, 0.0, 1)]
+        # Re-score row by row so one bad input does not fail the whole batch
+        return [res for raw in raws for res in model_stage([raw], model, has_proba)]
+    results = []
+    for label, confidence in zip(labels, confidences):
+        confidence = float(confidence)
+        # Auto-approve if confidence meets threshold
+        results.append((label, confidence, 0 if confidence >= THRESHOLD_CONFIDENCE else 1))
+    return results
+
+
+def normalize_rows(raws, model=None, has_proba=False, batch_size=MODEL_BATCH_SIZE, cache=None, stats=None):
+    """Run the waterfall over `raws`; returns [(normalized, confidence, needs_review), ...] in input order.
+
+    Duplicate strings are scored once. With a bound `NormalizationCache`, strings
+    seen under the same vocabulary/taxonomy/model generation skip the waterfall.
+    If `stats` is a dict, per-stage hit counts are added to it.
+    """
+    unique = list(dict.fromkeys(raws))
+    generation = cache.generation if cache is not None else None
+    done = cache.get_many(unique) if cache is not None else {}
+    todo = [raw for raw in unique if raw not in done]
+    _count(stats, "duplicate", len(raws) - len(unique))
+    _count(stats, "cache", len(done))
+
+    computed = {}
+    pending = []
+    for raw in todo:
+        try:
+            res = reference_stage(raw, stats)
+        except Exception as e:
+            _count(stats, "error")
+            print(f"Waterfall prediction failed for '{raw}': {e}")
+            res = (None, 0.0, 1)
+        if res is None:
+            pending.append(raw)
+        else:
+            computed[raw] = res
+
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        if VECTOR_STAGE:
+            try:
+                matches = vector_stage(chunk)
+            except Exception as e:
+                print(f"Vector stage failed for a batch of {len(chunk)}: {e}")
+                matches = [None] * len(chunk)
+            computed.update((raw, res) for raw, res in zip(chunk, matches) if res is not None)
+            _count(stats, "vector", sum(res is not None for res in matches))
+            chunk = [raw for raw, res in zip(chunk, matches) if res is None]
+        computed.update(zip(chunk, model_stage(chunk, model, has_proba)))
+        _count(stats, "model" if model is not None else "unmatched", len(chunk))
+
+    if cache is not None:
+        cache.put_many(computed, generation)
+    done.update(computed)
+    return [done[raw] for raw in raws]
+
+
+def model_version(path):
+    """Change stamp for a model file (mtime + size), or None when there is no file."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns}-{st.st_size}"
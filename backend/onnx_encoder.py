@@ -0,0 +1,68 @@
+"""ONNX Runtime encoder for an exported SentenceTransformer (`EMBED_BACKEND=onnx`).
+
+`AI_Project_Root/export_onnx.py` writes `EMBED_ONNX_DIR`:
+
+- `model.onnx`: the transformer, int8 dynamically quantized (unless exported with `--no-quantize`)
+- `model_fp32.onnx`: the unquantized export, kept for comparison
+- the tokenizer files, and `encoder.json` with the pooling mode, normalization,
+  max sequence length and dimension of the source model
+
+`OnnxEncoder.encode` mirrors `SentenceTransformer.encode` (same pooling and
+normalization, numpy output), so embedding_worker and the vector stage can
+use either backend. onnxruntime and transformers are imported on first use.
+"""
+import os
+import json
+
+import numpy as np
+
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "./fine_tuned_model_onnx")
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_FP32_FILE = "model_fp32.onnx"
+ENCODER_CONFIG = "encoder.json"
+
+
+def _pool(tokens, mask, mode):
+    if mode == "cls":
+        return tokens[:, 0]
+    mask = mask[:, :, None].astype(np.float32)
+    if mode == "max":
+        return np.where(mask > 0, tokens, -1e9).max(axis=1)
+    return (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+class OnnxEncoder:
+    def __init__(self, path=EMBED_ONNX_DIR, model_file=ONNX_MODEL_FILE, threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(path, ENCODER_CONFIG)) as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+            opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(os.path.join(path, model_file), opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.dim = self.config["dim"]
+
+    def encode(self, texts, batch_size=64, convert_to_numpy=True, **_):
+        """Return a (len(texts), dim) float32 array. Extra SentenceTransformer kwargs are ignored."""
+        texts = list(texts)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        # Longest first, as SentenceTransformer does, so each batch pads to similar lengths
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            enc = self.tokenizer([texts[i] for i in idx], padding=True, truncation=True,
+                                 max_length=self.config["max_seq_length"], return_tensors="np")
+            feeds = {name: enc[name].astype(np.int64) for name in self.input_names}
+            tokens = self.session.run(None, feeds)[0]
+            out[idx] = _pool(tokens, enc["attention_mask"], self.config["pooling"])
+        if self.config["normalize"]:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            out /= norms
+        return out
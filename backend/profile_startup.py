@@ -0,0 +1,63 @@
+"""Report where API cold start time goes.
+
+Runs `import main` in a fresh interpreter with `-X importtime` and lists the
+slowest top-level imports by cumulative time, then times the lifespan startup
+(schema check and background threads) in-process.
+
+Usage (from backend/):
+    python profile_startup.py
+    python profile_startup.py --top 30 --no-lifespan
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+
+
+def import_profile(module="main"):
+    """Return ([(cumulative_us, self_us, name)] for top-level imports, wall seconds)."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # -X importtime indents nested imports by two spaces; only top-level entries are additive
+        if not name.startswith("  "):
+            rows.append((int(cumulative_us), int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows, wall
+
+
+def lifespan_seconds(module="main"):
+    app = __import__(module).app
+
+    async def run():
+        started = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            return time.perf_counter() - started
+
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--no-lifespan", action="store_true", help="Skip the lifespan timing (it touches the DB)")
+    args = parser.parse_args()
+
+    rows, wall = import_profile(args.module)
+    total_us = sum(r[0] for r in rows)
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in rows[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    print(f"\nimport {args.module}: {total_us / 1000:.0f} ms in imports, {wall:.2f}s wall including interpreter start")
+    if not args.no_lifespan:
+        print(f"lifespan startup: {lifespan_seconds(args.module) * 1000:.0f} ms")
@@ -0,0 +1,117 @@
+"""LRU cache of waterfall results keyed by raw text.
+
+Entries are only valid for one "generation": the (vocabulary version, taxonomy
+version, model version) they were computed under. Binding the cache to a new
+generation drops everything, so a model reload or a vocabulary/taxonomy edit
+can never serve stale results. An optional SQLite tier
+(`normalization_cache` table) keeps results across restarts.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from db_adapter import connection
+
+CACHE_SIZE = int(os.getenv("NORMALIZATION_CACHE_SIZE", "100000"))
+CACHE_PERSIST = os.getenv("NORMALIZATION_CACHE_PERSIST", "0") == "1"
+
+# SQLite caps bound parameters per statement; stay well under the default limit
+_IN_CHUNK = 500
+
+
+class NormalizationCache:
+    def __init__(self, maxsize=CACHE_SIZE, persistent=CACHE_PERSIST):
+        self.maxsize = maxsize
+        self.persistent = persistent
+        self.generation = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def bind(self, generation):
+        """Switch to `generation`, clearing every entry computed under another one."""
+        generation = "|".join(str(g) for g in generation)
+        with self._lock:
+            if generation == self.generation:
+                return
+            self._data.clear()
+            self.generation = generation
+        if self.persistent:
+            with connection() as conn:
+                conn.execute("DELETE FROM normalization_cache WHERE generation != ?", (generation,))
+
+    def get_many(self, raws):
+        """Return {raw: (normalized, confidence, needs_review)} for the cached subset of `raws`."""
+        found = {}
+        missing = []
+        with self._lock:
+            for raw in raws:
+                hit = self._data.get(raw)
+                if hit is not None:
+                    self._data.move_to_end(raw)
+                    found[raw] = hit
+                else:
+                    missing.append(raw)
+            self.hits += len(found)
+        if missing and self.persistent:
+            stored = self._load_persistent(missing)
+            if stored:
+                self._remember(stored)
+                found.update(stored)
+                with self._lock:
+                    self.persistent_hits += len(stored)
+        with self._lock:
+            self.misses += len(raws) - len(found)
+        return found
+
+    def put_many(self, results, generation):
+        """Store {raw: (normalized, confidence, needs_review)} computed under `generation`.
+
+        Results from a generation that has since been replaced are dropped.
+        """
+        if not results or generation != self.generation:
+            return
+        self._remember(results)
+        if self.persistent:
+            with connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO normalization_cache (raw_text, normalized_value, confidence, needs_review, generation) VALUES (?, ?, ?, ?, ?)",
+                    [(raw, n, c, r, generation) for raw, (n, c, r) in results.items()])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "generation": self.generation,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remember(self, results):
+        with self._lock:
+            for raw, res in results.items():
+                self._data[raw] = res
+                self._data.move_to_end(raw)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def _load_persistent(self, raws):
+        found = {}
+        with connection() as conn:
+            cur = conn.cursor()
+            for start in range(0, len(raws), _IN_CHUNK):
+                chunk = raws[start:start + _IN_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                cur.execute(
+                    f"SELECT raw_text, normalized_value, confidence, needs_review FROM normalization_cache WHERE generation = ? AND raw_text IN ({marks})",
+                    [self.generation, *chunk])
+                for r in cur.fetchall():
+                    found[r[0]] = (r[1], r[2], r[3])
+            cur.close()
+        return found
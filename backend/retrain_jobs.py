@@ -0,0 +1,90 @@
+"""Persistent retrain job queue shared by the API and `AI_Project_Root/retrain_worker.py`.
+
+The API only enqueues; training runs in the separate worker process. Triggers
+coalesce: while a job of the same kind is still queued, further triggers just
+bump its `requested_count` instead of scheduling another retrain.
+"""
+import os
+import time
+
+from db_adapter import connection
+
+
+def enqueue(kind):
+    """Queue a retrain of `kind` ('sqlite' or 'sentence'), or join the one already queued.
+
+    Returns (job_id, coalesced).
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        # BEGIN IMMEDIATE takes the write lock first, so two triggers cannot both miss the queued row
+        if not conn.in_transaction:
+            cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT id FROM retrain_jobs WHERE kind = ? AND status = 'queued' ORDER BY id LIMIT 1", (kind,))
+        row = cur.fetchone()
+        if row:
+            cur.execute("UPDATE retrain_jobs SET requested_count = requested_count + 1 WHERE id = ?", (row[0],))
+            job_id, coalesced = row[0], True
+        else:
+            cur.execute("INSERT INTO retrain_jobs (kind, status, created_at) VALUES (?, 'queued', ?)", (kind, time.time()))
+            job_id, coalesced = cur.lastrowid, False
+        cur.close()
+    return job_id, coalesced
+
+
+def get_job(job_id=None):
+    """Return a retrain job as a dict (the latest one when `job_id` is None), or None."""
+    with connection() as conn:
+        if job_id is None:
+            row = conn.execute("SELECT * FROM retrain_jobs ORDER BY id DESC LIMIT 1").fetchone()
+        else:
+            row = conn.execute("SELECT * FROM retrain_jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def claim_next():
+    """Atomically move the oldest queued job to 'running' for this process; returns it or None."""
+    with connection() as conn:
+        cur = conn.cursor()
+        if not conn.in_transaction:
+            cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT id FROM retrain_jobs WHERE status = 'queued' ORDER BY id LIMIT 1")
+        row = cur.fetchone()
+        if row is None:
+            cur.close()
+            return None
+        cur.execute("UPDATE retrain_jobs SET status = 'running', worker_pid = ?, started_at = ? WHERE id = ?",
+                    (os.getpid(), time.time(), row[0]))
+        cur.execute("SELECT * FROM retrain_jobs WHERE id = ?", (row[0],))
+        job = dict(cur.fetchone())
+        cur.close()
+    return job
+
+
+def finish(job_id, status, error=None):
+    """Close a job as 'done', 'skipped' (nothing to train on) or 'failed'."""
+    with connection() as conn:
+        conn.execute("UPDATE retrain_jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                     (status, error, time.time(), job_id))
+
+
+def requeue_orphans():
+    """Put back 'running' jobs whose worker process no longer exists (same host)."""
+    with connection() as conn:
+        rows = conn.execute("SELECT id, worker_pid FROM retrain_jobs WHERE status = 'running'").fetchall()
+        orphans = [r[0] for r in rows if not _pid_alive(r[1])]
+        conn.executemany("UPDATE retrain_jobs SET status = 'queued', worker_pid = NULL WHERE id = ?",
+                         [(job_id,) for job_id in orphans])
+    return orphans
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
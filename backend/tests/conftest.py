@@ -0,0 +1,31 @@
+"""Point db_adapter at a throwaway SQLite file before any backend module is imported.
+
+Run from the repo root with `python -m pytest backend/tests`.
+"""
+import os
+import sys
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="csv-sorter-tests-")
+os.environ["WORKSPACE_PERSIST_DIR"] = _tmp
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["UPLOAD_SPOOL_DIR"] = os.path.join(_tmp, "upload_spool")
+os.environ["ARCHIVE_SPOOL_DIR"] = os.path.join(_tmp, "archive_spool")
+# No UDP wakeups from the tests
+os.environ["EMBED_WAKE_ADDR"] = ""
+
+_backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _backend)
+# Scripts in AI_Project_Root import backend modules by name, as they do when run with backend/ on PYTHONPATH
+sys.path.insert(1, os.path.join(os.path.dirname(_backend), "AI_Project_Root"))
+
+import pytest  # noqa: E402
+
+from db_adapter import ensure_tables  # noqa: E402
+
+ensure_tables()
+
+
+@pytest.fixture
+def tmp_dir():
+    return _tmp
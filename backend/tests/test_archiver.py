@@ -0,0 +1,81 @@
+"""Archiver against a local S3 stand-in (moto), as R2 would be used in production."""
+import io
+import os
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+import archiver  # noqa: E402
+
+BUCKET = "csv-archive"
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    for name, value in {"AWS_ACCESS_KEY_ID": "test", "AWS_SECRET_ACCESS_KEY": "test",
+                        "AWS_DEFAULT_REGION": "us-east-1", "R2_BUCKET_NAME": BUCKET}.items():
+        monkeypatch.setenv(name, value)
+    for name in ("R2_ENDPOINT_URL", "R2_ACCESS_KEY_ID", "R2_SECRET_ACCESS_KEY"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(archiver, "ARCHIVE_SPOOL_DIR", str(tmp_path / "spool"))
+    monkeypatch.setattr(archiver, "_client", None)
+    with moto.mock_aws():
+        yield boto3.client("s3", region_name="us-east-1")
+
+
+def test_spooled_upload_is_archived_multipart(s3, monkeypatch):
+    monkeypatch.setattr(archiver, "ARCHIVE_MULTIPART_MB", 5)
+    s3.create_bucket(Bucket=BUCKET)
+    payload = os.urandom(6 * 1024 * 1024)
+    upload = io.BytesIO(payload)
+
+    archiver.enqueue(upload, "uploads/big.csv")
+    assert upload.tell() == 0
+    assert archiver.pending() == 1
+    archiver._drain()
+
+    assert archiver.pending() == 0
+    obj = s3.get_object(Bucket=BUCKET, Key="uploads/big.csv")
+    assert obj["Body"].read() == payload
+    # Above the multipart threshold the ETag carries the part count
+    assert obj["ETag"].strip('"').endswith("-2")
+
+
+def test_failures_back_off_then_move_to_failed(s3, monkeypatch):
+    monkeypatch.setattr(archiver, "ARCHIVE_MAX_ATTEMPTS", 2)
+    # No bucket: every attempt fails
+    archiver.enqueue(io.BytesIO(b"raw\nalpha\n"), "uploads/small.csv")
+
+    archiver._drain()
+    assert (archiver.pending(), archiver.failed()) == (1, 0)
+    # Still backing off: nothing is retried yet
+    archiver._drain()
+    assert (archiver.pending(), archiver.failed()) == (1, 0)
+
+    archiver._try_upload(os.listdir(archiver.ARCHIVE_SPOOL_DIR)[0].split(".")[0], now=float("inf"))
+    assert (archiver.pending(), archiver.failed()) == (0, 1)
+
+
+def test_upload_job_spool_is_archived_without_a_second_copy(s3):
+    import upload_jobs
+
+    s3.create_bucket(Bucket=BUCKET)
+    payload = b"raw\nalpha\nbeta\n"
+    spooled = {}
+
+    def archive(path):
+        spooled["id"] = archiver.enqueue_path(path, "raw_uploads/job.csv")
+        spooled["inode"] = os.stat(path).st_ino
+
+    job_id = upload_jobs.create_job(io.BytesIO(payload), "job.csv", archive)
+    data_path = os.path.join(archiver.ARCHIVE_SPOOL_DIR, f"{spooled['id']}.data")
+    assert os.stat(data_path).st_ino == spooled["inode"]
+
+    # The finished job deletes its spool file; the archive entry keeps the data
+    upload_jobs._process(job_id, lambda: (None, False, None))
+    assert upload_jobs.get_job(job_id)["status"] == "done"
+    archiver._drain()
+    assert archiver.pending() == 0
+    assert s3.get_object(Bucket=BUCKET, Key="raw_uploads/job.csv")["Body"].read() == payload
@@ -0,0 +1,82 @@
+"""The offline CLI must normalize exactly like `/upload-csv`."""
+import csv
+
+import pytest
+
+pytest.importorskip("sklearn")
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sklearn.feature_extraction.text import TfidfVectorizer  # noqa: E402
+from sklearn.linear_model import LogisticRegression  # noqa: E402
+from sklearn.pipeline import make_pipeline  # noqa: E402
+
+import batch_normalize  # noqa: E402
+import main  # noqa: E402
+import upload_jobs  # noqa: E402
+import version_watch  # noqa: E402
+from db_adapter import connection  # noqa: E402
+from indexes import refresh_taxonomy_index, refresh_vocabulary_index  # noqa: E402
+from model_store import EMPTY_BUNDLE, save_artifact  # noqa: E402
+
+# Vocabulary hits, taxonomy hits, confident and unsure model rows, a quoted comma and a repeat
+RAWS = ["zqxtee", "red zqxtee", "Zqxland Boots", "zqxland boot", "navy shirt", "black jeans", "denim", "wool hat",
+        "something else entirely", "shirt, jeans", "navy shirt", "ünïcode shirt", "zqxtee"]
+
+
+@pytest.fixture
+def reference_data(tmp_path, monkeypatch):
+    model = make_pipeline(TfidfVectorizer(), LogisticRegression()).fit(
+        ["red shirt", "blue shirt", "navy shirt", "black jeans", "denim jeans", "blue jeans"],
+        ["Shirt", "Shirt", "Shirt", "Jeans", "Jeans", "Jeans"])
+    model_path = str(tmp_path / "model.joblib")
+    save_artifact(model, model_path)
+    with connection() as conn:
+        conn.execute("INSERT INTO vocabulary (token, normalized, category) VALUES ('zqxtee', 'T-Shirt', 'Tops')")
+        conn.execute("INSERT INTO taxonomy_reference (taxonomy_path, label) VALUES ('Zqxland > Footwear > Boots', 'Zqxland Boots')")
+    refresh_vocabulary_index()
+    refresh_taxonomy_index()
+    monkeypatch.setattr(main, "MODEL_PATH", model_path)
+    monkeypatch.setattr(main, "model_bundle", EMPTY_BUNDLE)
+    monkeypatch.setattr(upload_jobs, "start_worker", lambda prepare: None)
+    monkeypatch.setattr(version_watch, "start_watcher", lambda handlers: None)
+    csv_path = tmp_path / "products.csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows([["raw"]] + [[raw] for raw in RAWS])
+    yield str(csv_path), model_path
+    with connection() as conn:
+        conn.execute("DELETE FROM vocabulary WHERE token = 'zqxtee'")
+        conn.execute("DELETE FROM taxonomy_reference WHERE label = 'Zqxland Boots'")
+    refresh_vocabulary_index()
+    refresh_taxonomy_index()
+
+
+def _rows(where, params):
+    with connection() as conn:
+        return [tuple(r) for r in conn.execute(
+            f"SELECT text_content, normalized_value, needs_review, confidence FROM products WHERE {where} ORDER BY id",
+            params).fetchall()]
+
+
+def test_cli_matches_the_upload_endpoint(reference_data, tmp_path):
+    csv_path, model_path = reference_data
+    with TestClient(main.app) as client, open(csv_path, "rb") as f:
+        res = client.post("/upload-csv", files={"file": ("products.csv", f, "text/csv")})
+    assert res.status_code == 200
+    server = _rows("upload_id = ?", (res.json()["upload_id"],))
+    assert [r[0] for r in server] == RAWS
+    # Every stage answers at least once
+    assert {"T-Shirt", "red T-Shirt", "Zqxland Boots", "Shirt", "Jeans"} <= {r[1] for r in server}
+    assert {r[2] for r in server} == {0, 1}
+
+    with connection() as conn:
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM products").fetchone()[0]
+    out_path = str(tmp_path / "normalized.csv")
+    # Small batches across two processes, so rows come back through the ordered pool
+    assert batch_normalize.run(csv_path, out_path, load=True, workers=2, batch_size=3, model_path=model_path) == len(RAWS)
+
+    assert _rows("id > ?", (last_id,)) == server
+    with open(out_path, newline="", encoding="utf-8") as f:
+        written = list(csv.reader(f))[1:]
+    assert written == [["" if v is None else str(v) for v in row] for row in server]
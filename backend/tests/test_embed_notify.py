@@ -0,0 +1,120 @@
+"""Producers wake an idle embedding worker over UDP instead of leaving work for its next poll."""
+import socket
+import threading
+import time
+
+import pytest
+
+import embed_notify
+from db_adapter import close_thread_connection, connection
+
+
+@pytest.fixture
+def wake_addr(monkeypatch):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    monkeypatch.setattr(embed_notify, "EMBED_WAKE_ADDR", f"127.0.0.1:{port}")
+    return port
+
+
+def test_notify_wakes_a_waiting_listener(wake_addr):
+    listener = embed_notify.WakeListener()
+    assert listener.sock is not None
+    assert listener.wait(0.05) is False
+
+    threading.Timer(0.1, embed_notify.notify).start()
+    started = time.perf_counter()
+    assert listener.wait(5) is True
+    assert time.perf_counter() - started < 1
+    listener.sock.close()
+
+
+def test_a_burst_of_notifications_is_one_wakeup(wake_addr):
+    listener = embed_notify.WakeListener()
+    for _ in range(50):
+        embed_notify.notify()
+    time.sleep(0.05)
+    assert listener.wait(1) is True
+    assert listener.wait(0.05) is False
+    listener.sock.close()
+
+
+def test_several_workers_can_listen(wake_addr):
+    if not hasattr(socket, "SO_REUSEPORT"):
+        pytest.skip("needs SO_REUSEPORT")
+    listeners = [embed_notify.WakeListener() for _ in range(2)]
+    assert all(listener.sock is not None for listener in listeners)
+    for listener in listeners:
+        listener.sock.close()
+
+
+def test_disabled_address_falls_back_to_polling(monkeypatch):
+    monkeypatch.setattr(embed_notify, "EMBED_WAKE_ADDR", "")
+    embed_notify.notify()
+    listener = embed_notify.WakeListener()
+    assert listener.sock is None
+    started = time.perf_counter()
+    assert listener.wait(0.1) is False
+    assert time.perf_counter() - started >= 0.1
+
+
+def test_idle_worker_embeds_new_products_on_notify(wake_addr, monkeypatch, tmp_path):
+    np = pytest.importorskip("numpy")
+    import embedding_worker
+    from vector_store import VectorStore
+
+    class Encoder:
+        def encode(self, texts, **_):
+            return np.ones((len(texts), 3), dtype=np.float32)
+
+    # Without a wakeup the worker would sleep far longer than this test waits
+    monkeypatch.setattr(embedding_worker, "EMBED_IDLE_SECONDS", 60)
+    monkeypatch.setattr(embedding_worker, "load_encoder", lambda threads=None: Encoder())
+    monkeypatch.setattr(embedding_worker, "encoder_identity", lambda: "test:notify")
+    monkeypatch.setattr(embedding_worker, "VectorStore", lambda: VectorStore(str(tmp_path / "store")))
+    idle, stop = threading.Event(), threading.Event()
+    real_claim = embedding_worker.claim_queue
+
+    def claim(worker_id, *args):
+        if stop.is_set():
+            raise SystemExit
+        rows = real_claim(worker_id, *args)
+        if not rows:
+            idle.set()
+        return rows
+
+    monkeypatch.setattr(embedding_worker, "claim_queue", claim)
+    with connection() as conn:
+        conn.execute("DELETE FROM embedding_queue")
+
+    def run():
+        try:
+            embedding_worker.run_worker()
+        except SystemExit:
+            pass
+        finally:
+            close_thread_connection()
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    try:
+        assert idle.wait(10)
+        with connection() as conn:
+            ids = [conn.execute("INSERT INTO products (text_content) VALUES (?)", (f"zqx wake {i}",)).lastrowid
+                   for i in range(3)]
+        embed_notify.notify()
+        deadline = time.time() + 5
+        marks = ",".join("?" * len(ids))
+        while time.time() < deadline:
+            with connection() as conn:
+                done = conn.execute(f"SELECT COUNT(*) FROM embeddings WHERE product_id IN ({marks})", ids).fetchone()[0]
+            if done == len(ids):
+                break
+            time.sleep(0.05)
+        assert done == len(ids)
+    finally:
+        stop.set()
+        embed_notify.notify()
+        worker.join(10)
+    assert not worker.is_alive()
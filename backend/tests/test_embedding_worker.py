@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import embedding_worker  # noqa: E402
+import vectors  # noqa: E402
+from db_adapter import close_thread_connection, connection, get_index_version  # noqa: E402
+from vector_store import VectorStore  # noqa: E402
+
+
+class FakeEncoder:
+    def __init__(self, offset):
+        self.offset = offset
+        self.calls = 0
+
+    def encode(self, texts, **_):
+        self.calls += len(texts)
+        return np.array([[len(t), self.offset, 1.0] for t in texts], dtype=np.float32)
+
+
+def _queue(texts):
+    with connection() as conn:
+        conn.execute("DELETE FROM embedding_queue")
+        ids = [conn.execute("INSERT INTO products (text_content) VALUES (?)", (t,)).lastrowid for t in texts]
+    return ids
+
+
+def _embed(worker_id, model, store, encoder):
+    rows = embedding_worker.claim_queue(worker_id)
+    pairs, new_cache, encoded = embedding_worker.embed_batch(model, store, rows, encoder)
+    embedding_worker.save_batch(worker_id, pairs, new_cache, encoder)
+    return dict(pairs), encoded
+
+
+def test_cache_is_per_encoder(tmp_dir):
+    store = VectorStore(os.path.join(tmp_dir, "cache_store"))
+    torch_model, onnx_model = FakeEncoder(0.0), FakeEncoder(1.0)
+
+    first = _queue(["Blk Jacket"])[0]
+    rows, encoded = _embed("w1", torch_model, store, "torch:a")
+    assert encoded == 1
+    # Same text after switching backend: encoded again, not served from the other space
+    second = _queue(["blk  jacket"])[0]
+    rows2, encoded2 = _embed("w1", onnx_model, store, "onnx:a:int8")
+    assert encoded2 == 1 and rows2[second] != rows[first]
+    _, stored = store.open()
+    assert stored[rows2[second]][1] == 1.0
+    # Same text under the same encoder again: cache hit
+    third = _queue(["BLK JACKET"])[0]
+    rows3, encoded3 = _embed("w1", onnx_model, store, "onnx:a:int8")
+    assert encoded3 == 0 and rows3[third] == rows2[second]
+
+
+def test_encoder_identity_tracks_backend_model_and_quantization(tmp_path, monkeypatch):
+    model_dir = tmp_path / "fine_tuned_model"
+    model_dir.mkdir()
+    (model_dir / "config.json").write_text("{}")
+    monkeypatch.setattr(vectors, "EMBEDDING_MODEL_NAME", str(model_dir))
+    before = vectors.encoder_identity("torch")
+    # A retrain saved in place
+    time.sleep(0.01)
+    (model_dir / "model.safetensors").write_bytes(b"new weights")
+    assert vectors.encoder_identity("torch") != before
+
+    onnx_dir = tmp_path / "onnx"
+    onnx_dir.mkdir()
+    onnx_encoder = pytest.importorskip("onnx_encoder")
+    monkeypatch.setattr(onnx_encoder, "EMBED_ONNX_DIR", str(onnx_dir))
+    identities = set()
+    for quantized in (True, False):
+        (onnx_dir / "encoder.json").write_text(json.dumps({"quantized": quantized}))
+        identities.add(vectors.encoder_identity("onnx"))
+    assert len(identities) == 2
+    assert not any(i.startswith("torch:") for i in identities)
+
+
+def test_save_batch_bumps_the_embeddings_stamp_once(tmp_dir):
+    store = VectorStore(os.path.join(tmp_dir, "stamp_store"))
+    _queue([f"stamp text {i}" for i in range(256)])
+    with connection() as conn:
+        assert not conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                                "AND tbl_name IN ('feedback', 'embeddings')").fetchall()
+    before = get_index_version("embeddings")
+    rows, _ = _embed("w1", FakeEncoder(0.0), store, "torch:stamp")
+    assert len(rows) == 256
+    assert get_index_version("embeddings") == before + 1
+
+
+def _leases():
+    with connection() as conn:
+        return {r[0]: r[1] for r in conn.execute("SELECT product_id, lease_owner FROM embedding_queue")}
+
+
+def test_workers_claim_disjoint_rows():
+    ids = _queue([f"lease text {i}" for i in range(20)])
+    results = {}
+
+    def claim(worker_id):
+        try:
+            results[worker_id] = [r[0] for r in embedding_worker.claim_queue(worker_id, limit=5)]
+        finally:
+            close_thread_connection()
+
+    threads = [threading.Thread(target=claim, args=(f"w{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    claimed = [pid for rows in results.values() for pid in rows]
+    assert sorted(claimed) == ids
+    assert all(len(rows) == 5 and rows == sorted(rows) for rows in results.values())
+    # Nothing is free until a lease expires or is released
+    assert embedding_worker.claim_queue("w5") == []
+    embedding_worker.release_leases("w0")
+    assert [r[0] for r in embedding_worker.claim_queue("w5")] == results["w0"]
+
+
+def test_expired_lease_is_taken_over_and_finished_once(tmp_dir, monkeypatch):
+    store = VectorStore(os.path.join(tmp_dir, "lease_store"))
+    ids = _queue([f"handoff text {i}" for i in range(6)])
+    model = FakeEncoder(0.0)
+
+    # The first worker stalls past its lease (or dies) after claiming
+    monkeypatch.setattr(embedding_worker, "EMBED_LEASE_SECONDS", -1)
+    stalled = embedding_worker.claim_queue("slow")
+    assert [r[0] for r in stalled] == ids
+    monkeypatch.setattr(embedding_worker, "EMBED_LEASE_SECONDS", 300)
+    taken = embedding_worker.claim_queue("fast")
+    assert [r[0] for r in taken] == ids and set(_leases().values()) == {"fast"}
+
+    fast_pairs, _, _ = embedding_worker.embed_batch(model, store, taken, "torch:lease")
+    embedding_worker.save_batch("fast", fast_pairs, {}, "torch:lease")
+    assert _leases() == {}
+    # The stalled worker finishes late: its rows are neither re-recorded nor dequeued twice
+    slow_pairs, _, _ = embedding_worker.embed_batch(FakeEncoder(1.0), store, stalled, "torch:lease-slow")
+    embedding_worker.save_batch("slow", slow_pairs, {}, "torch:lease-slow")
+    marks = ",".join("?" * len(ids))
+    with connection() as conn:
+        recorded = dict(conn.execute(f"SELECT product_id, store_row FROM embeddings WHERE product_id IN ({marks})", ids).fetchall())
+    assert recorded == dict(fast_pairs)
+
+
+def test_dead_workers_rows_wait_for_their_lease():
+    ids = _queue(["orphan one", "orphan two"])
+    embedding_worker.claim_queue("dead")
+    assert embedding_worker.claim_queue("alive") == []
+    with connection() as conn:
+        conn.execute("UPDATE embedding_queue SET lease_expires = ? WHERE lease_owner = 'dead'", (time.time() - 1,))
+    assert [r[0] for r in embedding_worker.claim_queue("alive")] == ids
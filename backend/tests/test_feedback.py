@@ -0,0 +1,118 @@
+import random
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from db_adapter import connection, get_index_version, text_hash
+from feedback import apply_feedback
+
+TEXTS = ["Red Shirt", "red  shirt", "RED SHIRT", "Blue Jeans", "blue jeans", "Hat", "Cap"]
+
+
+def _fresh_db():
+    """In-memory copy of the test schema with no rows."""
+    conn = sqlite3.connect(":memory:")
+    with connection() as src:
+        src.backup(conn)
+    conn.create_function("text_hash", 1, text_hash, deterministic=True)
+    conn.execute("DELETE FROM feedback")
+    conn.execute("DELETE FROM products")
+    return conn
+
+
+def _item(pid, approved=True, correction=None, propagate=True, same_upload_only=False):
+    return SimpleNamespace(product_id=pid, is_approved=approved, correction=correction,
+                           propagate=propagate, same_upload_only=same_upload_only)
+
+
+def _apply_one_by_one(cur, f):
+    """Per-item reference: the statements /submit-feedback ran before batching."""
+    cur.execute("SELECT text_content, normalized_value, text_hash, upload_id FROM products WHERE id = ?", (f.product_id,))
+    row = cur.fetchone()
+    if row is None:
+        return 0
+    value = f.correction or row[1]
+    if f.correction:
+        cur.execute("UPDATE products SET normalized_value = ?, needs_review = 0 WHERE id = ?", (f.correction, f.product_id))
+    else:
+        cur.execute("UPDATE products SET needs_review = 0 WHERE id = ?", (f.product_id,))
+    updated = 1
+    if f.propagate:
+        sql = "UPDATE products SET normalized_value = ?, needs_review = 0 WHERE needs_review = 1 AND text_hash = ? AND id != ?"
+        params = [value, row[2] or text_hash(row[0]), f.product_id]
+        if f.same_upload_only:
+            sql += " AND upload_id IS ?"
+            params.append(row[3])
+        cur.execute(sql, params)
+        updated += cur.rowcount
+    cur.execute("INSERT INTO feedback (product_id, is_approved, correction, multiplicity) VALUES (?, ?, ?, ?)",
+                (f.product_id, int(f.is_approved), f.correction, updated))
+    return updated
+
+
+def _seed(conn, rng, count):
+    for pid in range(1, count + 1):
+        text = rng.choice(TEXTS)
+        conn.execute("INSERT INTO products (id, text_content, normalized_value, needs_review, text_hash, upload_id) "
+                     "VALUES (?, ?, ?, ?, ?, ?)",
+                     (pid, text, rng.choice([None, "X", "Y"]), rng.choice([0, 1, 1]), text_hash(text),
+                      rng.choice(["u1", "u2", None])))
+
+
+def _state(conn):
+    products = conn.execute("SELECT id, normalized_value, needs_review FROM products ORDER BY id").fetchall()
+    feedback = conn.execute("SELECT product_id, is_approved, correction, multiplicity FROM feedback ORDER BY id").fetchall()
+    return products, feedback
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_batched_feedback_matches_one_by_one(seed):
+    rng = random.Random(seed)
+    items = [_item(rng.randint(1, 24), rng.random() < 0.7, rng.choice([None, "", "A", "B"]),
+                   rng.random() < 0.7, rng.random() < 0.3) for _ in range(30)]
+    batched, reference = _fresh_db(), _fresh_db()
+    _seed(batched, random.Random(seed), 20)
+    _seed(reference, random.Random(seed), 20)
+
+    counts = apply_feedback(batched.cursor(), items)
+    expected = [_apply_one_by_one(reference.cursor(), f) for f in items]
+    assert counts == expected
+    assert _state(batched) == _state(reference)
+
+
+def test_later_item_wins_for_the_same_product():
+    conn = _fresh_db()
+    conn.execute("INSERT INTO products (id, text_content, needs_review, text_hash) VALUES (1, 'Red Shirt', 1, ?)",
+                 (text_hash("Red Shirt"),))
+    apply_feedback(conn.cursor(), [_item(1, correction="A"), _item(1, correction="B", propagate=False)])
+    assert conn.execute("SELECT normalized_value FROM products WHERE id = 1").fetchone()[0] == "B"
+
+
+def test_missing_products_report_zero():
+    conn = _fresh_db()
+    assert apply_feedback(conn.cursor(), [_item(999)]) == [0]
+    assert conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0] == 0
+
+
+def test_feedback_stamp_moves_once_per_call():
+    conn = _fresh_db()
+    conn.executemany("INSERT INTO products (id, text_content, needs_review) VALUES (?, ?, 1)",
+                     [(i, f"text {i}") for i in range(1, 101)])
+    before = get_index_version("feedback", conn)
+    apply_feedback(conn.cursor(), [_item(i) for i in range(1, 101)])
+    assert get_index_version("feedback", conn) == before + 1
+    apply_feedback(conn.cursor(), [_item(999)])
+    assert get_index_version("feedback", conn) == before + 1
+
+
+def test_rows_inserted_outside_ingest_still_receive_fan_out():
+    conn = _fresh_db()
+    # As a seed script or manual SQL would insert them: no text_hash, no upload_id
+    ids = [conn.execute("INSERT INTO products (text_content, needs_review) VALUES (?, 1)", (text,)).lastrowid
+           for text in ("Blk Jacket", "blk  JACKET", "Blue Jeans")]
+    assert conn.execute("SELECT COUNT(*) FROM products WHERE text_hash IS NULL").fetchone()[0] == 0
+
+    assert apply_feedback(conn.cursor(), [_item(ids[0], correction="Black Jacket")]) == [2]
+    assert conn.execute("SELECT normalized_value, needs_review FROM products ORDER BY id").fetchall() == [
+        ("Black Jacket", 0), ("Black Jacket", 0), (None, 1)]
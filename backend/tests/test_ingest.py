@@ -0,0 +1,82 @@
+"""Streaming CSV ingest: batch boundaries, incremental decoding and flat memory."""
+import io
+import tracemalloc
+
+import pytest
+
+from db_adapter import connection
+from ingest import ingest_csv, iter_line_offsets, iter_raw_batches, iter_text_lines
+
+TEXT = "raw\ncafé crème\n\"comma, inside\"\n\"two\nlines\"\n\n日本語の帽子\nlast without newline"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 64])
+def test_lines_decode_across_chunk_boundaries(chunk_size):
+    data = TEXT.encode("utf-8")
+    # Small chunks split multi-byte characters between reads
+    lines = list(iter_text_lines(io.BytesIO(data), chunk_size=chunk_size))
+    assert lines == TEXT.splitlines(keepends=True)
+    ends = [end for _, end in iter_line_offsets(io.BytesIO(data), chunk_size=chunk_size)]
+    assert ends == [len("".join(lines[:i + 1]).encode("utf-8")) for i in range(len(lines))]
+
+
+def test_utf8_bom_is_not_part_of_the_header():
+    data = "﻿raw\nalpha\n".encode("utf-8")
+    assert list(iter_text_lines(io.BytesIO(data), encoding="utf-8-sig")) == ["raw\n", "alpha\n"]
+
+
+def test_batches_hold_at_most_batch_size_rows():
+    data = TEXT.encode("utf-8")
+    assert list(iter_raw_batches(io.BytesIO(data), batch_size=2)) == [
+        ["café crème", "comma, inside"], ["two\nlines", "日本語の帽子"], ["last without newline"]]
+    # Resuming skips data rows, not lines: the blank line and the quoted newline do not count
+    assert list(iter_raw_batches(io.BytesIO(data), batch_size=10, skip_rows=3)) == [["日本語の帽子", "last without newline"]]
+
+
+class _GeneratedCsv(io.RawIOBase):
+    """A large CSV produced on read, so the test itself holds no copy of it."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.next_row = 0
+        self.pending = b"raw\n"
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while len(self.pending) < size and self.next_row < self.rows:
+            self.pending += "".join(f"product {i} navy slim-fit cotton t-shirt with crew neck and short sleeves, size M, colour ü {i}\n"
+                                    for i in range(self.next_row, min(self.next_row + 1000, self.rows))).encode("utf-8")
+            self.next_row = min(self.next_row + 1000, self.rows)
+        out, self.pending = self.pending[:size], self.pending[size:]
+        return out
+
+
+def test_memory_stays_flat_as_the_file_grows():
+    def peak(rows):
+        tracemalloc.start()
+        try:
+            count = 0
+            for batch in iter_raw_batches(_GeneratedCsv(rows), batch_size=500):
+                count += len(batch)
+            return count, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    # Both files span several read chunks (UPLOAD_CHUNK_SIZE, 1 MB)
+    small_count, small_peak = peak(30000)
+    large_count, large_peak = peak(120000)
+    assert (small_count, large_count) == (30000, 120000)
+    # 4x the rows (about 12 MB of CSV) costs no more memory: one read chunk plus one batch
+    assert large_peak < 1.1 * small_peak
+
+
+def test_ingest_inserts_every_batch():
+    rows = [f"zqx ingest {i}" for i in range(25)]
+    data = ("raw\n" + "\n".join(rows) + "\n").encode("utf-8")
+    with connection() as conn:
+        assert ingest_csv(io.BytesIO(data), conn, batch_size=4, upload_id="ingest-batches") == 25
+        stored = conn.execute("SELECT text_content, needs_review, text_hash IS NOT NULL FROM products "
+                              "WHERE upload_id = 'ingest-batches' ORDER BY id").fetchall()
+    assert [tuple(r) for r in stored] == [(raw, 1, 1) for raw in rows]
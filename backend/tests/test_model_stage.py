@@ -0,0 +1,53 @@
+"""Batched stage 4 must give the same per-row results as the old per-row predict + predict_proba code."""
+import statistics
+
+import pytest
+
+pytest.importorskip("sklearn")
+
+from sklearn.feature_extraction.text import TfidfVectorizer  # noqa: E402
+from sklearn.linear_model import LogisticRegression  # noqa: E402
+from sklearn.pipeline import make_pipeline  # noqa: E402
+from sklearn.svm import LinearSVC  # noqa: E402
+
+import normalizer  # noqa: E402
+
+TRAIN = [("red shirt", "Shirt"), ("blue shirt", "Shirt"), ("t-shirt white", "Shirt"),
+         ("denim jeans", "Jeans"), ("black jeans", "Jeans"), ("slim fit jeans", "Jeans"),
+         ("wool hat", "Hat"), ("straw hat", "Hat"), ("baseball cap hat", "Hat")]
+QUERIES = ["red shirt", "shirt", "jeans blue", "hat", "wool jeans", "unknown thing", "", "cap", "RED SHIRT", "straw"]
+
+
+def _per_row(raws, model, has_proba):
+    """The waterfall's model fallback before batching, one row at a time."""
+    results = []
+    for raw in raws:
+        normalized = model.predict([raw])[0]
+        if has_proba:
+            confidence = float(max(model.predict_proba([raw])[0]))
+        else:
+            confidence = 0.0
+        results.append((normalized, confidence, 0 if confidence >= normalizer.THRESHOLD_CONFIDENCE else 1))
+    return results
+
+
+def _fit(pairs, estimator):
+    return make_pipeline(TfidfVectorizer(ngram_range=(1, 2)), estimator).fit([x for x, _ in pairs], [y for _, y in pairs])
+
+
+@pytest.mark.parametrize("pairs", [TRAIN, [p for p in TRAIN if p[1] != "Hat"]], ids=["multiclass", "binary"])
+def test_batched_proba_matches_per_row(pairs, monkeypatch):
+    model = _fit(pairs, LogisticRegression(max_iter=1000))
+    # Put the threshold inside the observed range so both needs_review outcomes occur
+    confidences = [max(p) for p in model.predict_proba(QUERIES)]
+    monkeypatch.setattr(normalizer, "THRESHOLD_CONFIDENCE", statistics.median(confidences))
+
+    batched = normalizer.model_stage(QUERIES, model, True)
+    assert batched == _per_row(QUERIES, model, True)
+    assert {r[2] for r in batched} == {0, 1}
+
+
+def test_model_without_proba_matches_per_row():
+    model = _fit(TRAIN, LinearSVC())
+    assert not hasattr(model, "predict_proba")
+    assert normalizer.model_stage(QUERIES, model, False) == _per_row(QUERIES, model, False)
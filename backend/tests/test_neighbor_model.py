@@ -0,0 +1,95 @@
+import copy
+import pickle
+import random
+import statistics
+import string
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sklearn")
+
+from scipy import sparse  # noqa: E402
+
+import neighbor_model  # noqa: E402
+from neighbor_model import NeighborNormalizer  # noqa: E402
+
+PAIRS = [("red shirt", "Shirt"), ("blue shirt", "Shirt"), ("denim jeans", "Jeans"),
+         ("black jeans", "Jeans"), ("wool hat", "Hat"), ("straw hat", "Hat")]
+
+
+def test_partial_fit_adds_new_labels_without_refit():
+    model = NeighborNormalizer(min_max_df=1).fit([x for x, _ in PAIRS], [y for _, y in PAIRS])
+    tfidf = model.tfidf_
+    model.partial_fit(["leather boots", "suede boots"], ["Boots", "Boots"])
+
+    assert model.tfidf_ is tfidf
+    assert list(model.classes_[-1:]) == ["Boots"]
+    assert model.n_docs_ == len(PAIRS) + 2
+    labels, confidences = model.predict_with_confidence(["brown leather boots", "green wool hat"])
+    assert list(labels) == ["Boots", "Hat"]
+    assert all(0.0 < c <= 1.0 for c in confidences)
+    # Existing label codes are untouched by the new class
+    assert list(model.predict(["denim jeans"])) == ["Jeans"]
+
+
+def _corpus(n, seed=0):
+    """n product-like texts, each its own label (as most corrections are)."""
+    rng = random.Random(seed)
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8))) for _ in range(3000)]
+    X = [" ".join(rng.sample(words, 3)) for _ in range(n)]
+    return X, [x.title() for x in X]
+
+
+def test_blocks_answer_like_one_merged_block(monkeypatch):
+    monkeypatch.setattr(neighbor_model, "CALIBRATION_SAMPLE", 200)
+    X, y = _corpus(600)
+    model = NeighborNormalizer().fit(X[:300], y[:300])
+    for start in range(300, 600, 40):
+        model.partial_fit(X[start:start + 40], y[start:start + 40])
+    assert len(model.blocks_) > 1
+
+    merged = copy.deepcopy(model)
+    rows = sparse.vstack([r for r, _ in model.blocks_], format="csr")
+    merged._set_blocks([(rows, rows.T.tocsr())])
+    queries = [x[:-1] for x in X[::7]] + ["zzz unknown"]
+    labels, confidences = model.predict_with_confidence(queries)
+    merged_labels, merged_confidences = merged.predict_with_confidence(queries)
+    assert list(labels) == list(merged_labels)
+    assert np.allclose(confidences, merged_confidences)
+    assert np.array_equal(model.df_, np.diff(merged.blocks_[0][1].indptr))
+
+
+def test_pickles_from_before_blocks_still_load():
+    X, y = _corpus(200)
+    model = NeighborNormalizer().fit(X, y)
+    state = model.__getstate__()
+    ((rows, postings),) = state.pop("blocks_")
+    for key in ("increments_", "calibrated_classes_"):
+        del state[key]
+    state.update(matrix_=rows, postings_=postings)
+    old = NeighborNormalizer.__new__(NeighborNormalizer)
+    old.__setstate__(state)
+
+    assert list(old.predict(X[:20])) == list(model.predict(X[:20]))
+    old.partial_fit(["leather boots"], ["Boots"])
+    assert list(pickle.loads(pickle.dumps(old)).predict(["brown leather boots"])) == ["Boots"]
+
+
+def test_partial_fit_time_does_not_grow_with_the_corpus(monkeypatch):
+    # Only fit() calibrates here; a smaller sample just keeps the setup quick
+    monkeypatch.setattr(neighbor_model, "CALIBRATION_SAMPLE", 200)
+    new_X, new_y = _corpus(50, seed=1)
+    medians = []
+    for n in (1000, 16000):
+        X, y = _corpus(n)
+        model = NeighborNormalizer().fit(X, y)
+        elapsed = []
+        for start in range(0, 50, 10):
+            began = time.perf_counter()
+            model.partial_fit(new_X[start:start + 10], new_y[start:start + 10])
+            elapsed.append(time.perf_counter() - began)
+        medians.append(statistics.median(elapsed))
+    # 16x the corpus; a rebuild of the postings or calibration would cost far more than this
+    assert medians[1] < 3 * medians[0] + 0.01, medians
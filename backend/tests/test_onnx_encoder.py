@@ -0,0 +1,49 @@
+"""OnnxEncoder must reproduce SentenceTransformer vectors: exactly for the fp32 export, closely for int8."""
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+pytest.importorskip("torch")
+pytest.importorskip("sentence_transformers")
+
+from sentence_transformers import SentenceTransformer, models  # noqa: E402
+from transformers import BertConfig, BertModel, BertTokenizerFast  # noqa: E402
+
+import export_onnx  # noqa: E402
+from onnx_encoder import OnnxEncoder  # noqa: E402
+
+WORDS = ["red", "blue", "navy", "black", "shirt", "t", "-", "jeans", "jacket", "hat", "wool", "cotton", "slim", "fit",
+         "blk", "nvy", "rd", "##s", "##ish", "green", "pants", "sneakers", "white", "cap"]
+TEXTS = ["Red Shirt", "nvy blue t-shirt", "Blk Jacket", "white sneakers", "greenish pants", "wool cap",
+         "slim fit black jeans", "cotton shirt navy", "hat", "unknown words here"] * 3
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    """A tiny random MiniLM-shaped SentenceTransformer (mean pooling + normalize), built offline."""
+    root = tmp_path_factory.mktemp("st")
+    vocab = root / "vocab.txt"
+    vocab.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS) + "\n")
+    tokenizer = BertTokenizerFast(vocab_file=str(vocab))
+    config = BertConfig(vocab_size=tokenizer.vocab_size, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=64)
+    BertModel(config).save_pretrained(root / "bert")
+    tokenizer.save_pretrained(root / "bert")
+    transformer = models.Transformer(str(root / "bert"), max_seq_length=32)
+    pooling = models.Pooling(config.hidden_size, "mean")
+    SentenceTransformer(modules=[transformer, pooling, models.Normalize()], device="cpu").save(str(root / "model"))
+    return str(root / "model")
+
+
+@pytest.mark.parametrize("quantize,min_cosine", [(False, 0.9999), (True, 0.98)], ids=["fp32", "int8"])
+def test_onnx_matches_sentence_transformer(model_dir, tmp_path, quantize, min_cosine):
+    export_onnx.export(model_dir, str(tmp_path), quantize=quantize)
+    reference = SentenceTransformer(model_dir, device="cpu")
+    onnx = OnnxEncoder(str(tmp_path), threads=1)
+
+    result = export_onnx.accuracy_check(reference, onnx, TEXTS, batch_size=4)
+    assert result["min"] >= min_cosine, result
+    if not quantize:
+        expected = reference.encode(TEXTS, batch_size=4, convert_to_numpy=True)
+        assert np.allclose(onnx.encode(TEXTS, batch_size=4), expected, atol=1e-4)
@@ -0,0 +1,89 @@
+"""Keyset pages stay stable while rows are inserted or reviewed between requests."""
+import base64
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from db_adapter import connection  # noqa: E402
+
+# Older than anything else in the test DB, and all tied, so only the id orders these rows
+CREATED = "2000-01-01 00:00:00"
+
+
+def _insert(count, needs_review=1):
+    with connection() as conn:
+        return [conn.execute("INSERT INTO products (text_content, needs_review, created_at, upload_id) "
+                             "VALUES (?, ?, ?, 'keyset')", (f"zqx page {i}", needs_review, CREATED)).lastrowid
+                for i in range(count)]
+
+
+@pytest.fixture
+def client():
+    yield TestClient(main.app)
+    with connection() as conn:
+        conn.execute("DELETE FROM products WHERE upload_id = 'keyset'")
+
+
+def _walk(client, path, params, ours, between_pages):
+    """Follow X-Next-Cursor until the pages move past our rows; returns our ids in page order."""
+    seen, cursor, page = [], None, 0
+    while True:
+        res = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert res.status_code == 200
+        ids = [row["id"] for row in res.json()]
+        seen += [i for i in ids if i in ours]
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor or not ids or ids[-1] not in ours:
+            return seen
+        between_pages(page)
+        page += 1
+
+
+def test_review_pages_survive_inserts_and_reviews(client):
+    ids = _insert(25)
+    ours = set(ids)
+    added = []
+
+    def between_pages(page):
+        if page == 0:
+            # Approving rows already shown must not shift the next page (it would with OFFSET)
+            with connection() as conn:
+                conn.execute("UPDATE products SET needs_review = 0 WHERE id IN (?, ?)", (ids[0], ids[5]))
+            new = _insert(3)
+            added.extend(new)
+            ours.update(new)
+
+    seen = _walk(client, "/products-for-review", {"limit": 10}, ours, between_pages)
+    assert seen == ids + added
+
+
+def test_newest_first_pages_skip_rows_inserted_meanwhile(client):
+    ids = _insert(25, needs_review=0)
+    inserted = []
+    # Rows created in 2000 come last newest-first; start from a cursor just above them
+    cursor = base64.urlsafe_b64encode(f"{CREATED}|{ids[-1] + 1}".encode()).decode()
+    seen = []
+    while cursor:
+        res = client.get("/products", params={"all": True, "limit": 10, "cursor": cursor})
+        assert res.status_code == 200
+        seen += [row["id"] for row in res.json() if row["upload_id"] == "keyset"]
+        cursor = res.headers.get("X-Next-Cursor")
+        # Same created_at as the cursor row but a higher id: sorts before it, so no later page repeats a row
+        inserted += _insert(2, needs_review=0)
+    assert seen == ids[::-1]
+    assert not set(seen) & set(inserted)
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", base64.urlsafe_b64encode(b"no separator").decode(),
+                                    base64.urlsafe_b64encode(b"2024-01-01|abc").decode()])
+@pytest.mark.parametrize("path,params", [("/products-for-review", {}), ("/products", {"all": True, "limit": 5}),
+                                         ("/products", {"format": "ndjson"}), ("/products", {"format": "csv"})])
+def test_bad_cursor_is_a_400(client, path, params, cursor):
+    res = client.get(path, params={**params, "cursor": cursor})
+    assert res.status_code == 400
+    assert res.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,75 @@
+"""Cached waterfall results must not outlive the model (or indexes) that produced them."""
+import pytest
+
+pytest.importorskip("sklearn")
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sklearn.feature_extraction.text import TfidfVectorizer  # noqa: E402
+from sklearn.linear_model import LogisticRegression  # noqa: E402
+from sklearn.pipeline import make_pipeline  # noqa: E402
+
+import main  # noqa: E402
+import upload_jobs  # noqa: E402
+import version_watch  # noqa: E402
+from db_adapter import connection  # noqa: E402
+from model_store import EMPTY_BUNDLE, save_artifact  # noqa: E402
+from result_cache import NormalizationCache  # noqa: E402
+
+CSV = b"raw\nzqx swap item\nzqx swap item\n"
+
+
+def _model(label):
+    return make_pipeline(TfidfVectorizer(), LogisticRegression()).fit(
+        ["zqx swap item", "zqx swap thing", "other words", "more words"], [label, label, "Other", "Other"])
+
+
+def _upload(client):
+    res = client.post("/upload-csv", files={"file": ("swap.csv", CSV, "text/csv")})
+    assert res.status_code == 200
+    with connection() as conn:
+        return [r[0] for r in conn.execute("SELECT normalized_value FROM products WHERE upload_id = ? ORDER BY id",
+                                           (res.json()["upload_id"],)).fetchall()]
+
+
+def test_model_swap_invalidates_cached_results(tmp_path, monkeypatch):
+    path = str(tmp_path / "model.joblib")
+    save_artifact(_model("Shirt"), path)
+    monkeypatch.setattr(main, "MODEL_PATH", path)
+    monkeypatch.setattr(main, "model_bundle", EMPTY_BUNDLE)
+    monkeypatch.setattr(main, "normalization_cache", NormalizationCache(persistent=False))
+    monkeypatch.setattr(upload_jobs, "start_worker", lambda prepare: None)
+    monkeypatch.setattr(version_watch, "start_watcher", lambda handlers: None)
+
+    with TestClient(main.app) as client:
+        assert _upload(client) == ["Shirt", "Shirt"]
+        # The second upload is served from the cache
+        assert _upload(client) == ["Shirt", "Shirt"]
+        stats = client.get("/normalization-cache/stats").json()
+        assert stats["hits"] >= 1 and stats["size"] == 1
+
+        save_artifact(_model("Jeans"), path)
+        assert client.post("/reload_model").status_code == 200
+        assert _upload(client) == ["Jeans", "Jeans"]
+        assert client.get("/normalization-cache/stats").json()["generation"] != stats["generation"]
+
+
+def test_persistent_tier_drops_other_generations():
+    cache = NormalizationCache(persistent=True)
+    cache.bind(("v1", "t1", "model-a"))
+    cache.put_many({"zqx persisted": ("Shirt", 0.95, 0)}, cache.generation)
+    old = cache.generation
+
+    # A fresh process under the same generation reads the row back
+    restarted = NormalizationCache(persistent=True)
+    restarted.bind(("v1", "t1", "model-a"))
+    assert restarted.get_many(["zqx persisted"]) == {"zqx persisted": ("Shirt", 0.95, 0)}
+
+    restarted.bind(("v1", "t1", "model-b"))
+    assert restarted.get_many(["zqx persisted"]) == {}
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM normalization_cache WHERE generation = ?", (old,)).fetchone()[0] == 0
+    # Results computed under the replaced model arrive too late to be stored
+    restarted.put_many({"zqx persisted": ("Shirt", 0.95, 0)}, old)
+    assert restarted.get_many(["zqx persisted"]) == {}
@@ -0,0 +1,83 @@
+"""Retrain triggers coalesce into one queued job per kind."""
+import threading
+
+import pytest
+
+import retrain_jobs
+from db_adapter import close_thread_connection, connection
+
+
+@pytest.fixture(autouse=True)
+def empty_queue():
+    with connection() as conn:
+        conn.execute("DELETE FROM retrain_jobs")
+
+
+def _jobs():
+    with connection() as conn:
+        return [tuple(r) for r in conn.execute("SELECT kind, status, requested_count FROM retrain_jobs ORDER BY id")]
+
+
+def test_triggers_join_the_queued_job():
+    results = [retrain_jobs.enqueue("sqlite") for _ in range(3)]
+    assert [coalesced for _, coalesced in results] == [False, True, True]
+    assert len({job_id for job_id, _ in results}) == 1
+    # Another kind gets its own job
+    assert retrain_jobs.enqueue("sentence")[1] is False
+    assert _jobs() == [("sqlite", "queued", 3), ("sentence", "queued", 1)]
+
+
+def test_concurrent_triggers_queue_one_job():
+    results = []
+
+    def trigger():
+        try:
+            results.append(retrain_jobs.enqueue("sqlite"))
+        finally:
+            close_thread_connection()
+
+    threads = [threading.Thread(target=trigger) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(coalesced for _, coalesced in results) == [False] + [True] * 7
+    assert _jobs() == [("sqlite", "queued", 8)]
+
+
+def test_trigger_during_a_run_queues_one_follow_up():
+    first, _ = retrain_jobs.enqueue("sqlite")
+    job = retrain_jobs.claim_next()
+    assert job["id"] == first and job["status"] == "running"
+    # The running job trains on a snapshot, so new triggers need a fresh job, but only one
+    follow_up = [retrain_jobs.enqueue("sqlite") for _ in range(4)]
+    assert {job_id for job_id, _ in follow_up} != {first}
+    assert [c for _, c in follow_up] == [False, True, True, True]
+    retrain_jobs.finish(first, "done")
+    assert _jobs() == [("sqlite", "done", 1), ("sqlite", "queued", 4)]
+    assert retrain_jobs.claim_next()["id"] == follow_up[0][0]
+    assert retrain_jobs.claim_next() is None
+
+
+def test_jobs_of_dead_workers_are_requeued():
+    job_id, _ = retrain_jobs.enqueue("sqlite")
+    retrain_jobs.claim_next()
+    with connection() as conn:
+        # A pid that cannot belong to a live process
+        conn.execute("UPDATE retrain_jobs SET worker_pid = 2147483646 WHERE id = ?", (job_id,))
+    assert retrain_jobs.requeue_orphans() == [job_id]
+    assert retrain_jobs.enqueue("sqlite") == (job_id, True)
+
+
+def test_trigger_endpoint_reports_coalescing():
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    first = client.post("/trigger-retrain").json()
+    second = client.post("/trigger-retrain").json()
+    assert (first["coalesced"], second["coalesced"]) == (False, True)
+    assert second["job_id"] == first["job_id"]
+    assert client.get("/retrain-jobs/latest").json()["requested_count"] == 2
@@ -0,0 +1,81 @@
+"""Uploads that arrive while the startup model load is still running must wait for it, not skip the model."""
+import io
+import time
+
+import pytest
+
+pytest.importorskip("sklearn")
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sklearn.feature_extraction.text import TfidfVectorizer  # noqa: E402
+from sklearn.linear_model import LogisticRegression  # noqa: E402
+from sklearn.pipeline import make_pipeline  # noqa: E402
+
+import main  # noqa: E402
+import upload_jobs  # noqa: E402
+import version_watch  # noqa: E402
+from db_adapter import connection  # noqa: E402
+from model_store import EMPTY_BUNDLE, save_artifact  # noqa: E402
+
+CSV = b"raw\nzqx shirt\nzqx jeans\n"
+
+
+@pytest.fixture
+def slow_model(tmp_path, monkeypatch):
+    model = make_pipeline(TfidfVectorizer(), LogisticRegression()).fit(
+        ["red shirt", "blue shirt", "black jeans", "denim jeans"], ["Shirt", "Shirt", "Jeans", "Jeans"])
+    path = str(tmp_path / "model.joblib")
+    save_artifact(model, path)
+    monkeypatch.setattr(main, "MODEL_PATH", path)
+    monkeypatch.setattr(main, "model_bundle", EMPTY_BUNDLE)
+    real_load = main.load_artifact
+
+    def slow_load(*args, **kwargs):
+        time.sleep(0.5)
+        return real_load(*args, **kwargs)
+
+    monkeypatch.setattr(main, "load_artifact", slow_load)
+    # Only the startup load may bring the model in; keep background threads out of other tests
+    monkeypatch.setattr(upload_jobs, "start_worker", lambda prepare: None)
+    monkeypatch.setattr(version_watch, "start_watcher", lambda handlers: None)
+    return path
+
+
+def _results(upload_id):
+    with connection() as conn:
+        return conn.execute("SELECT normalized_value, confidence FROM products WHERE upload_id = ? ORDER BY id",
+                            (upload_id,)).fetchall()
+
+
+def test_upload_right_after_startup_gets_model_predictions(slow_model):
+    with TestClient(main.app) as client:
+        assert main.model_bundle.model is None
+        res = client.post("/upload-csv", files={"file": ("new.csv", CSV, "text/csv")})
+    assert res.status_code == 200
+    assert [r[0] for r in _results(res.json()["upload_id"])] == ["Shirt", "Jeans"]
+
+
+def test_upload_job_right_after_startup_gets_model_predictions(slow_model):
+    with TestClient(main.app):
+        job_id = upload_jobs.create_job(io.BytesIO(CSV), "job.csv")
+        upload_jobs._process(job_id, main._prepare_waterfall)
+    assert upload_jobs.get_job(job_id)["status"] == "done"
+    assert [r[0] for r in _results(job_id)] == ["Shirt", "Jeans"]
+
+
+def test_unloadable_model_file_fails_the_upload(slow_model, monkeypatch):
+    with open(slow_model, "wb") as f:
+        f.write(b"not a model")
+    with TestClient(main.app) as client:
+        res = client.post("/upload-csv", files={"file": ("bad.csv", CSV, "text/csv")})
+    assert res.status_code == 503
+
+
+def test_missing_model_file_sends_rows_to_review(slow_model, monkeypatch):
+    monkeypatch.setattr(main, "MODEL_PATH", slow_model + ".missing")
+    with TestClient(main.app) as client:
+        res = client.post("/upload-csv", files={"file": ("none.csv", CSV, "text/csv")})
+    assert res.status_code == 200
+    assert [tuple(r) for r in _results(res.json()["upload_id"])] == [(None, 0.0), (None, 0.0)]
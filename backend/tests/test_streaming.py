@@ -0,0 +1,59 @@
+"""NDJSON and CSV dumps of /products hold exactly the rows the JSON endpoint returns."""
+import csv
+import io
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from db_adapter import connection  # noqa: E402
+
+TEXTS = ['comma, inside', 'quote " inside', "two\nlines", "ünïcode 日本", "", "plain"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Several fetches per stream
+    monkeypatch.setattr(main, "STREAM_FETCH_SIZE", 4)
+    with connection() as conn:
+        conn.executemany("INSERT INTO products (text_content, normalized_value, needs_review, confidence, upload_id) "
+                         "VALUES (?, ?, ?, ?, 'stream')",
+                         [(text, None if i % 2 else "Value", i % 2, i / 10) for i, text in enumerate(TEXTS * 3)])
+    yield TestClient(main.app)
+    with connection() as conn:
+        conn.execute("DELETE FROM products WHERE upload_id = 'stream'")
+
+
+@pytest.mark.parametrize("all", [False, True])
+def test_ndjson_matches_json(client, all):
+    expected = client.get("/products", params={"all": all}).json()
+    res = client.get("/products", params={"all": all, "format": "ndjson"})
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in res.text.splitlines()] == expected
+    assert sum(row["upload_id"] == "stream" for row in expected) == (18 if all else 9)
+
+
+@pytest.mark.parametrize("all", [False, True])
+def test_csv_matches_json(client, all):
+    expected = client.get("/products", params={"all": all}).json()
+    res = client.get("/products", params={"all": all, "format": "csv"})
+    assert res.headers["content-type"].startswith("text/csv")
+    header, *rows = list(csv.reader(io.StringIO(res.text, newline="")))
+    assert header == list(expected[0])
+    assert rows == [["" if v is None else str(v) for v in row.values()] for row in expected]
+
+
+def test_stream_resumes_from_a_cursor(client):
+    first = client.get("/products", params={"all": True, "limit": 5})
+    rest = client.get("/products", params={"all": True, "format": "ndjson", "cursor": first.headers["X-Next-Cursor"]})
+    everything = client.get("/products", params={"all": True}).json()
+    assert first.json() + [json.loads(line) for line in rest.text.splitlines()] == everything
+
+
+def test_unknown_format_is_a_400(client):
+    assert client.get("/products", params={"format": "xml"}).status_code == 400
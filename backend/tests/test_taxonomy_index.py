@@ -0,0 +1,77 @@
+"""TaxonomyIndex.search must answer exactly like the full-table difflib scan it replaced."""
+import difflib
+import random
+
+import pytest
+
+from indexes import TaxonomyIndex
+
+ROOTS = ["Apparel", "Home & Garden", "Electronics", "Sports", "Toys"]
+GROUPS = ["Men", "Women", "Kids", "Outdoor", "Kitchen", "Office", "Accessories", "Audio", "Fitness", "Storage"]
+NOUNS = ["Shirts", "T-Shirts", "Jeans", "Jackets", "Hats", "Caps", "Sneakers", "Boots", "Lamps", "Chairs", "Tables",
+         "Speakers", "Headphones", "Cables", "Balls", "Rackets", "Puzzles", "Dolls", "Mugs", "Plates", "Bags", "Belts"]
+ADJECTIVES = ["Red", "Blue", "Navy", "Black", "Wool", "Cotton", "Leather", "Slim", "Wireless", "Ceramic", "Vintage"]
+# Root and group names: each trigram is shared by hundreds of entries, and queries such as
+# "apparel" consist only of trigrams past the index's common-trigram cutoff
+COMMON_QUERIES = ["apparel", "app", "men", "> men >", "kids", "apparel > men", "home & garden > kitchen", "sports > outdoor",
+                  "electronics > audio", "toys > kids >"]
+
+
+def _full_scan(entries, raw_text, threshold=0.7):
+    """The pre-index taxonomy_search: score every label and path with difflib."""
+    lower = raw_text.strip().lower()
+    best = None
+    best_score = 0.0
+    for path, label in entries:
+        score_label = difflib.SequenceMatcher(None, lower, label.lower()).ratio() if label else 0.0
+        score_path = difflib.SequenceMatcher(None, lower, path.lower()).ratio() if path else 0.0
+        score = max(score_label, score_path)
+        if score > best_score:
+            best_score = score
+            best = label if score_label >= score_path else path
+    if best and best_score >= threshold:
+        return best, round(best_score, 2)
+    return None, 0.0
+
+
+def _entries(rng, count):
+    entries, seen = [], set()
+    while len(entries) < count:
+        label = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}" + (f" {rng.randint(1, 99)}" if rng.random() < 0.5 else "")
+        path = f"{rng.choice(ROOTS)} > {rng.choice(GROUPS)} > {label}"
+        if path not in seen:
+            seen.add(path)
+            entries.append((path, label))
+    return entries
+
+
+def _typo(rng, text):
+    chars = list(text.lower())
+    i = rng.randrange(len(chars))
+    op = rng.random()
+    if op < 0.33:
+        chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    elif op < 0.66:
+        del chars[i]
+    else:
+        chars.insert(i, rng.choice("aeiou"))
+    return "".join(chars)
+
+
+@pytest.fixture(scope="module")
+def taxonomy():
+    rng = random.Random(7)
+    entries = _entries(rng, 2000)
+    typos = [_typo(rng, rng.choice(entries)[rng.randint(0, 1)]) for _ in range(24)]
+    return entries, TaxonomyIndex(entries), typos
+
+
+def test_search_matches_full_scan_on_misspellings(taxonomy):
+    entries, index, typos = taxonomy
+    assert [index.search(q) for q in typos] == [_full_scan(entries, q) for q in typos]
+
+
+@pytest.mark.parametrize("query", COMMON_QUERIES)
+def test_search_matches_full_scan_on_common_trigrams(taxonomy, query):
+    entries, index, _ = taxonomy
+    assert index.search(query) == _full_scan(entries, query)
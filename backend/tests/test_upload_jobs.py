@@ -0,0 +1,90 @@
+import io
+import time
+
+import upload_jobs
+from db_adapter import connection
+
+CSV = b"raw\nalpha\nbeta\ngamma\n"
+
+
+def _job(job_id):
+    with connection() as conn:
+        return conn.execute("SELECT status, owner, rows_committed, heartbeat FROM upload_jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def _products(job_id):
+    with connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM products WHERE upload_id = ?", (job_id,)).fetchone()[0]
+
+
+def test_job_runs_to_completion():
+    job_id = upload_jobs.create_job(io.BytesIO(CSV), "ok.csv")
+    upload_jobs._process(job_id, lambda: (None, False, None))
+    assert _job(job_id)["status"] == "done"
+    assert _job(job_id)["rows_committed"] == 3
+    assert _products(job_id) == 3
+
+
+def test_taken_over_job_does_not_insert_twice():
+    job_id = upload_jobs.create_job(io.BytesIO(CSV), "slow.csv")
+
+    def slow_prepare():
+        # Another worker re-claims the job while this one is still preparing
+        with connection() as conn:
+            conn.execute("UPDATE upload_jobs SET heartbeat = 0 WHERE id = ?", (job_id,))
+        assert upload_jobs._claim(job_id) is not None
+        return None, False, None
+
+    upload_jobs._process(job_id, slow_prepare)
+    job = _job(job_id)
+    assert job["status"] == "running"
+    assert job["rows_committed"] == 0
+    assert _products(job_id) == 0
+
+
+def test_heartbeat_refreshes_during_slow_prepare(monkeypatch):
+    monkeypatch.setattr(upload_jobs, "JOB_HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(upload_jobs, "JOB_STALE_SECONDS", 0.3)
+    job_id = upload_jobs.create_job(io.BytesIO(CSV), "beat.csv")
+    seen = {}
+
+    def slow_prepare():
+        claimed_at = _job(job_id)["heartbeat"]
+        time.sleep(0.5)
+        seen["heartbeat_moved"] = _job(job_id)["heartbeat"] > claimed_at
+        seen["claimable"] = job_id in upload_jobs._claimable_jobs()
+        return None, False, None
+
+    upload_jobs._process(job_id, slow_prepare)
+    assert seen == {"heartbeat_moved": True, "claimable": False}
+    assert _job(job_id)["status"] == "done"
+    assert _products(job_id) == 3
+
+
+def test_progress_follows_committed_rows(monkeypatch):
+    # Multi-byte text and a quoted field spanning two lines; the whole file fits in one read chunk
+    rows = ["café", '"two\nlines"', "naïve", "plain", "ünïcode"]
+    data = ("raw\n" + "\n".join(rows) + "\n").encode("utf-8")
+    ends = [data.index(row.encode("utf-8")) + len(row.encode("utf-8")) + 1 for row in rows]
+    job_id = upload_jobs.create_job(io.BytesIO(data), "progress.csv")
+    seen = []
+    # Called once per batch, right after its checkpoint commits
+    monkeypatch.setattr(upload_jobs.embed_notify, "notify", lambda: seen.append(tuple(
+        upload_jobs.get_job(job_id)[k] for k in ("rows_committed", "bytes_processed"))))
+
+    upload_jobs._process(job_id, lambda: (None, False, None), batch_size=2)
+    assert seen == [(2, ends[1]), (4, ends[3]), (5, ends[4])]
+    assert ends[4] == len(data)
+
+
+def test_on_spooled_sees_the_spool_file_before_the_job_is_queued():
+    seen = {}
+
+    def on_spooled(path):
+        with open(path, "rb") as f:
+            seen["data"] = f.read()
+        with connection() as conn:
+            seen["queued"] = conn.execute("SELECT COUNT(*) FROM upload_jobs WHERE spool_path = ?", (path,)).fetchone()[0]
+
+    upload_jobs.create_job(io.BytesIO(CSV), "hook.csv", on_spooled)
+    assert seen == {"data": CSV, "queued": 0}
@@ -0,0 +1,51 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from db_adapter import connection  # noqa: E402
+from vectors import to_blob  # noqa: E402
+from vector_index import VectorIndex  # noqa: E402
+from vector_store import VectorStore  # noqa: E402
+
+
+def _insert(pid, needs_review, value=None, embed=True, approve=False):
+    with connection() as conn:
+        conn.execute("INSERT INTO products (id, text_content, needs_review, normalized_value) VALUES (?, ?, ?, ?)",
+                     (pid, f"text {pid}", needs_review, value))
+        if embed:
+            conn.execute("INSERT INTO embeddings (product_id, vector) VALUES (?, ?)",
+                         (pid, to_blob(np.eye(4, dtype=np.float32)[pid % 4])))
+        if approve:
+            conn.execute("INSERT INTO feedback (product_id, is_approved) VALUES (?, 1)", (pid,))
+
+
+def test_watermarks_skip_pending_rows_and_catch_late_approvals(tmp_dir):
+    index = VectorIndex(VectorStore(f"{tmp_dir}/vector_index_store"))
+    index.refresh()
+    base = 100000
+    for pid in range(base, base + 50):
+        _insert(pid, needs_review=1)
+    index.refresh()
+    with connection() as conn:
+        assert index.embedding_mark == conn.execute("SELECT MAX(id) FROM embeddings").fetchone()[0]
+    version = index.version
+
+    # A scan of pending rows only must not invalidate result caches
+    assert index.refresh() == 0
+    assert index.version == version
+
+    # Approval of an already-embedded product arrives later
+    with connection() as conn:
+        conn.execute("UPDATE products SET needs_review = 0, normalized_value = 'Shirt' WHERE id = ?", (base + 3,))
+        conn.execute("INSERT INTO feedback (product_id, is_approved) VALUES (?, 1)", (base + 3,))
+    assert index.refresh() == 1
+    assert index.version != version
+
+    # Embedding of an already-approved product arrives later
+    _insert(base + 99, needs_review=0, value="Hat", embed=False, approve=True)
+    assert index.refresh() == 0
+    with connection() as conn:
+        conn.execute("INSERT INTO embeddings (product_id, vector) VALUES (?, ?)",
+                     (base + 99, to_blob(np.ones(4, dtype=np.float32))))
+    assert index.refresh() == 1
+    assert [hit[:2] for hit in index.search(np.ones((1, 4), dtype=np.float32), k=1)[0]] == [(base + 99, "Hat")]
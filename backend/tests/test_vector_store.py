@@ -0,0 +1,59 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from db_adapter import connection  # noqa: E402
+from vectors import to_blob  # noqa: E402
+from vector_store import VectorStore, export_products  # noqa: E402
+
+
+def test_export_is_per_product(tmp_dir):
+    store = VectorStore(f"{tmp_dir}/export_store")
+    base = 200000
+    rows = store.append([base, base + 9], np.array([[1, 0, 0], [0, 1, 0]], dtype=np.float32))
+    with connection() as conn:
+        conn.execute("DELETE FROM embeddings")
+        conn.executemany("INSERT INTO products (id, text_content) VALUES (?, 'same text')", [(base,), (base + 1,), (base + 2,)])
+        # base + 1 reuses base's row through embedding_cache; store row 1 belongs to a batch that rolled back
+        conn.executemany("INSERT INTO embeddings (product_id, store_row) VALUES (?, ?)", [(base, rows[0]), (base + 1, rows[0])])
+        conn.execute("INSERT INTO embeddings (product_id, vector) VALUES (?, ?)", (base + 2, to_blob([0, 0, 1])))
+
+    assert export_products(f"{tmp_dir}/export", store) == 3
+    ids = np.load(f"{tmp_dir}/export_product_ids.npy")
+    vectors = np.load(f"{tmp_dir}/export_vectors.npy")
+    assert ids.tolist() == [base, base + 1, base + 2]
+    assert vectors.tolist() == [[1, 0, 0], [1, 0, 0], [0, 0, 1]]
+
+
+def test_export_reads_in_chunks(tmp_dir):
+    store = VectorStore(f"{tmp_dir}/chunked_store")
+    base = 210000
+    vectors = np.arange(30, dtype=np.float32).reshape(10, 3)
+    rows = store.append(range(base, base + 10), vectors)
+    with connection() as conn:
+        conn.execute("DELETE FROM embeddings")
+        conn.executemany("INSERT INTO products (id, text_content) VALUES (?, 'text')", [(base + i,) for i in range(10)])
+        conn.executemany("INSERT INTO embeddings (product_id, store_row) VALUES (?, ?)",
+                         [(base + i, rows[i]) for i in range(10)])
+
+    # Chunks that do not divide the row count
+    assert export_products(f"{tmp_dir}/chunked", store, chunk=3) == 10
+    assert np.load(f"{tmp_dir}/chunked_product_ids.npy").tolist() == list(range(base, base + 10))
+    assert np.array_equal(np.load(f"{tmp_dir}/chunked_vectors.npy"), vectors)
+
+
+def test_clustering_refuses_unmigrated_rows_without_writing():
+    pytest.importorskip("sklearn")
+    from generate_clusters import load_embeddings
+
+    with connection() as conn:
+        conn.execute("DELETE FROM embeddings")
+        pid = conn.execute("INSERT INTO products (text_content) VALUES ('legacy')").lastrowid
+        conn.execute("INSERT INTO embeddings (product_id, vector_json) VALUES (?, '[1, 0]')", (pid,))
+
+    with pytest.raises(SystemExit, match="--migrate-only"):
+        load_embeddings()
+    with connection() as conn:
+        row = conn.execute("SELECT vector, vector_json, store_row FROM embeddings WHERE product_id = ?", (pid,)).fetchone()
+        conn.execute("DELETE FROM embeddings")
+    assert tuple(row) == (None, "[1, 0]", None)
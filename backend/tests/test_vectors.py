@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from db_adapter import connection  # noqa: E402
+from vectors import from_blob, migrate_json_vectors  # noqa: E402
+
+
+def test_migration_converts_json_and_requeues_broken_rows():
+    with connection() as conn:
+        ids = [conn.execute("INSERT INTO products (text_content) VALUES (?)", (f"migrate {i}",)).lastrowid for i in range(3)]
+        conn.executemany("DELETE FROM embedding_queue WHERE product_id = ?", [(pid,) for pid in ids])
+        conn.executemany("INSERT INTO embeddings (product_id, vector_json) VALUES (?, ?)", [
+            (ids[0], json.dumps([0.5, 1.0])),
+            (ids[1], "[0.25, 2.0]"),
+            (ids[2], "{not a vector"),
+        ])
+
+    assert migrate_json_vectors() == 2
+
+    with connection() as conn:
+        rows = dict(conn.execute("SELECT product_id, vector FROM embeddings WHERE product_id IN (?, ?, ?)", ids).fetchall())
+        queued = [r[0] for r in conn.execute("SELECT product_id FROM embedding_queue WHERE product_id IN (?, ?, ?)", ids)]
+    assert from_blob(rows[ids[0]]).tolist() == [0.5, 1.0]
+    assert from_blob(rows[ids[1]]).tolist() == [0.25, 2.0]
+    # The broken row is gone, so the worker embeds the product again
+    assert ids[2] not in rows
+    assert queued == [ids[2]]
@@ -0,0 +1,30 @@
+"""The vocabulary snapshot is rebuilt when the table changes, and only then."""
+from db_adapter import connection
+from indexes import get_vocabulary_index, refresh_vocabulary_index
+
+
+def test_vocabulary_edits_rebuild_the_index():
+    with connection() as conn:
+        conn.execute("DELETE FROM vocabulary WHERE token = 'zqxtee'")
+    index = refresh_vocabulary_index()
+    assert index.lookup("zqxtee") == (None, 0.0, None)
+    # Nothing changed: the same snapshot comes back without a reload
+    assert refresh_vocabulary_index() is index
+
+    with connection() as conn:
+        conn.execute("INSERT INTO vocabulary (token, normalized, category) VALUES ('zqxtee', 'T-Shirt', 'Tops')")
+    inserted = refresh_vocabulary_index()
+    assert inserted is not index and inserted.version > index.version
+    assert get_vocabulary_index() is inserted
+    assert inserted.lookup("ZQXTEE ") == ("T-Shirt", 1.0, "Tops")
+    assert inserted.lookup("red zqxtee") == ("red T-Shirt", 1.0, "Tops")
+    # The snapshot a request already holds does not change under it
+    assert index.lookup("zqxtee") == (None, 0.0, None)
+
+    with connection() as conn:
+        conn.execute("UPDATE vocabulary SET normalized = 'Tee' WHERE token = 'zqxtee'")
+    assert refresh_vocabulary_index().lookup("zqxtee") == ("Tee", 1.0, "Tops")
+
+    with connection() as conn:
+        conn.execute("DELETE FROM vocabulary WHERE token = 'zqxtee'")
+    assert refresh_vocabulary_index().lookup("zqxtee") == (None, 0.0, None)
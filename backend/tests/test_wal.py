@@ -0,0 +1,70 @@
+"""Readers (review endpoints) must not wait for an upload's open write transaction."""
+import threading
+import time
+
+import pytest
+
+from db_adapter import connection, get_connection
+
+
+@pytest.fixture
+def open_write():
+    """A writer thread that inserts rows and holds its transaction open until released."""
+    started, release, done = threading.Event(), threading.Event(), threading.Event()
+
+    def write():
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT INTO products (text_content, needs_review, upload_id) VALUES (?, 1, 'wal-writer')",
+                             [(f"zqx wal {i}",) for i in range(5000)])
+            started.set()
+            release.wait(10)
+            conn.commit()
+        finally:
+            conn.close()
+            done.set()
+
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    assert started.wait(10)
+    yield release, done
+    release.set()
+    thread.join()
+
+
+def _written():
+    with connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM products WHERE upload_id = 'wal-writer'").fetchone()[0]
+
+
+def test_reader_is_not_blocked_by_an_open_write(open_write):
+    release, done = open_write
+    with connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    started = time.perf_counter()
+    # The uncommitted rows are invisible, and the read does not wait for busy_timeout
+    assert _written() == 0
+    assert time.perf_counter() - started < 0.5
+    assert not done.is_set()
+
+    release.set()
+    assert done.wait(10)
+    assert _written() == 5000
+
+
+def test_review_endpoint_answers_during_an_upload(open_write):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    import main
+
+    release, done = open_write
+    client = TestClient(main.app)
+    started = time.perf_counter()
+    res = client.get("/products-for-review", params={"limit": 10})
+    assert res.status_code == 200
+    assert time.perf_counter() - started < 0.5
+    assert not done.is_set()
+    assert all(not row["text"].startswith("zqx wal") for row in res.json())
@@ -0,0 +1,229 @@
+"""Background CSV upload jobs with progress reporting and resumable checkpoints.
+
+`create_job` spools the upload to disk and returns a job id straight away. A
+worker thread then runs the same batched waterfall as `/upload-csv`, committing
+each batch of products together with the job's `rows_committed` counter. If the
+process dies, the job's heartbeat goes stale and any worker (this process after
+a restart, or another uvicorn worker) re-claims it and resumes after the last
+committed row.
+
+A claim writes a fresh `owner` token, and a side thread refreshes the heartbeat
+while the job runs, so a slow batch does not look abandoned. Checkpoints only
+commit while the token still matches. A worker whose job was taken over rolls
+back its batch and stops instead of inserting the same rows again.
+"""
+import os
+import json
+import time
+import queue
+import shutil
+import threading
+import uuid
+
+from db_adapter import connection, close_thread_connection, DEFAULT_PERSIST_DIR
+from ingest import iter_raw_batches, insert_rows, UPLOAD_BATCH_SIZE
+from normalizer import normalize_rows
+import embed_notify
+
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(DEFAULT_PERSIST_DIR, "upload_spool"))
+# A running job whose heartbeat is older than this is considered abandoned
+JOB_STALE_SECONDS = float(os.getenv("UPLOAD_JOB_STALE_SECONDS", "60"))
+# How often an idle worker looks for abandoned jobs
+JOB_SCAN_SECONDS = float(os.getenv("UPLOAD_JOB_SCAN_SECONDS", "30"))
+# How often a running job refreshes its heartbeat, independent of batch commits
+JOB_HEARTBEAT_SECONDS = JOB_STALE_SECONDS / 4
+
+_queue = queue.Queue()
+_worker = None
+
+
+class JobLost(Exception):
+    """Raised when another worker has re-claimed the job this worker was running."""
+
+
+def create_job(fileobj, filename, on_spooled=None):
+    """Spool `fileobj` to disk, record a queued job and hand it to the worker. Returns the job id.
+
+    `on_spooled(path)` runs before the job is queued, while the spool file is
+    certain to exist (e.g. to archive it without reading the upload again).
+    """
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    job_id = uuid.uuid4().hex
+    spool_path = os.path.join(UPLOAD_SPOOL_DIR, f"{job_id}.csv")
+    with open(spool_path, "wb") as out:
+        shutil.copyfileobj(fileobj, out, 1024 * 1024)
+    if on_spooled is not None:
+        on_spooled(spool_path)
+    with connection() as conn:
+        conn.execute(
+            "INSERT INTO upload_jobs (id, filename, spool_path, total_bytes, status, heartbeat) VALUES (?, ?, ?, ?, 'queued', ?)",
+            (job_id, filename, spool_path, os.path.getsize(spool_path), time.time()))
+    _queue.put(job_id)
+    return job_id
+
+
+def get_job(job_id):
+    """Return a progress report for `job_id`, or None if it does not exist."""
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM upload_jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job.pop("spool_path", None)
+    job.pop("owner", None)
+    job["stage_counts"] = json.loads(job["stage_counts"] or "{}")
+
+    rows_per_sec = 0.0
+    eta_seconds = None
+    run_started = job.pop("run_started_at")
+    if run_started:
+        end = job["finished_at"] if job["status"] != "running" and job["finished_at"] else time.time()
+        elapsed = max(end - run_started, 1e-6)
+        rows_per_sec = (job["rows_committed"] - job.pop("run_start_rows")) / elapsed
+        bytes_per_sec = (job["bytes_processed"] - job.pop("run_start_bytes")) / elapsed
+        if job["status"] == "running" and bytes_per_sec > 0:
+            eta_seconds = round(max(job["total_bytes"] - job["bytes_processed"], 0) / bytes_per_sec, 1)
+    else:
+        job.pop("run_start_rows", None)
+        job.pop("run_start_bytes", None)
+    if job["status"] == "done":
+        eta_seconds = 0.0
+    job["rows_per_sec"] = round(rows_per_sec, 1)
+    job["eta_seconds"] = eta_seconds
+    return job
+
+
+def resume_job(job_id):
+    """Requeue a failed job; it restarts after its last committed row. Returns False if not resumable."""
+    with connection() as conn:
+        cur = conn.execute("UPDATE upload_jobs SET status = 'queued', error = NULL WHERE id = ? AND status = 'failed'", (job_id,))
+        ok = cur.rowcount == 1
+    if ok:
+        _queue.put(job_id)
+    return ok
+
+
+def start_worker(prepare):
+    """Start the background worker thread (idempotent).
+
+    `prepare()` is called before each job and must return (model, has_proba, cache)
+    for the waterfall, exactly as `/upload-csv` would use them.
+    """
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return _worker
+    _worker = threading.Thread(target=_run, args=(prepare,), name="upload-jobs", daemon=True)
+    _worker.start()
+    return _worker
+
+
+def _run(prepare):
+    while True:
+        try:
+            job_id = _queue.get(timeout=JOB_SCAN_SECONDS)
+        except queue.Empty:
+            job_id = None
+        try:
+            if job_id is not None:
+                _process(job_id, prepare)
+            # Pick up queued jobs from other processes and jobs whose worker died
+            for stale_id in _claimable_jobs():
+                _process(stale_id, prepare)
+        except Exception as e:
+            print(f"Upload job worker error: {e}")
+
+
+def _claimable_jobs():
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT id FROM upload_jobs WHERE status = 'queued' OR (status = 'running' AND heartbeat < ?) ORDER BY created_at",
+            (time.time() - JOB_STALE_SECONDS,)).fetchall()
+    return [r[0] for r in rows]
+
+
+def _claim(job_id):
+    """Atomically take ownership of a queued or abandoned job; returns (row, owner token) or None."""
+    now = time.time()
+    owner = uuid.uuid4().hex
+    with connection() as conn:
+        cur = conn.execute(
+            """UPDATE upload_jobs
+               SET status = 'running', owner = ?, heartbeat = ?, run_started_at = ?,
+                   run_start_rows = rows_committed, run_start_bytes = bytes_processed
+               WHERE id = ? AND (status = 'queued' OR (status = 'running' AND heartbeat < ?))""",
+            (owner, now, now, job_id, now - JOB_STALE_SECONDS))
+        if cur.rowcount != 1:
+            return None
+        return conn.execute("SELECT * FROM upload_jobs WHERE id = ?", (job_id,)).fetchone(), owner
+
+
+def _heartbeat(job_id, owner, stop):
+    """Keep the claim fresh until `stop` is set or the job is taken over."""
+    try:
+        while not stop.wait(JOB_HEARTBEAT_SECONDS):
+            with connection() as conn:
+                cur = conn.execute("UPDATE upload_jobs SET heartbeat = ? WHERE id = ? AND owner = ?",
+                                   (time.time(), job_id, owner))
+                if cur.rowcount != 1:
+                    return
+    except Exception as e:
+        print(f"Upload job {job_id} heartbeat error: {e}")
+    finally:
+        close_thread_connection()
+
+
+def _process(job_id, prepare, batch_size=UPLOAD_BATCH_SIZE):
+    claimed = _claim(job_id)
+    if claimed is None:
+        return
+    job, owner = claimed
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(job_id, owner, stop), name=f"upload-heartbeat-{job_id}", daemon=True)
+    beat.start()
+    try:
+        _run_job(job, owner, prepare, batch_size)
+    finally:
+        stop.set()
+        beat.join()
+
+
+def _run_job(job, owner, prepare, batch_size):
+    job_id = job["id"]
+    resumed = job["rows_committed"]
+    if resumed:
+        print(f"Resuming upload job {job_id} after row {resumed}")
+    stats = json.loads(job["stage_counts"] or "{}")
+    try:
+        model, has_proba, cache = prepare()
+        with open(job["spool_path"], "rb") as fh:
+            for raws, end in iter_raw_batches(fh, batch_size, skip_rows=resumed, offsets=True):
+                results = normalize_rows(raws, model, has_proba, cache=cache, stats=stats)
+                # Products and the checkpoint commit together, so a crash never double-inserts.
+                # bytes_processed is the end of the batch's last row, so progress and ETA track committed rows.
+                with connection() as conn:
+                    cur = conn.cursor()
+                    insert_rows(cur, raws, results, upload_id=job_id)
+                    cur.execute(
+                        "UPDATE upload_jobs SET rows_committed = rows_committed + ?, bytes_processed = ?, stage_counts = ?, heartbeat = ? "
+                        "WHERE id = ? AND owner = ?",
+                        (len(raws), end, json.dumps(stats), time.time(), job_id, owner))
+                    if cur.rowcount != 1:
+                        # Raising rolls back this batch's products with the checkpoint
+                        raise JobLost(job_id)
+                    cur.close()
+                embed_notify.notify()
+        with connection() as conn:
+            cur = conn.execute(
+                "UPDATE upload_jobs SET status = 'done', bytes_processed = total_bytes, finished_at = ? WHERE id = ? AND owner = ?",
+                (time.time(), job_id, owner))
+            if cur.rowcount != 1:
+                raise JobLost(job_id)
+        os.remove(job["spool_path"])
+        print(f"Upload job {job_id} finished")
+    except JobLost:
+        print(f"Upload job {job_id} was taken over by another worker; stopping here")
+    except Exception as e:
+        print(f"Upload job {job_id} failed: {e}")
+        with connection() as conn:
+            conn.execute("UPDATE upload_jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ? AND owner = ?",
+                         (str(e), time.time(), job_id, owner))
@@ -0,0 +1,237 @@
+"""In-process nearest-neighbor index over the embeddings of approved products.
+
+Rows are unit-normalized float32 vectors held in one contiguous matrix, so a
+query is a normalized dot product (cosine similarity). Below `VECTOR_IVF_MIN`
+vectors search is exact. Above it, k-means centroids partition the matrix
+(IVF) and each query scans only the `VECTOR_IVF_NPROBE` closest partitions,
+which keeps a 1M-vector kNN query in the low milliseconds on CPU.
+
+The index is filled from `embeddings` joined to approved products
+(`needs_review = 0` with a `feedback` row), reading vectors from the
+memory-mapped `vector_store`. It is then updated incrementally from two
+watermarks (last feedback id and last embedding id), so a new approval is
+picked up whether its feedback or its embedding lands last. Both watermarks
+advance past every row scanned, approved or not, so a backfill of pending
+embeddings is scanned once. The waterfall uses it through
+`normalizer.vector_stage`.
+"""
+import os
+import threading
+
+import numpy as np
+
+from db_adapter import connection
+from vectors import from_blob, load_encoder
+from vector_store import VectorStore
+
+VECTOR_IVF_MIN = int(os.getenv("VECTOR_IVF_MIN", "50000"))
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "8"))
+# Queries per matrix product in exact search, bounding the (queries x rows) score block
+_QUERY_CHUNK = 64
+_KMEANS_ITERATIONS = 10
+
+# Newly joinable approved rows: new feedback, or a new embedding for an already-approved product.
+# CROSS JOIN pins the join order so each branch starts with a rowid range scan on its watermark.
+_APPROVED_SQL = """
+    SELECT f.id, e.id, e.product_id, e.store_row, e.vector, p.normalized_value
+    FROM {tables}
+    WHERE p.id = f.product_id AND e.product_id = p.id
+      AND p.needs_review = 0 AND p.normalized_value IS NOT NULL
+      AND (e.store_row IS NOT NULL OR e.vector IS NOT NULL) AND {cond}
+"""
+_NEW_ROWS_SQL = (
+    _APPROVED_SQL.format(tables="feedback f CROSS JOIN products p CROSS JOIN embeddings e", cond="f.id > ? AND f.id <= ?")
+    + " UNION ALL "
+    + _APPROVED_SQL.format(tables="embeddings e CROSS JOIN products p CROSS JOIN feedback f", cond="e.id > ? AND e.id <= ?")
+    + " ORDER BY 1"
+)
+
+
+def _unit(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return rows / norms
+
+
+def _top_k(scores, k):
+    """Indices of the k largest scores, best first."""
+    if len(scores) > k:
+        part = np.argpartition(-scores, k)[:k]
+    else:
+        part = np.arange(len(scores))
+    return part[np.argsort(-scores[part])]
+
+
+class VectorIndex:
+    def __init__(self, store=None):
+        self._store = store or VectorStore()
+        self._lock = threading.Lock()
+        self._matrix = None          # (capacity, dim); rows [:n] are live
+        self._product_ids = np.empty(0, dtype=np.int64)
+        self._labels = []
+        self._row_of = {}            # product_id -> row
+        self._n = 0
+        self._centroids = None       # IVF: (nlist, dim)
+        self._lists = None           # IVF: row ids per centroid
+        self._ivf_size = 0
+        self.feedback_mark = 0
+        self.embedding_mark = 0
+        # Watermarks of the last refresh that changed the index: scanning only unapproved
+        # rows keeps result caches valid, and processes that saw the same rows agree on it
+        self.version = "0-0"
+
+    def __len__(self):
+        return self._n
+
+    def refresh(self):
+        """Add approvals newer than the watermarks. Returns the number of rows added or updated."""
+        with connection() as conn:
+            # Upper bounds first: rows committed after this point are left for the next refresh
+            feedback_max, embedding_max = conn.execute(
+                "SELECT (SELECT COALESCE(MAX(id), 0) FROM feedback), (SELECT COALESCE(MAX(id), 0) FROM embeddings)").fetchone()
+            rows = conn.execute(_NEW_ROWS_SQL, (self.feedback_mark, feedback_max,
+                                                self.embedding_mark, embedding_max)).fetchall()
+        if not rows:
+            self.feedback_mark = max(self.feedback_mark, feedback_max)
+            self.embedding_mark = max(self.embedding_mark, embedding_max)
+            return 0
+        # Vectors come from the memory-mapped store; BLOBs only for rows not yet migrated into it
+        _, stored = self._store.open()
+        # Later feedback for the same product wins
+        latest = {r[2]: (stored[r[3]] if r[3] is not None else from_blob(r[4]), r[5]) for r in rows}
+        self._add(list(latest), [v for v, _ in latest.values()], [label for _, label in latest.values()])
+        # Everything up to the bounds was scanned; unapproved rows there are reached again
+        # through the other branch once their approval (or embedding) arrives
+        self.feedback_mark = max(self.feedback_mark, feedback_max)
+        self.embedding_mark = max(self.embedding_mark, embedding_max)
+        self.version = f"{self.feedback_mark}-{self.embedding_mark}"
+        return len(latest)
+
+    def _add(self, product_ids, vectors, labels):
+        vectors = _unit(vectors)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.empty((max(1024, len(vectors)), vectors.shape[1]), dtype=np.float32)
+                self._product_ids = np.empty(len(self._matrix), dtype=np.int64)
+            new_rows = []
+            for pid, vec, label in zip(product_ids, vectors, labels):
+                row = self._row_of.get(pid)
+                if row is not None:
+                    # Re-approved product: overwrite in place (it keeps its IVF partition)
+                    self._matrix[row] = vec
+                    self._labels[row] = label
+                    continue
+                if self._n + len(new_rows) >= len(self._matrix):
+                    self._grow()
+                row = self._n + len(new_rows)
+                self._matrix[row] = vec
+                self._product_ids[row] = pid
+                self._labels.append(label)
+                self._row_of[pid] = row
+                new_rows.append(row)
+            # Publish the new rows only once they are fully written
+            self._n += len(new_rows)
+            retrain = self._n >= VECTOR_IVF_MIN and (self._centroids is None or self._n > 2 * self._ivf_size)
+        # Only the refresh thread writes, so partitions can be (re)built without blocking searches
+        if retrain:
+            self._train_ivf()
+        elif self._centroids is not None and new_rows:
+            self._assign_rows(np.asarray(new_rows))
+
+    def _grow(self):
+        # Readers hold references to the old arrays, so replace rather than resize in place
+        matrix = np.empty((len(self._matrix) * 2, self._matrix.shape[1]), dtype=np.float32)
+        matrix[:len(self._matrix)] = self._matrix
+        product_ids = np.empty(len(matrix), dtype=np.int64)
+        product_ids[:len(self._product_ids)] = self._product_ids
+        self._matrix, self._product_ids = matrix, product_ids
+
+    def _nearest_centroid(self, vectors, centroids):
+        out = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), 4096):
+            out[start:start + 4096] = (vectors[start:start + 4096] @ centroids.T).argmax(axis=1)
+        return out
+
+    def _train_ivf(self):
+        live = self._matrix[:self._n]
+        nlist = max(1, int(np.sqrt(self._n)))
+        rng = np.random.default_rng(0)
+        sample = live[rng.choice(self._n, size=min(self._n, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(_KMEANS_ITERATIONS):
+            assign = self._nearest_centroid(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            filled = counts > 0
+            centroids[filled] = _unit(sums[filled])
+        assign = self._nearest_centroid(live, centroids)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        lists = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+        with self._lock:
+            self._centroids, self._lists, self._ivf_size = centroids, lists, len(live)
+        print(f"Trained vector IVF: {nlist} partitions over {len(live)} vectors")
+
+    def _assign_rows(self, rows):
+        assign = self._nearest_centroid(self._matrix[rows], self._centroids)
+        lists = list(self._lists)
+        for c in np.unique(assign):
+            lists[c] = np.concatenate([lists[c], rows[assign == c]])
+        with self._lock:
+            self._lists = lists
+
+    def search(self, queries, k=1):
+        """Return, per query vector, up to k [(product_id, label, cosine), ...] best first."""
+        with self._lock:
+            n, matrix, product_ids, labels = self._n, self._matrix, self._product_ids, self._labels
+            centroids, lists = self._centroids, self._lists
+        if not n:
+            return [[] for _ in range(len(queries))]
+        matrix = matrix[:n]
+        Q = _unit(queries)
+        results = []
+        if centroids is None:
+            for start in range(0, len(Q), _QUERY_CHUNK):
+                scores = Q[start:start + _QUERY_CHUNK] @ matrix.T
+                for row_scores in scores:
+                    top = _top_k(row_scores, k)
+                    results.append([(int(product_ids[i]), labels[i], float(row_scores[i])) for i in top])
+            return results
+        probes = np.argsort(-(Q @ centroids.T), axis=1)[:, :VECTOR_IVF_NPROBE]
+        for q, probe in zip(Q, probes):
+            candidates = np.concatenate([lists[c] for c in probe])
+            candidates = candidates[candidates < n]
+            scores = matrix[candidates] @ q
+            top = _top_k(scores, k)
+            results.append([(int(product_ids[candidates[i]]), labels[candidates[i]], float(scores[i])) for i in top])
+        return results
+
+
+_index = VectorIndex()
+_refresh_lock = threading.Lock()
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_vector_index():
+    return _index
+
+
+def refresh_vector_index():
+    """Fold in new approvals (called by the version watcher, never per request)."""
+    with _refresh_lock:
+        added = _index.refresh()
+    if added:
+        print(f"Vector index: {added} approved products added/updated ({len(_index)} total, version {_index.version})")
+    return _index
+
+
+def encode(texts):
+    """Embed raw strings with the same encoder as embedding_worker (loaded on first use)."""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = load_encoder()
+    return _encoder.encode(list(texts), convert_to_numpy=True)
@@ -0,0 +1,167 @@
+"""Append-only, memory-mapped embedding store kept next to the SQLite database.
+
+Layout under `VECTOR_STORE_DIR`:
+
+- `vectors.f32`: float32 little-endian rows of `dim` values, back to back
+- `product_ids.i64`: int64 product id of each row
+- `meta.json`: `{"dim": ..., "count": ...}`, the number of complete rows
+
+Writers append under an flock and publish by rewriting `meta.json` last, so
+readers that memory-map the first `count` rows never see a torn row. Bytes
+past `count` left by a crashed writer are truncated by the next append.
+`embeddings.store_row` maps each product to its row; readers `np.memmap` the
+files and touch only the rows they index. Products with the same text share a
+row (see `embedding_cache`); `product_ids` holds the product it was computed for
+and is only a row log, so per-product readers go through `embeddings`.
+"""
+import os
+import json
+import fcntl
+from contextlib import contextmanager
+
+import numpy as np
+
+from db_adapter import DB_URL, DEFAULT_PERSIST_DIR, is_sqlite, connection, get_connection
+from vectors import VECTOR_DTYPE, from_blob
+
+ID_DTYPE = np.dtype("<i8")
+
+
+def _default_dir():
+    if is_sqlite():
+        db_path = DB_URL.split("sqlite:///")[-1]
+        return os.path.join(os.path.dirname(os.path.abspath(db_path)), "vector_store")
+    return os.path.join(DEFAULT_PERSIST_DIR, "vector_store")
+
+
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR") or _default_dir()
+
+
+class VectorStore:
+    def __init__(self, path=VECTOR_STORE_DIR):
+        self.path = path
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        self.ids_path = os.path.join(path, "product_ids.i64")
+        self.meta_path = os.path.join(path, "meta.json")
+
+    def meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"dim": None, "count": 0}
+
+    def __len__(self):
+        return self.meta()["count"]
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "append.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def append(self, product_ids, vectors):
+        """Append rows and return their row numbers (a range)."""
+        vectors = np.ascontiguousarray(vectors, dtype=VECTOR_DTYPE)
+        product_ids = np.ascontiguousarray(product_ids, dtype=ID_DTYPE)
+        if vectors.ndim != 2 or len(vectors) != len(product_ids):
+            raise ValueError("append expects (n, dim) vectors and n product ids")
+        with self._locked():
+            meta = self.meta()
+            dim, count = meta["dim"] or vectors.shape[1], meta["count"]
+            if vectors.shape[1] != dim:
+                raise ValueError(f"store holds {dim}-dim vectors, got {vectors.shape[1]}")
+            for path, data, width in ((self.vectors_path, vectors, dim * VECTOR_DTYPE.itemsize),
+                                      (self.ids_path, product_ids, ID_DTYPE.itemsize)):
+                with open(path, "ab") as f:
+                    # Drop a torn tail from a writer that died before publishing
+                    f.truncate(count * width)
+                    f.write(data.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            tmp_path = f"{self.meta_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"dim": int(dim), "count": count + len(vectors)}, f)
+            os.replace(tmp_path, self.meta_path)
+        return range(count, count + len(vectors))
+
+    def open(self):
+        """Return read-only memmaps (product_ids[count], vectors[count, dim]) of the published rows."""
+        meta = self.meta()
+        count, dim = meta["count"], meta["dim"]
+        if not count:
+            return np.empty(0, dtype=ID_DTYPE), np.empty((0, dim or 0), dtype=VECTOR_DTYPE)
+        ids = np.memmap(self.ids_path, dtype=ID_DTYPE, mode="r", shape=(count,))
+        vectors = np.memmap(self.vectors_path, dtype=VECTOR_DTYPE, mode="r", shape=(count, dim))
+        return ids, vectors
+
+
+def export_products(out_prefix, store=None, chunk=65536):
+    """Write `<prefix>_vectors.npy` and `<prefix>_product_ids.npy`, one row per embedded product.
+
+    Built from `embeddings (product_id, store_row)`, not from the store's own
+    `product_ids` array. That array lists only the product each row was first
+    computed for, so it misses products served from `embedding_cache`, and it
+    includes orphan rows from batches that never committed. Shared rows are
+    gathered once per product. Rows are read `chunk` at a time, so memory stays
+    flat however many products there are. Returns the number of products written.
+    """
+    store = store or VectorStore()
+    where = "WHERE store_row IS NOT NULL OR vector IS NOT NULL"
+    # A dedicated connection holds one read transaction, so the count and the rows come from the same snapshot
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN")
+        total = conn.execute(f"SELECT COUNT(*) FROM embeddings {where}").fetchone()[0]
+        # Opened after the snapshot: every store_row it can see was published before its batch committed
+        _, stored = store.open()
+        if len(stored):
+            dim = stored.shape[1]
+        else:
+            blob = conn.execute("SELECT vector FROM embeddings WHERE vector IS NOT NULL LIMIT 1").fetchone()
+            dim = len(from_blob(blob[0])) if blob else 0
+        out = np.lib.format.open_memmap(f"{out_prefix}_vectors.npy", mode="w+", dtype=VECTOR_DTYPE, shape=(total, dim))
+        ids = np.lib.format.open_memmap(f"{out_prefix}_product_ids.npy", mode="w+", dtype=ID_DTYPE, shape=(total,))
+        cur = conn.execute(f"SELECT product_id, store_row, vector FROM embeddings {where} ORDER BY product_id")
+        start = 0
+        while True:
+            part = cur.fetchmany(chunk)
+            if not part:
+                break
+            ids[start:start + len(part)] = [r[0] for r in part]
+            stored_at = [i for i, r in enumerate(part) if r[1] is not None]
+            if stored_at:
+                # One gather per chunk reads only the referenced rows of the memmap
+                out[start + np.asarray(stored_at)] = stored[[part[i][1] for i in stored_at]]
+            # Rows not yet moved into the store still carry a BLOB
+            for i, r in enumerate(part):
+                if r[1] is None:
+                    out[start + i] = from_blob(r[2])
+            start += len(part)
+        cur.close()
+    finally:
+        conn.close()
+    out.flush()
+    ids.flush()
+    return total
+
+
+def migrate_blobs_to_store(store=None, batch_size=1000):
+    """Move `embeddings.vector` BLOBs into the store (sets `store_row`, clears the BLOB). Returns rows moved."""
+    store = store or VectorStore()
+    moved = 0
+    while True:
+        with connection() as conn:
+            rows = conn.execute(
+                "SELECT id, product_id, vector FROM embeddings WHERE store_row IS NULL AND vector IS NOT NULL LIMIT ?",
+                (batch_size,)).fetchall()
+            if not rows:
+                break
+            store_rows = store.append([r[1] for r in rows], np.vstack([from_blob(r[2]) for r in rows]))
+            conn.executemany("UPDATE embeddings SET store_row = ?, vector = NULL WHERE id = ?",
+                             [(row, r[0]) for row, r in zip(store_rows, rows)])
+        moved += len(rows)
+    if moved:
+        print(f"Moved {moved} embeddings into the vector store at {store.path}")
+    return moved
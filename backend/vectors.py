@@ -0,0 +1,119 @@
+"""Binary storage for product embeddings.
+
+Vectors live in `embeddings.vector` as float32 little-endian BLOBs (1.5 KB for a
+384-dim MiniLM vector, versus ~8 KB of JSON text) and decode with a zero-copy
+`np.frombuffer`. Rows written before the column existed only have
+`vector_json`; `migrate_json_vectors` converts them once.
+"""
+import os
+import ast
+import json
+
+import numpy as np
+
+from db_adapter import connection
+
+VECTOR_DTYPE = np.dtype("<f4")
+# SentenceTransformer used by embedding_worker and the waterfall's vector stage; both must agree
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+# 'torch' runs EMBEDDING_MODEL_NAME in sentence-transformers; 'onnx' runs the int8 export in EMBED_ONNX_DIR (see onnx_encoder.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+
+
+def to_blob(vector):
+    return np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+
+def from_blob(blob):
+    """Decode a BLOB written by `to_blob` (a read-only view over the bytes)."""
+    return np.frombuffer(blob, dtype=VECTOR_DTYPE)
+
+
+def load_encoder(backend=None, threads=None):
+    """Return an object with a SentenceTransformer-style `encode` for the configured backend.
+
+    `threads` caps intra-op threads (e.g. 1 for a worker pinned to one core).
+    """
+    backend = backend or EMBED_BACKEND
+    if backend == "onnx":
+        from onnx_encoder import OnnxEncoder
+        return OnnxEncoder(threads=threads)
+    if backend != "torch":
+        raise ValueError(f"Unknown EMBED_BACKEND {backend!r} (expected 'torch' or 'onnx')")
+    from sentence_transformers import SentenceTransformer
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+def _tree_stamp(path):
+    """mtime_ns of the newest file under `path`, or None if it is not a local directory."""
+    if not os.path.isdir(path):
+        return None
+    return max((os.stat(os.path.join(root, name)).st_mtime_ns
+                for root, _, names in os.walk(path) for name in names), default=0)
+
+
+def encoder_identity(backend=None):
+    """Name the vector space `load_encoder(backend)` produces: backend, model and quantization.
+
+    Vectors from two identities must never be mixed (see `embedding_cache`). A
+    local model directory that is retrained or re-exported in place gets a new
+    identity through the stamp of its newest file.
+    """
+    backend = backend or EMBED_BACKEND
+    if backend == "onnx":
+        from onnx_encoder import EMBED_ONNX_DIR, ENCODER_CONFIG
+        with open(os.path.join(EMBED_ONNX_DIR, ENCODER_CONFIG)) as f:
+            quantization = "int8" if json.load(f)["quantized"] else "fp32"
+        return f"onnx:{os.path.abspath(EMBED_ONNX_DIR)}:{quantization}:{_tree_stamp(EMBED_ONNX_DIR)}"
+    if backend != "torch":
+        raise ValueError(f"Unknown EMBED_BACKEND {backend!r} (expected 'torch' or 'onnx')")
+    stamp = _tree_stamp(EMBEDDING_MODEL_NAME)
+    if stamp is None:
+        return f"torch:{EMBEDDING_MODEL_NAME}:fp32"
+    return f"torch:{os.path.abspath(EMBEDDING_MODEL_NAME)}:fp32:{stamp}"
+
+
+def _parse_json_vector(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        # Some early rows were written with str(list); never eval them
+        return ast.literal_eval(text)
+
+
+def migrate_json_vectors(batch_size=1000):
+    """Convert `vector_json` rows to BLOBs and drop the JSON text. Returns the number converted.
+
+    Rows whose JSON cannot be parsed are deleted and their products queued for
+    embedding again, so they are re-embedded instead of looking done. Safe to
+    run repeatedly (and concurrently with the embedding worker); each batch
+    commits on its own, so an interrupted migration resumes where it stopped.
+    """
+    converted = dropped = 0
+    while True:
+        with connection() as conn:
+            rows = conn.execute(
+                "SELECT id, product_id, vector_json FROM embeddings WHERE vector IS NULL AND vector_json IS NOT NULL LIMIT ?",
+                (batch_size,)).fetchall()
+            if not rows:
+                break
+            updates, broken = [], []
+            for row_id, product_id, text in rows:
+                try:
+                    updates.append((to_blob(_parse_json_vector(text)), row_id))
+                except (ValueError, SyntaxError):
+                    broken.append((row_id, product_id))
+            conn.executemany("UPDATE embeddings SET vector = ?, vector_json = NULL WHERE id = ?", updates)
+            conn.executemany("DELETE FROM embeddings WHERE id = ?", [(row_id,) for row_id, _ in broken])
+            conn.executemany("INSERT OR IGNORE INTO embedding_queue (product_id) SELECT ? WHERE EXISTS (SELECT 1 FROM products WHERE id = ?)",
+                             [(product_id, product_id) for _, product_id in broken])
+        converted += len(updates)
+        dropped += len(broken)
+    if converted:
+        print(f"Converted {converted} JSON embeddings to float32 BLOBs")
+    if dropped:
+        print(f"Dropped {dropped} unparseable JSON embeddings; their products are queued to be embedded again")
+    return converted
@@ -0,0 +1,47 @@
+"""Cross-worker reload coordination through the `index_versions` table.
+
+Under `uvicorn --workers N` each process holds its own model bundle and
+reference indexes. Every process runs one watcher thread that reads all change
+stamps in a single query every `RELOAD_POLL_SECONDS` and calls the registered
+handler for each stamp that moved. Requests never query the stamps themselves,
+and every worker converges within one poll interval (plus load time) of a
+vocabulary/taxonomy edit or a `/reload_model` broadcast.
+"""
+import os
+import time
+import threading
+
+from db_adapter import get_index_versions
+
+RELOAD_POLL_SECONDS = float(os.getenv("RELOAD_POLL_SECONDS", "2"))
+
+_watcher = None
+
+
+def start_watcher(handlers, interval=RELOAD_POLL_SECONDS):
+    """Start the watcher thread (idempotent). `handlers` maps stamp name -> zero-argument callable.
+
+    Every handler runs once on the first poll, so state loaded before the
+    watcher started is checked against the current stamps.
+    """
+    global _watcher
+    if _watcher is not None and _watcher.is_alive():
+        return _watcher
+    _watcher = threading.Thread(target=_run, args=(dict(handlers), interval), name="version-watch", daemon=True)
+    _watcher.start()
+    return _watcher
+
+
+def _run(handlers, interval):
+    seen = {}
+    while True:
+        try:
+            versions = get_index_versions()
+            for name, handler in handlers.items():
+                version = versions.get(name, 0)
+                if seen.get(name) != version:
+                    handler()
+                    seen[name] = version
+        except Exception as e:
+            print(f"Version watcher error: {e}")
+        time.sleep(interval)
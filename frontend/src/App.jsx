@@ -1,23 +1,63 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import './App.css';
 
 // Update this with your actual Port 8000 URL from the Ports tab
 const BASE_URL = 'https://expert-rotary-phone-9756jw66ww9v247r-8000.app.github.dev';
 
+// Reviews are sent in batches through /submit-feedback/bulk (one DB transaction per batch)
+const FEEDBACK_BATCH_SIZE = 25;
+
 export default function App() {
   const [products, setProducts] = useState([]);
   const [currentIndex, setCurrentIndex] = useState(0);
   const [feedback, setFeedback] = useState('');
+  const pendingFeedback = useRef([]);
+
+  const flushFeedback = (keepalive = false) => {
+    const batch = pendingFeedback.current;
+    if (batch.length === 0) return;
+    pendingFeedback.current = [];
+    fetch(`${BASE_URL}/submit-feedback/bulk`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(batch),
+      keepalive,
+    }).then(res => {
+      // fetch only rejects on network errors; an HTTP error must not drop the batch either
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    }).catch(err => {
+      console.error("Fog Alert: feedback batch failed", err);
+      // Put the batch back so the next flush retries it
+      pendingFeedback.current = batch.concat(pendingFeedback.current);
+    });
+  };
 
   useEffect(() => {
     fetch(`${BASE_URL}/products`)
       .then(res => res.json())
       .then(data => setProducts(data))
       .catch(err => console.error("Fog Alert: Backend not found", err));
+
+    // Send whatever is still queued when the tab closes or the app unmounts
+    const onUnload = () => flushFeedback(true);
+    window.addEventListener('beforeunload', onUnload);
+    return () => {
+      window.removeEventListener('beforeunload', onUnload);
+      flushFeedback(true);
+    };
   }, []);
 
   const handleNext = () => {
-    // Logic to save feedback would go here
+    const correction = feedback.trim();
+    // Empty input approves the current value; anything typed is a correction
+    pendingFeedback.current.push({
+      product_id: products[currentIndex].id,
+      is_approved: correction === '',
+      correction: correction || null,
+    });
+    if (pendingFeedback.current.length >= FEEDBACK_BATCH_SIZE || currentIndex + 1 >= products.length) {
+      flushFeedback();
+    }
     setFeedback('');
     setCurrentIndex(prev => prev + 1);
   };
@@ -30,6 +70,7 @@ export default function App() {
   };
 
   if (products.length === 0) return <div className="loading">INITIALIZING NEON CORE...</div>;
+  if (currentIndex >= products.length) return <div className="loading">QUEUE CLEARED</div>;
 
   const currentProduct = products[currentIndex];
 
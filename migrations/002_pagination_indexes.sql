@@ -0,0 +1,6 @@
+-- Indexes backing keyset pagination on /products and the review queue
+
+CREATE INDEX IF NOT EXISTS idx_products_created_id ON products(created_at, id);
+
+-- Partial index: only rows still waiting for review
+CREATE INDEX IF NOT EXISTS idx_products_review_queue ON products(created_at, id) WHERE needs_review = 1;